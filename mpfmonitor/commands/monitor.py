@@ -12,8 +12,19 @@ import time
 import errno
 from mpfmonitor._version import __version__
 
-# import functiontrace
-# functiontrace.trace()
+
+def replay_speed(text):
+    """Return the --replay-speed argument if ReplayEngine supports it."""
+    from mpfmonitor.core.replay import MAX_SPEED, REPLAY_SPEEDS
+
+    try:
+        speed = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid speed: {}".format(text))
+    if speed != MAX_SPEED and not REPLAY_SPEEDS[0] <= speed <= REPLAY_SPEEDS[-1]:
+        raise argparse.ArgumentTypeError("speed must be from {} to {}, or {}".format(
+            REPLAY_SPEEDS[0], REPLAY_SPEEDS[-1], MAX_SPEED))
+    return speed
 
 
 class Command(object):
@@ -65,9 +76,122 @@ class Command(object):
                                  "Default is <mpf-monitor install "
                                  "folder>/mpfmonitor.yaml")
 
+        parser.add_argument("-r", "--record",
+                            action="store_true", dest="record", default=False,
+                            help="Record the received BCP messages to "
+                                 "<machine_path>/monitor/recordings")
+
+        parser.add_argument("--record-max-size",
+                            action="store", dest="record_max_size", type=int,
+                            default=100, metavar='MB',
+                            help="Start a new recording file once the "
+                                 "current one reaches this size. Default "
+                                 "is 100 MB.")
+
+        parser.add_argument("--replay",
+                            action="store", dest="replay_file", default=None,
+                            metavar='recording',
+                            help="Replay a recording instead of connecting "
+                                 "to MPF")
+
+        parser.add_argument("--replay-speed",
+                            action="store", dest="replay_speed", type=replay_speed,
+                            default=1, metavar='speed',
+                            help="Replay speed multiplier from 0.25 to 50, "
+                                 "or 0 to replay as fast as possible. "
+                                 "Default is 1.")
+
+        parser.add_argument("--machine",
+                            action="append", dest="machines", default=None,
+                            metavar='host:port:machine_path',
+                            help="Monitor the MPF machine at host:port, using the "
+                                 "monitor config in machine_path. Repeat to monitor "
+                                 "several machines from one process. When given, "
+                                 "the machine in the current folder is not monitored.")
+
+        parser.add_argument("--headless",
+                            action="store_true", dest="headless", default=False,
+                            help="Do not start the GUI. Stream device, event, mode "
+                                 "and variable changes as JSON lines instead.")
+
+        parser.add_argument("--output",
+                            action="store", dest="output", default=None,
+                            metavar='file',
+                            help="Headless: append the JSON lines to this file "
+                                 "instead of writing them to stdout")
+
+        parser.add_argument("--categories",
+                            action="store", dest="categories",
+                            default="devices,events,modes,variables",
+                            help="Headless: comma separated categories to stream. "
+                                 "Default is devices,events,modes,variables.")
+
+        parser.add_argument("--rate-limit",
+                            action="append", dest="rate_limits", default=[],
+                            metavar='category=lines_per_second',
+                            help="Headless: limit the lines per second of a "
+                                 "category. Can be repeated.")
+
+        parser.add_argument("--snapshot-on-exit",
+                            action="store_true", dest="snapshot_on_exit", default=False,
+                            help="Headless: write the complete machine state "
+                                 "when stopping")
+
+        parser.add_argument("--profile",
+                            action="store_true", dest="profile", default=False,
+                            help="Profile the monitor from the start and write the "
+                                 "profile to <machine_path>/logs on exit. Profiling "
+                                 "can also be started and stopped in the inspector.")
+
+        parser.add_argument("--metrics-port",
+                            action="store", dest="metrics_port", type=int, default=None,
+                            metavar='port',
+                            help="Serve Prometheus metrics of the monitor at "
+                                 "http://<metrics host>:<port>/metrics")
+
+        parser.add_argument("--metrics-host",
+                            action="store", dest="metrics_host", default="127.0.0.1",
+                            metavar='host',
+                            help="Address to serve the metrics on. Default is "
+                                 "127.0.0.1, use 0.0.0.0 to allow remote scrapes.")
+
         args = parser.parse_args(args)
+
+        machines = None
+        if args.machines:
+            machines = []
+            for machine in args.machines:
+                try:
+                    host, port, path = machine.split(":", 2)
+                    machines.append((host, int(port), os.path.abspath(path)))
+                except ValueError:
+                    parser.error("Invalid machine {}. Use host:port:machine_path".format(machine))
+            if args.replay_file:
+                parser.error("--replay can not be used with --machine")
+
         args.configfile = "{}.yaml".format(args.configfile)
 
+        if args.headless:
+            from mpfmonitor.core.headless import HEADLESS_CATEGORIES
+
+            categories = [c.strip() for c in args.categories.split(",") if c.strip()]
+            for category in categories:
+                if category not in HEADLESS_CATEGORIES:
+                    parser.error("Invalid category {}".format(category))
+
+            rate_limits = dict()
+            for rate_limit in args.rate_limits:
+                try:
+                    category, rate = rate_limit.split("=")
+                    rate_limits[category] = float(rate)
+                except ValueError:
+                    parser.error("Invalid rate limit {}. Use category=lines_per_second".format(rate_limit))
+                if category not in HEADLESS_CATEGORIES or rate_limits[category] <= 0:
+                    parser.error("Invalid rate limit {}".format(rate_limit))
+
+            if args.replay_file:
+                parser.error("--replay can not be used with --headless")
+
         # Configure logging. Creates a logfile and logs to the console.
         # Formatting options are documented here:
         # https://docs.python.org/2.7/library/logging.html#logrecord-attributes
@@ -98,14 +222,33 @@ class Command(object):
         # add the handler to the root logger
         logging.getLogger('').addHandler(console)
 
-        from mpfmonitor.core.mpfmon import run
-
         logging.info("Loading MPF Monitor Version {}".format(__version__))
 
+        if args.headless:
+            from mpfmonitor.core.headless import run as run_headless
+
+            try:
+                run_headless(machines or [('localhost', 5051, machine_path)],
+                             output=args.output, categories=categories,
+                             rate_limits=rate_limits,
+                             snapshot_on_exit=args.snapshot_on_exit, record=args.record,
+                             record_max_bytes=args.record_max_size * 1024 * 1024,
+                             profile=args.profile, metrics_host=args.metrics_host,
+                             metrics_port=args.metrics_port)
+            except Exception as e:
+                logging.exception(str(e))
+            sys.exit()
+
+        from mpfmonitor.core.mpfmon import run
+
         thread_stopper = threading.Event()
 
         try:
-            run(machine_path=machine_path, thread_stopper=thread_stopper, config_file=args.configfile)
+            run(machine_path=machine_path, thread_stopper=thread_stopper, config_file=args.configfile,
+                record=args.record, record_max_bytes=args.record_max_size * 1024 * 1024,
+                replay_file=args.replay_file, replay_speed=args.replay_speed,
+                machines=machines, profile=args.profile, metrics_host=args.metrics_host,
+                metrics_port=args.metrics_port)
             logging.info("MPF Monitor run loop ended.")
         except Exception as e:
             logging.exception(str(e))
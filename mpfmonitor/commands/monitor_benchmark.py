@@ -0,0 +1,106 @@
+"""Measures the BCP message throughput of the MPF Monitor."""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+
+class Command(object):
+
+    def __init__(self, mpf_path, machine_path, args):
+        from mpfmonitor.core.synthetic import LIGHT_PATTERNS, SyntheticMachine
+
+        del mpf_path
+
+        parser = argparse.ArgumentParser(
+            description='Feeds recorded or synthetic BCP messages through the MPF Monitor '
+                        'without a display and reports how fast they are processed')
+
+        parser.add_argument("-c",
+                            action="store", dest="configfile",
+                            default="monitor", metavar='config_file',
+                            help="The name of the monitor config file to load. "
+                                 "Default is monitor.")
+
+        parser.add_argument("--recording",
+                            action="store", dest="recording", default=None,
+                            metavar='recording',
+                            help="Replay the messages of a recording instead of "
+                                 "synthetic messages")
+
+        parser.add_argument("--messages",
+                            action="store", dest="messages", type=int, default=100000,
+                            help="Number of synthetic messages. Default is 100000.")
+
+        parser.add_argument("--switches",
+                            action="store", dest="switches", type=int, default=64,
+                            help="Number of synthetic switches. Default is 64.")
+
+        parser.add_argument("--lights",
+                            action="store", dest="lights", type=int, default=128,
+                            help="Number of synthetic lights. Default is 128.")
+
+        parser.add_argument("--pattern",
+                            action="store", dest="pattern", default="chase",
+                            choices=LIGHT_PATTERNS,
+                            help="Light show pattern of the synthetic messages: "
+                                 "chase, blink, fade or random. Default is chase.")
+
+        parser.add_argument("--batch-size",
+                            action="store", dest="batch_size", type=int, default=1000,
+                            help="Messages received per tick. Default is 1000.")
+
+        parser.add_argument("--no-windows",
+                            action="store_false", dest="show_windows", default=True,
+                            help="Do not show the monitor windows, so nothing is painted")
+
+        parser.add_argument("--trace-memory",
+                            action="store_true", dest="trace_memory", default=False,
+                            help="Also report the peak memory allocated by Python "
+                                 "(tracemalloc). Slows the benchmark down.")
+
+        parser.add_argument("--json",
+                            action="store_true", dest="json", default=False,
+                            help="Print the results as JSON")
+
+        args = parser.parse_args(args)
+
+        logging.basicConfig(level=logging.WARNING,
+                            format='%(levelname)s : %(name)s : %(message)s')
+
+        # no display needed
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+        from PyQt6.QtWidgets import QApplication
+        from mpfmonitor.core.benchmark import Benchmark, create_monitor, format_results
+        from mpfmonitor.core.recorder import read_recording
+
+        app = QApplication(sys.argv)
+        monitor = create_monitor(app, machine_path, "{}.yaml".format(args.configfile),
+                                 show_windows=args.show_windows)
+
+        recording = None
+        if args.recording:
+            recording = open(args.recording, "r", encoding="utf-8")
+            messages = (message for _, message in read_recording(recording))
+        else:
+            machine = SyntheticMachine(args.switches, args.lights, seed=0)
+            messages = machine.stream(args.messages, args.pattern)
+
+        results = Benchmark(monitor, messages, args.batch_size, app.processEvents,
+                            args.trace_memory).run()
+
+        if recording:
+            recording.close()
+        monitor.bcp.stop()
+
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print(format_results(results))
+
+
+def get_command():
+    return 'monitor_benchmark', Command
@@ -0,0 +1,106 @@
+"""Runs a fake MPF which sends synthetic BCP traffic to the MPF Monitor."""
+
+import argparse
+import asyncio
+import logging
+
+
+class Command(object):
+
+    def __init__(self, mpf_path, machine_path, args):
+        from mpfmonitor.core.synthetic import LIGHT_PATTERNS, SyntheticMachine
+
+        del mpf_path
+        del machine_path
+
+        parser = argparse.ArgumentParser(
+            description='Stands in for MPF and serves a synthetic machine to the MPF Monitor. '
+                        'Rates are per second, 0 disables them.')
+
+        parser.add_argument("--host",
+                            action="store", dest="host", default="localhost",
+                            help="Interface to listen on. Default is localhost.")
+
+        parser.add_argument("--port",
+                            action="store", dest="port", type=int, default=5051,
+                            help="BCP port to listen on. Default is 5051.")
+
+        parser.add_argument("--switches",
+                            action="store", dest="switches", type=int, default=64,
+                            help="Number of switches. Default is 64.")
+
+        parser.add_argument("--lights",
+                            action="store", dest="lights", type=int, default=128,
+                            help="Number of lights. Default is 128.")
+
+        parser.add_argument("--pattern",
+                            action="store", dest="pattern", default="chase",
+                            choices=LIGHT_PATTERNS,
+                            help="Light show pattern: chase, blink, fade or random. "
+                                 "Default is chase.")
+
+        parser.add_argument("--light-rate",
+                            action="store", dest="light_rate", type=float, default=30,
+                            help="Light show steps per second. Default is 30.")
+
+        parser.add_argument("--switch-rate",
+                            action="store", dest="switch_rate", type=float, default=5,
+                            help="Random switch toggles per second. Default is 5.")
+
+        parser.add_argument("--event-rate",
+                            action="store", dest="event_rate", type=float, default=10,
+                            help="Events per second. Default is 10.")
+
+        parser.add_argument("--burst-size",
+                            action="store", dest="burst_size", type=int, default=200,
+                            help="Events per burst. Default is 200.")
+
+        parser.add_argument("--burst-interval",
+                            action="store", dest="burst_interval", type=float, default=10,
+                            help="Seconds between event bursts. Default is 10.")
+
+        parser.add_argument("--variable-rate",
+                            action="store", dest="variable_rate", type=float, default=2,
+                            help="Score changes per second. Default is 2.")
+
+        parser.add_argument("--mode-interval",
+                            action="store", dest="mode_interval", type=float, default=15,
+                            help="Seconds between mode changes. Default is 15.")
+
+        parser.add_argument("--seed",
+                            action="store", dest="seed", type=int, default=None,
+                            help="Random seed, for repeatable runs")
+
+        args = parser.parse_args(args)
+
+        logging.basicConfig(level=logging.INFO,
+                            format='%(levelname)s : %(name)s : %(message)s')
+
+        from mpfmonitor.core.fake_server import FakeMPFServer
+
+        server = FakeMPFServer(
+            SyntheticMachine(args.switches, args.lights, seed=args.seed),
+            host=args.host, port=args.port, light_rate=args.light_rate,
+            pattern=args.pattern, switch_rate=args.switch_rate, event_rate=args.event_rate,
+            burst_size=args.burst_size, burst_interval=args.burst_interval,
+            variable_rate=args.variable_rate, mode_interval=args.mode_interval)
+
+        try:
+            asyncio.run(self.run(server))
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    async def run(server):
+        await server.start()
+        try:
+            while True:
+                await asyncio.sleep(10)
+                logging.info("%s monitors connected, %s messages sent, %s switch commands received",
+                             len(server.clients), server.sent_messages, server.received_switches)
+        finally:
+            await server.stop()
+
+
+def get_command():
+    return 'monitor_fake_mpf', Command
@@ -1,264 +1,515 @@
 """BCP Server interface for the MPF Media Controller"""
 
+import asyncio
 import logging
 import queue
+import random
 import socket
+import time
 import threading
-import os
-
-import select
-
-from datetime import datetime
-import math
+from collections import deque
 
 import mpf.core.bcp.bcp_socket_client as bcp
 from PyQt6.QtCore import QTimer
 
+from mpfmonitor.core.replay import ReplayEngine
+
+
+class BCPLoop(object):
+    """Runs the asyncio event loop which drives the BCP connections.
+
+    Connecting, reading, decoding and sending all happen on this single
+    thread. Received messages are handed to the GUI thread through the
+    receive queue, outgoing messages are handed over with
+    call_soon_threadsafe() so the loop never has to poll.
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger('BCP Loop')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='BCP Loop')
+        # The loop is stopped explicitly on quit. Daemon is only a fallback
+        # so a crashed GUI can never keep the process alive.
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            # give pending coroutines the chance to clean up before closing
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def is_running(self):
+        return self.thread.is_alive() and not self.loop.is_closed()
+
+    def call_soon(self, callback, *args):
+        """Schedule a callback on the BCP loop from any thread."""
+        if self.is_running():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def run_coroutine(self, coro):
+        """Schedule a coroutine on the BCP loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        if not self.is_running():
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2)
+
+
+class BCPFramer(object):
+    """Splits the BCP byte stream into newline terminated messages.
+
+    The socket reads straight into a reusable bytearray (recv_into via
+    get_buffer()) and only the newly received bytes are scanned for line
+    breaks, so a large message arriving in many chunks is never copied or
+    split more than once.
+    """
+
+    def __init__(self, read_size=65536):
+        self.read_size = read_size
+        self.buffer = bytearray(read_size * 2)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # start of the first incomplete message
+        self.end = 0    # end of the received data
+
+    def get_buffer(self, sizehint=-1):
+        """Return a writable view with room for at least read_size bytes."""
+        del sizehint
+        if len(self.buffer) - self.end < self.read_size:
+            self._make_room()
+
+        return self.view[self.end:]
+
+    def _make_room(self):
+        pending = bytes(self.view[self.start:self.end])
+        size = len(self.buffer)
+
+        if len(pending) + self.read_size > size:
+            # the incomplete message does not fit, grow the buffer
+            size = max(size * 2, len(pending) + self.read_size)
+
+        if size != len(self.buffer):
+            self.buffer = bytearray(size)
+
+        self.buffer[:len(pending)] = pending
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = len(pending)
+
+    def buffer_updated(self, nbytes):
+        """Consume nbytes written into the buffer and return all complete
+        messages."""
+        scan = self.end
+        self.end += nbytes
+
+        messages = []
+        find = self.buffer.find
+        while True:
+            pos = find(b"\n", scan, self.end)
+            if pos < 0:
+                break
+
+            if pos > self.start:
+                messages.append(str(self.view[self.start:pos], 'utf-8'))
+
+            self.start = scan = pos + 1
+
+        if self.start == self.end:
+            # everything consumed, start over at the front of the buffer
+            self.start = self.end = 0
+
+        return messages
+
+
+class BCPProtocol(asyncio.BufferedProtocol):
+    """asyncio protocol which reads the BCP stream into a BCPFramer."""
+
+    def __init__(self, client, read_size=65536):
+        self.client = client
+        self.transport = None
+        self.framer = BCPFramer(read_size)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client.connection_made(transport)
+
+    def get_buffer(self, sizehint):
+        return self.framer.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        # everything in one read arrived at the same time
+        received = time.monotonic_ns()
+        for message in self.framer.buffer_updated(nbytes):
+            self.client.process_received_message(message, received)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.client.connection_lost(exc)
+
+
+MONITOR_CATEGORIES = ('devices', 'events', 'modes', 'machine_vars', 'player_vars')
+
+# sent ahead of everything else which is waiting
+PRIORITY_COMMANDS = ('switch',)
+
+
+class ConnectionState(object):
+    DISCONNECTED = 'disconnected'
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    WAITING = 'waiting'
+    SIMULATING = 'simulating'
+
 
 class BCPClient(object):
 
     def __init__(self, mpfmon, receiving_queue, sending_queue,
-                 interface='localhost', port=5051, simulate=False, cache=False):
+                 interface='localhost', port=5051, simulate=False, recorder=None,
+                 replay_file=None, replay_speed=1, bcp_loop=None, read_size=65536, reconnect_min_delay=.5,
+                 reconnect_max_delay=10, connect_timeout=5,
+                 monitored_categories=MONITOR_CATEGORIES):
 
         self.mpfmon = mpfmon
         self.log = logging.getLogger('BCP Client')
         self.interface = interface
         self.port = port
+        self.read_size = read_size
         self.receive_queue = receiving_queue
         self.sending_queue = sending_queue
+        self.priority_messages = deque()
+        self._flush_scheduled = False
         self.connected = False
-        self.socket = None
-        self.sending_thread = None
-        self.receive_thread = None
+        self.connection_state = ConnectionState.DISCONNECTED
+        self.transport = None
         self.done = False
-        self.last_time = datetime.now()
-
-        self.simulate = simulate
-        self.caching_enabled = cache
-
-        try:
-            self.cache_file_location = os.path.join(self.mpfmon.machine_path, "monitor", "cache.txt")
-        except FileNotFoundError:
-            self.simulate = False
-            self.caching_enabled = False
+        self.monitored_categories = set(monitored_categories)
+
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.connect_timeout = connect_timeout
+        self.failed_attempts = 0
+        self.reconnect_count = 0
+        self.next_attempt = None
+        self._retry_handle = None
+
+        # a loop shared by several clients is stopped by whoever created it
+        self.owns_loop = bcp_loop is None
+        if bcp_loop is None:
+            bcp_loop = BCPLoop()
+        self.bcp_loop = bcp_loop
+
+        self.recorder = recorder
+        self.replay_file = replay_file
+        self.replay_speed = replay_speed
+        self.replay = None
+        self.simulate = simulate or replay_file is not None
 
         self.mpfmon.log.info('Looking for MPF at %s:%s', self.interface, self.port)
 
-        self.reconnect_timer = QTimer(self.mpfmon.device_window)
-        self.simulator_timer = QTimer(self.mpfmon.device_window)
-
+        self.simulator_timer = QTimer()
 
-        self.simulator_messages = []
-        self.simulator_msg_timer = []
+        self.simulator_messages = deque()
         self.enable_simulator(enable=self.simulate)
 
     def register_timer(self):
         if self.simulate:
-            self.reconnect_timer.stop()
-
-            self.simulator_init()
-
-            self.simulator_timer.setInterval(100)
-            self.simulator_timer.timeout.connect(self.simulate_received)
-            self.simulator_timer.start()
+            self.connection_state = ConnectionState.SIMULATING
+
+            if self.replay_file:
+                self.replay_init()
+            else:
+                self.simulator_init()
+                self.simulator_timer.setInterval(100)
+                self.simulator_timer.timeout.connect(self.simulate_received)
+                self.simulator_timer.start()
         else:
             self.simulator_timer.stop()
 
-            self.reconnect_timer.setInterval(1000)
-            self.reconnect_timer.timeout.connect(self.connect_to_mpf)
-            self.reconnect_timer.start()
+            self.connect_to_mpf()
 
     def enable_simulator(self, enable=True):
-        if enable:
-            self.simulate = True
-            if self.caching_enabled:
-                try:
-                    self.cache_file = open(self.cache_file_location, "r")
-                except FileNotFoundError:
-                    self.log.warn("Caching enabled but no cache file found.")
-                    self.simulate = False
-                    self.caching_enabled = False
-                    self.enable_simulator(False)
-        else:
-            self.simulate = False
-            if self.caching_enabled:
-                self.cache_file = open(self.cache_file_location, "w")
-
-        self.start_time = datetime.now()
+        self.simulate = enable
         self.register_timer()
 
     def connect_to_mpf(self, *args):
+        """Try to connect to MPF right away.
+
+        This returns immediately, the attempt runs on the BCP loop. A retry
+        which is waiting for its backoff delay is cancelled, so this is also
+        what the "Reconnect now" button calls.
+        """
         del args
+        self.bcp_loop.call_soon(self._connect_now)
 
-        if self.connected:
+    def _connect_now(self):
+        if self._retry_handle:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+
+        if self.done or self.connection_state in (ConnectionState.CONNECTED,
+                                                  ConnectionState.CONNECTING):
             return
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.connection_state = ConnectionState.CONNECTING
+        self.next_attempt = None
+        asyncio.ensure_future(self._connect())
 
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
         try:
-            self.socket.connect((self.interface, self.port))
-            self.connected = True
-            # self.mc.reset_connection()
-            self.log.info("Connected to MPF")
+            await asyncio.wait_for(
+                loop.create_connection(
+                    lambda: BCPProtocol(self, self.read_size),
+                    self.interface, self.port),
+                self.connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.transport = None
+            self.failed_attempts += 1
+            self._schedule_reconnect()
+
+    def get_reconnect_delay(self):
+        """Return the jittered exponential backoff delay for the next attempt."""
+        delay = min(self.reconnect_max_delay,
+                    self.reconnect_min_delay * 2 ** max(0, self.failed_attempts - 1))
+        # "equal jitter": keep at least half the delay, randomize the rest
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _schedule_reconnect(self):
+        if self.done:
+            self.connection_state = ConnectionState.DISCONNECTED
+            return
 
-        except socket.error:
-            self.socket = None
+        delay = self.get_reconnect_delay()
+        self.connection_state = ConnectionState.WAITING
+        self.next_attempt = time.monotonic() + delay
+        self._retry_handle = asyncio.get_running_loop().call_later(delay, self._connect_now)
+
+    def connection_made(self, transport):
+        """Called on the BCP loop when the socket is connected."""
+        self.transport = transport
+        self.connected = True
+        self.connection_state = ConnectionState.CONNECTED
+        self._set_nodelay(transport)
+        self.failed_attempts = 0
+        # self.mc.reset_connection()
+        self.log.info("Connected to MPF")
+        self.start_monitoring()
+
+    def _set_nodelay(self, transport):
+        # asyncio usually does this already, but a switch toggle must never
+        # wait for Nagle's algorithm
+        sock = transport.get_extra_info('socket')
+        if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            self.log.warning("Could not disable Nagle's algorithm: %s", e)
 
-        if self.create_socket_threads():
-            self.start_monitoring()
+    def connection_lost(self, exc):
+        """Called on the BCP loop when the socket was closed."""
+        if self.connected:
+            self.log.info("Disconnected from MPF")
+            self.reconnect_count += 1
+        self.transport = None
+        self.connected = False
+        self._schedule_reconnect()
 
     def start_monitoring(self):
-        self.sending_queue.put('monitor_start?category=devices')
-        self.sending_queue.put('monitor_start?category=events')
-        self.sending_queue.put('monitor_start?category=modes')
-        self.sending_queue.put('monitor_start?category=machine_vars')
-        self.sending_queue.put('monitor_start?category=player_vars')
-
-    def create_socket_threads(self):
-        """Creates and starts the sending and receiving threads for the BCP
-        socket.
-        Returns:
-            True if the socket exists and the threads were started. False if
-            not.
+        for category in MONITOR_CATEGORIES:
+            if category in self.monitored_categories:
+                self.sending_queue.put('monitor_start?category={}'.format(category))
+        self.flush()
+
+    def set_monitored_categories(self, categories):
+        """Subscribe to exactly these BCP monitor categories.
+
+        Can be called from any thread. While connected, monitor_start and
+        monitor_stop are sent for the categories which changed. MPF sends
+        the current state again on monitor_start, so a category which is
+        started again is resynced.
         """
+        self.bcp_loop.call_soon(self._update_monitoring, frozenset(categories))
 
-        if self.socket:
-
-            self.receive_thread = threading.Thread(target=self.receive_loop)
-            # self.receive_thread.daemon = True
-            self.receive_thread.start()
-
-            self.sending_thread = threading.Thread(target=self.sending_loop)
-            # self.sending_thread.daemon = True
-            self.sending_thread.start()
-
-            return True
+    def _update_monitoring(self, categories):
+        started = [c for c in MONITOR_CATEGORIES
+                   if c in categories and c not in self.monitored_categories]
+        stopped = [c for c in MONITOR_CATEGORIES
+                   if c not in categories and c in self.monitored_categories]
+        self.monitored_categories = set(categories)
 
-        else:
-            return False
-
-    def receive_loop(self):
-        """The socket thread's run loop."""
-        socket_chars = b''
-        while self.connected and not self.mpfmon.thread_stopper.is_set():
-            try:
-                ready = select.select([self.socket], [], [], 1)
-                if ready[0]:
-                    data_read = self.socket.recv(8192)
-                    if data_read:
-                        socket_chars += data_read
-                        commands = socket_chars.split(b"\n")
-
-                        # keep last incomplete command
-                        socket_chars = commands.pop()
-
-                        # process all complete commands
-                        for cmd in commands:
-                            if cmd:
-                                self.process_received_message(cmd.decode())
-                    else:
-                        # no bytes -> socket closed
-                        break
-
-            except socket.timeout:
-                pass
-
-            except OSError:
-                break
+        if not self.connected or not (started or stopped):
+            return
 
-        self.connected = False
+        self.log.debug("Monitoring started: %s stopped: %s", started, stopped)
+        for category in stopped:
+            self.sending_queue.put('monitor_stop?category={}'.format(category))
+        for category in started:
+            self.sending_queue.put('monitor_start?category={}'.format(category))
+        self.send_pending()
 
     def disconnect(self):
-        if not self.connected:
+        if self.connected:
             self.log.info("Disconnecting from BCP")
-            self.sending_queue.put('goodbye', None)
+            self.sending_queue.put('goodbye')
+            self.flush()
 
     def close(self):
-        try:
-            self.socket.shutdown(socket.SHUT_RDWR)
-            self.socket.close()
+        self.done = True
+        self.bcp_loop.call_soon(self._close_transport)
+
+        if self.recorder:
+            self.recorder.close()
 
-        except (OSError, AttributeError):
-            pass
+        self.receive_queue.clear()
+
+        with self.sending_queue.mutex:
+            self.sending_queue.queue.clear()
+        self.priority_messages.clear()
 
-        if self.caching_enabled:
-            self.cache_file.close()
+    def _close_transport(self):
+        if self._retry_handle:
+            self._retry_handle.cancel()
+            self._retry_handle = None
 
-        self.socket = None
+        if self.transport:
+            self.transport.close()
+
+        self.transport = None
         self.connected = False
+        self.connection_state = ConnectionState.DISCONNECTED
+
+    def stop(self):
+        """Close the connection and stop the BCP loop."""
+        self.simulator_timer.stop()
+        if self.replay:
+            self.replay.close()
+        self.close()
+        if self.owns_loop:
+            self.bcp_loop.stop()
+
+    def flush(self):
+        """Schedule send_pending() on the BCP loop. Can be called from any thread.
+
+        Only one flush is scheduled at a time, everything queued until it
+        runs goes out with it.
+        """
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.bcp_loop.call_soon(self.send_pending)
 
-        with self.receive_queue.mutex:
-            self.receive_queue.queue.clear()
+    def send_pending(self):
+        """Write all queued messages to the socket in one write. Runs on the
+        BCP loop.
 
-        with self.sending_queue.mutex:
-            self.sending_queue.queue.clear()
+        Priority messages (switch commands) go first.
+        """
+        # cleared before draining, so anything queued from now on is either
+        # sent by this call or schedules the next one
+        self._flush_scheduled = False
 
-    def sending_loop(self):
-        while self.connected and not self.mpfmon.thread_stopper.is_set():
-            try:
-                msg = self.sending_queue.get(block=True, timeout=1)
-            except queue.Empty:
-                if self.mpfmon.thread_stopper.is_set():
-                    return
+        if not self.transport:
+            # stay queued until we are connected
+            return
 
-                else:
-                    continue
+        messages = []
+        while self.priority_messages:
+            messages.append(self.priority_messages.popleft())
 
-            self.socket.sendall(('{}\n'.format(msg)).encode('utf-8'))
+        while True:
+            try:
+                messages.append(self.sending_queue.get_nowait())
+            except queue.Empty:
+                break
 
-        self.connected = False
+        if messages:
+            self.transport.write(("\n".join(messages) + "\n").encode('utf-8'))
 
-    def process_received_message(self, message):
+    def process_received_message(self, message, received=None):
         """Puts a received BCP message into the receiving queue.
 
         Args:
             message: The incoming BCP message
+            received: time.monotonic_ns() when the message was read from
+                the socket. Defaults to now.
 
         """
         self.log.debug('Received "%s"', message)
-        if self.caching_enabled and not self.simulate:
-            time = datetime.now() - self.last_time
-            message_tmr = math.floor(time.microseconds / 1000)
-            self.last_time = datetime.now()
-            self.cache_file.write(str(message_tmr) + "," + message + "\n")
+        if received is None:
+            received = time.monotonic_ns()
+        if self.recorder and not self.simulate:
+            self.recorder.record(received, message)
 
         try:
             cmd, kwargs = bcp.decode_command_string(message)
-            self.receive_queue.put((cmd, kwargs))
+            self.receive_queue.put((cmd, kwargs), received)
         except ValueError:
             self.log.error("DECODE BCP ERROR. Message: %s", message)
             raise
 
     def send(self, bcp_command, **kwargs):
-            self.sending_queue.put(bcp.encode_command_string(bcp_command,
-                                                             **kwargs))
+        """Send a BCP command. Can be called from any thread."""
+        message = bcp.encode_command_string(bcp_command, **kwargs)
+        if bcp_command in PRIORITY_COMMANDS:
+            self.priority_messages.append(message)
+        else:
+            self.sending_queue.put(message)
+        self.flush()
+
+    def replay_init(self):
+        try:
+            self.replay = ReplayEngine(self.replay_file, self.process_received_message)
+        except FileNotFoundError:
+            self.log.warning("Recording %s not found.", self.replay_file)
+            return
+
+        self.replay.set_speed(self.replay_speed)
+        # The timer only decides how often due messages are dispatched, the
+        # replay keeps its own session clock.
+        self.simulator_timer.setInterval(10)
+        self.simulator_timer.timeout.connect(self.replay_advance)
+        self.replay_play()
+
+    def replay_advance(self):
+        self.replay.advance()
+        if not self.replay.playing:
+            self.simulator_timer.stop()
+
+    def replay_play(self):
+        self.replay.play()
+        self.simulator_timer.start()
+
+    def replay_pause(self):
+        self.replay.pause()
+        self.simulator_timer.stop()
+
+    def replay_seek(self, offset):
+        """Jump to offset (microseconds since the start of the session)."""
+        self.receive_queue.clear()
+        self.replay.seek(offset)
 
     def simulator_init(self):
-        if self.caching_enabled:
-            self.simulator_msg_timer.append(int(0))
-            for message in self.cache_file:
-                message_tmr = int(message.split(',', 1)[0])
-                message_str = message.split(',', 1)[1]
-
-                self.simulator_msg_timer.append(message_tmr)
-                self.simulator_messages.append(message_str)
-        else:
-            messages = [
-                'device?json={"type": "switch", "name": "s_start", "changes": false, "state": {"state": 0, "recycle_jitter_count": 0}}',
-                'device?json={"type": "switch", "name": "s_trough_1", "changes": false, "state": {"state": 1, "recycle_jitter_count": 0}}',
-                'device?json={"type": "light", "name": "l_shoot_again", "changes": ["color", [255, 255, 255], [0, 0, 0]], "state": {"color": [0, 0, 0]}}',
-                'device?json={"type": "light", "name": "l_ball_save", "changes": ["color", [0, 0, 0], [255, 255, 255]], "state": {"color": [255, 255, 255]}}',
-            ]
-            self.simulator_messages = messages
-            self.simulator_msg_timer = [100, 100, 100, 100]
+        self.simulator_messages = deque([
+            'device?json={"type": "switch", "name": "s_start", "changes": false, "state": {"state": 0, "recycle_jitter_count": 0}}',
+            'device?json={"type": "switch", "name": "s_trough_1", "changes": false, "state": {"state": 1, "recycle_jitter_count": 0}}',
+            'device?json={"type": "light", "name": "l_shoot_again", "changes": ["color", [255, 255, 255], [0, 0, 0]], "state": {"color": [0, 0, 0]}}',
+            'device?json={"type": "light", "name": "l_ball_save", "changes": ["color", [0, 0, 0], [255, 255, 255]], "state": {"color": [255, 255, 255]}}',
+        ])
 
     def simulate_received(self):
-        if len(self.simulator_messages) > 0:
-            next_message = self.simulator_messages.pop(0)
-            timer = self.simulator_msg_timer.pop(0)
-            self.simulator_timer.setInterval(timer)
-            self.process_received_message(next_message)
+        if self.simulator_messages:
+            self.process_received_message(self.simulator_messages.popleft())
         else:
             self.simulator_timer.stop()
-            self.log.info("End of cached file reached.")
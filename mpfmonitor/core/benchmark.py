@@ -0,0 +1,141 @@
+"""Measures how many BCP messages per second the monitor can process."""
+
+import gc
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+
+def percentile(values, percent):
+    """Return the percent percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    """Return the peak resident memory of the process in MB, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class Benchmark(object):
+    """Feeds messages through the full receive path of an MPFMonitor.
+
+    Messages are handed to BCPClient.process_received_message() in batches
+    of batch_size, exactly like the BCP loop does, then MPFMonitor.tick()
+    processes them and Qt gets to update and paint the windows. The tick is
+    driven by the benchmark instead of the tick scheduler, so every batch
+    is one tick.
+    """
+
+    def __init__(self, monitor, messages, batch_size=1000, process_events=None,
+                 trace_memory=False):
+        self.log = logging.getLogger('Benchmark')
+        self.monitor = monitor
+        self.messages = messages
+        self.batch_size = batch_size
+        self.process_events = process_events
+        self.trace_memory = trace_memory
+
+    def run(self):
+        """Run the benchmark and return the results as a dict."""
+        monitor = self.monitor
+        process_received_message = monitor.bcp.process_received_message
+
+        # the benchmark decides when to tick
+        monitor.receive_queue.wakeup = None
+        monitor.receive_queue.clear()
+
+        tick_durations = []
+        count = 0
+        batch = 0
+
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        for message in self.messages:
+            process_received_message(message, time.monotonic_ns())
+            count += 1
+            batch += 1
+            if batch == self.batch_size:
+                tick_durations.append(self._tick())
+                batch = 0
+
+        if batch:
+            tick_durations.append(self._tick())
+        duration = time.perf_counter() - start
+
+        peak_traced = None
+        if self.trace_memory:
+            peak_traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        tick_durations.sort()
+        return {
+            'messages': count,
+            'seconds': duration,
+            'messages_per_second': count / duration if duration else 0.0,
+            'ticks': len(tick_durations),
+            'tick_ms': {
+                'p50': percentile(tick_durations, 50),
+                'p90': percentile(tick_durations, 90),
+                'p99': percentile(tick_durations, 99),
+                'max': tick_durations[-1] if tick_durations else 0.0,
+            },
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_traced_mb': peak_traced,
+        }
+
+    def _tick(self):
+        start = time.perf_counter()
+        self.monitor.tick()
+        if self.process_events:
+            self.process_events()
+        return (time.perf_counter() - start) * 1000
+
+
+def create_monitor(app, machine_path, config_file, show_windows=True):
+    """Create an MPFMonitor which does not connect to MPF."""
+    from mpfmonitor.core.mpfmon import MPFMonitor
+
+    monitor = MPFMonitor(app, machine_path, threading.Event(), config_file, testing=True)
+    # no simulated messages, the benchmark feeds its own
+    monitor.bcp.simulator_timer.stop()
+
+    if show_windows:
+        for window in (monitor.device_window, monitor.event_window, monitor.mode_window,
+                       monitor.variables_window, monitor.view):
+            window.show()
+
+    return monitor
+
+
+def format_results(results):
+    lines = [
+        "Messages:        {}".format(results['messages']),
+        "Duration:        {:.2f} s".format(results['seconds']),
+        "Throughput:      {:.0f} messages/s".format(results['messages_per_second']),
+        "Ticks:           {}".format(results['ticks']),
+        "Tick duration:   p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms, max {max:.2f} ms".format(
+            **results['tick_ms']),
+    ]
+    if results['peak_rss_mb'] is not None:
+        lines.append("Peak memory:     {:.1f} MB".format(results['peak_rss_mb']))
+    if results['peak_traced_mb'] is not None:
+        lines.append("Peak allocated:  {:.1f} MB (tracemalloc)".format(results['peak_traced_mb']))
+    return "\n".join(lines)
@@ -1,23 +1,91 @@
 import logging
 import time
-import os
+from collections import OrderedDict
 
 # will change these to specific imports once code is more final
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from PyQt6 import uic
+
+from mpfmonitor.core.filter_proxy import SORT_ROLE, QueryFilterProxyModel
+from mpfmonitor.core.history import DEVICE_HISTORY
+from mpfmonitor.core.query import MISSING
+from mpfmonitor.core.search import TrigramIndex
+from mpfmonitor.core.ui_loader import load_ui
 
 BRUSH_WHITE = QBrush(QColor(255, 255, 255), Qt.BrushStyle.SolidPattern)
 BRUSH_GREEN = QBrush(QColor(0, 255, 0), Qt.BrushStyle.SolidPattern)
 BRUSH_BLACK = QBrush(QColor(0, 0, 0), Qt.BrushStyle.SolidPattern)
 BRUSH_DARK_PURPLE = QBrush(QColor(128, 0, 255), Qt.BrushStyle.SolidPattern)
 
+# the state property the brush of a device type is calculated from. Other
+# types use their first property.
+BRUSH_KEYS = {
+    'light': 'color',
+    'switch': 'state',
+    'diverter': 'active',
+}
+
+
+class LightBrushes(object):
+    """Gamma corrected brushes of light colors, shared by all DeviceNodes.
+
+    The correction of every brightness is precalculated into a table and
+    the brushes of the last max_brushes colors are kept (least recently
+    used ones are dropped first). Light shows cycle through a few colors,
+    so most light updates just look up their brush.
+    """
+
+    def __init__(self, gamma=0.5, constant=18, max_brushes=256):
+        self.log = logging.getLogger('Light Brushes')
+        self.table = []
+        self.brushes = OrderedDict()
+        self.max_brushes = max_brushes
+        self.configure(gamma, constant, max_brushes)
+
+    def configure(self, gamma=0.5, constant=18, max_brushes=256):
+        """Set the correction and cache size, e.g. from the monitor config.
+
+        Feel free to fiddle with these constants until it feels right.
+        With gamma = 0.5 and constant = 18, the top 54 values are lost,
+        but the bottom 25% feels much more normal.
+        """
+        self.table = [min(int(pow(value, gamma) * constant), 255) for value in range(256)]
+        self.brushes = OrderedDict()
+        self.max_brushes = max_brushes
+
+    def correct(self, color):
+        """Return the gamma corrected color."""
+        corrected = []
+        for value in color:
+            if not 0 <= value <= 255:
+                self.log.warning("Got value %s for brightness which outside the expected range", value)
+                value = 0
+            corrected.append(self.table[int(value)])
+        return corrected
+
+    def brush(self, color):
+        """Return the brush of an (uncorrected) light color."""
+        key = tuple(color)
+        brush = self.brushes.get(key)
+        if brush is not None:
+            self.brushes.move_to_end(key)
+            return brush
+
+        brush = QBrush(QColor(*self.correct(color)), Qt.BrushStyle.SolidPattern)
+        self.brushes[key] = brush
+        if len(self.brushes) > self.max_brushes:
+            self.brushes.popitem(last=False)
+        return brush
+
+
+LIGHT_BRUSHES = LightBrushes()
+
 
 class DeviceNode:
 
-    __slots__ = ["_callback", "_name", "_data", "_type", "_brush", "q_name", "q_state", "sub_properties",
-                 "sub_properties_appended", "q_time_added", "log"]
+    __slots__ = ["_callback", "_name", "_data", "_type", "_brush", "_model", "type_row", "row",
+                 "time_added", "properties_fetched", "history", "log"]
 
     def __init__(self):
         self._callback = None
@@ -26,27 +94,39 @@ class DeviceNode:
         self._type = ""
         self._brush = BRUSH_BLACK
 
-        self.q_name = QStandardItem()
-        self.q_state = QStandardItem()
-        self.sub_properties = {}
-        self.sub_properties_appended = False
-
-        self.q_time_added = QStandardItem()
-        self.q_time_added.setData(time.perf_counter(), Qt.ItemDataRole.DisplayRole)
+        # set once the DeviceTreeModel shows this device
+        self._model = None
+        self.type_row = None
+        self.row = None
+        # the property rows only exist while the device is expanded
+        self.properties_fetched = False
 
-        self.q_name.setDragEnabled(True)
-        self.q_state.setData("", Qt.ItemDataRole.DisplayRole)
+        self.time_added = time.perf_counter()
+        # None once the memory cap of all histories is reached
+        self.history = DEVICE_HISTORY.allocate()
 
         self.log = logging.getLogger('Device')
 
     def setName(self, name):
         self._name = name
-        self.q_name.setData(str(self._name), Qt.ItemDataRole.DisplayRole)
         self.log = logging.getLogger('Device {}'.format(self._name))
-        self.q_state.emitDataChanged()
 
-    def setData(self, data):
-        """Set data of device."""
+    def setData(self, data, changes=None):
+        """Set data of device.
+
+        changes is [property, old value, new value], the only property which
+        changed as MPF sends it with every device update. If this node still
+        has the old value, the states are not compared and only that property
+        is updated. Otherwise (the initial state, several merged updates or a
+        node which missed updates, e.g. after a seek in a replay) the whole
+        state is compared.
+        """
+        if changes and isinstance(data, dict) and data.keys() == self._data.keys():
+            changed = changes[0]
+            if changed in data and self._data[changed] == changes[1]:
+                self._set_changed_property(data, changed)
+                return
+
         if data == self._data:
             # do nothing if data did not change
             return
@@ -54,37 +134,52 @@ class DeviceNode:
         if not isinstance(data, dict):
             data = {}
 
+        if self.history is not None:
+            self.history.record(data)
+
         if self._callback:
             self._callback()
 
-        self._data = data
+        model = self._model
+        if model is not None and len(data) != len(self._data):
+            model.replace_properties(self, data)
+        else:
+            self._data = data
 
-        state_str = str(list(self._data.values())[0])
-        if len(self._data) > 1:
-            state_str = state_str + " {…}"
-        self.q_state.setData(state_str, Qt.ItemDataRole.DisplayRole)
+        self._brush = self._calculate_colored_brush()
 
-        for row in self._data:
-            if not self.sub_properties_appended:
-                q_property = QStandardItem()
-                q_value = QStandardItem()
-                self.sub_properties.update({row: [q_property, q_value]})
-                self.q_name.appendRow(self.sub_properties.get(row))
+        if model is not None:
+            model.device_changed(self)
 
-            self.sub_properties.get(row)[0].setData(str(row), Qt.ItemDataRole.DisplayRole)
-            self.sub_properties.get(row)[1].setData(str(self._data.get(row)), Qt.ItemDataRole.DisplayRole)
+    def _set_changed_property(self, data, changed):
+        self._data = data
+        if self.history is not None:
+            self.history.record(data, changed)
 
-        self.sub_properties_appended = True
-        self.q_state.emitDataChanged()
-        self._brush = self._calculate_colored_brush()
+        if changed == BRUSH_KEYS.get(self._type, next(iter(data))):
+            self._brush = self._calculate_colored_brush()
+            # the playfield only draws the brush
+            if self._callback:
+                self._callback()
+
+        if self._model is not None:
+            self._model.device_changed(self, changed)
 
     def setType(self, type):
         self._type = type
         self._brush = self._calculate_colored_brush()
-        self.q_state.emitDataChanged()
 
-    def get_row(self):
-        return [self.q_name, self.q_state, self.q_time_added]
+    def name(self):
+        return self._name
+
+    def state_str(self):
+        """Return the first state property, the way the device list shows it."""
+        if not self._data:
+            return ""
+        state_str = str(next(iter(self._data.values())))
+        if len(self._data) > 1:
+            state_str = state_str + " {…}"
+        return state_str
 
     def data(self):
         return self._data
@@ -97,27 +192,8 @@ class DeviceNode:
         return self._brush
 
     def _calculate_color_gamma_correction(self, color):
-        """Perform gamma correction.
-
-        Feel free to fiddle with these constants until it feels right
-        With gamma = 0.5 and constant a = 18, the top 54 values are lost,
-        but the bottom 25% feels much more normal.
-        """
-        gamma = 0.5
-        a = 18
-        corrected = []
-
-        for value in color:
-            if value < 0 or value > 255:
-                self.log.warning("Got value %s for brightness which outside the expected range", value)
-                value = 0
-
-            value = int(pow(value, gamma) * a)
-            if value > 255:
-                value = 255
-            corrected.append(value)
-
-        return corrected
+        """Perform gamma correction, see LightBrushes."""
+        return LIGHT_BRUSHES.correct(color)
 
     def _calculate_colored_brush(self):
         if self._type == 'light':
@@ -125,7 +201,7 @@ class DeviceNode:
             if color == [0, 0, 0]:
                 # shortcut for black
                 return BRUSH_BLACK
-            color = self._calculate_color_gamma_correction(color)
+            return LIGHT_BRUSHES.brush(color)
 
         elif self._type == 'switch':
             state = self.data()['state']
@@ -150,8 +226,6 @@ class DeviceNode:
             else:
                 return BRUSH_BLACK
 
-        return QBrush(QColor(*color), Qt.BrushStyle.SolidPattern)
-
     def set_change_callback(self, callback):
         if self._callback:
             # raise AssertionError("Can only have one callback")
@@ -160,7 +234,420 @@ class DeviceNode:
             return old_callback
         else:
             self._callback = callback
-            self.q_state.emitDataChanged()
+
+
+# internal ids of the indexes of DeviceTreeModel:
+#   0                                - a device type
+#   (type_row + 1) << 32             - a device of that type
+#   (type_row + 1) << 32 | row + 1   - a state property of that device
+TYPE_ID = 0
+ROW_MASK = 0xffffffff
+
+COLUMN_NAME = 0
+COLUMN_DATA = 1
+COLUMN_TIME_ADDED = 2   # hidden, used for sorting
+
+DISPLAY_ROLES = [Qt.ItemDataRole.DisplayRole]
+
+
+class DeviceTreeModel(QAbstractItemModel):
+    """Tree of device types, devices and their state properties.
+
+    The devices of each type are kept in a plain list of DeviceNodes and
+    indexes only carry row numbers, so no Qt object is created per device
+    or property. DeviceNode.setData only remembers which rows changed. Once
+    per tick emit_changes() inserts the devices which were added and emits
+    one dataChanged for the range of changed rows of each type, plus one
+    for the properties of each changed device which is expanded.
+
+    The property rows of a device are only inserted when the view expands
+    it (fetchMore) and removed again when it is collapsed, so collapsed
+    devices never update property rows.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.types = []
+        self.type_rows = dict()
+        self.type_time_added = []
+        self.devices = []
+
+        self.pending_types = []
+        self.pending_devices = dict()
+        self.changed_rows = dict()
+        self.changed_properties = dict()
+
+    def add_device(self, node):
+        """Add a device. It is shown with the next emit_changes()."""
+        node._model = self
+        if node._type not in self.type_rows and node._type not in self.pending_devices:
+            self.pending_types.append(node._type)
+        self.pending_devices.setdefault(node._type, []).append(node)
+
+    def device_changed(self, node, changed=None):
+        """Remember that a device changed, or only its property changed."""
+        if node.row is None:
+            # not inserted yet, shown with its latest data anyway
+            return
+
+        if node.properties_fetched:
+            if changed is None:
+                self.changed_properties[node] = None
+            elif node in self.changed_properties:
+                keys = self.changed_properties[node]
+                if keys is not None:
+                    keys.add(changed)
+            else:
+                self.changed_properties[node] = {changed}
+
+        if changed is not None and changed != next(iter(node._data)):
+            # the device row only shows the first property
+            return
+
+        rows = self.changed_rows.get(node.type_row)
+        if rows is None:
+            self.changed_rows[node.type_row] = [node.row, node.row]
+        elif node.row < rows[0]:
+            rows[0] = node.row
+        elif node.row > rows[1]:
+            rows[1] = node.row
+
+    def replace_properties(self, node, data):
+        """Called by DeviceNode.setData when the number of properties changes."""
+        if not node.properties_fetched:
+            node._data = data
+            return
+
+        parent = self.createIndex(node.row, 0, (node.type_row + 1) << 32)
+        if node._data:
+            self.beginRemoveRows(parent, 0, len(node._data) - 1)
+            node._data = {}
+            self.endRemoveRows()
+
+        if data:
+            self.beginInsertRows(parent, 0, len(data) - 1)
+            node._data = data
+            self.endInsertRows()
+        else:
+            node._data = data
+
+    def emit_changes(self):
+        """Show added devices and emit the coalesced changes. Called once per tick."""
+        if self.pending_types:
+            first = len(self.types)
+            self.beginInsertRows(QModelIndex(), first, first + len(self.pending_types) - 1)
+            for type_name in self.pending_types:
+                self.type_rows[type_name] = len(self.types)
+                self.types.append(type_name)
+                self.type_time_added.append(time.perf_counter())
+                self.devices.append([])
+            self.endInsertRows()
+            self.pending_types = []
+
+        for type_name, nodes in self.pending_devices.items():
+            type_row = self.type_rows[type_name]
+            devices = self.devices[type_row]
+            first = len(devices)
+            self.beginInsertRows(self.createIndex(type_row, 0, TYPE_ID), first, first + len(nodes) - 1)
+            for row, node in enumerate(nodes, first):
+                node.type_row = type_row
+                node.row = row
+            devices.extend(nodes)
+            self.endInsertRows()
+        self.pending_devices = dict()
+
+        for type_row, (first, last) in self.changed_rows.items():
+            device_id = (type_row + 1) << 32
+            self.dataChanged.emit(self.createIndex(first, COLUMN_DATA, device_id),
+                                  self.createIndex(last, COLUMN_DATA, device_id), DISPLAY_ROLES)
+        self.changed_rows = dict()
+
+        for node, keys in self.changed_properties.items():
+            if not node._data:
+                continue
+            property_id = (node.type_row + 1) << 32 | node.row + 1
+            if keys is None:
+                # the names as well, the properties might be different ones
+                self.dataChanged.emit(self.createIndex(0, COLUMN_NAME, property_id),
+                                      self.createIndex(len(node._data) - 1, COLUMN_DATA, property_id),
+                                      DISPLAY_ROLES)
+                continue
+            names = list(node._data)
+            for key in keys:
+                row = names.index(key)
+                self.dataChanged.emit(self.createIndex(row, COLUMN_DATA, property_id),
+                                      self.createIndex(row, COLUMN_DATA, property_id), DISPLAY_ROLES)
+        self.changed_properties = dict()
+
+    def node(self, index):
+        """Return the DeviceNode of a device index, or None."""
+        internal_id = index.internalId()
+        if not index.isValid() or internal_id == TYPE_ID or internal_id & ROW_MASK:
+            return None
+        return self.devices[(internal_id >> 32) - 1][index.row()]
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node is not None and not node.properties_fetched and bool(node._data)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node is None or node.properties_fetched or not node._data:
+            return
+
+        self.beginInsertRows(parent, 0, len(node._data) - 1)
+        node.properties_fetched = True
+        self.endInsertRows()
+
+    def release_properties(self, index):
+        """Remove the property rows of a device which was collapsed."""
+        node = self.node(index)
+        if node is None or not node.properties_fetched:
+            return
+
+        if node._data:
+            self.beginRemoveRows(index, 0, len(node._data) - 1)
+            node.properties_fetched = False
+            self.endRemoveRows()
+        else:
+            node.properties_fetched = False
+        self.changed_properties.pop(node, None)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if row < 0 or not 0 <= column < 3:
+            return QModelIndex()
+
+        if not parent.isValid():
+            if row < len(self.types):
+                return self.createIndex(row, column, TYPE_ID)
+            return QModelIndex()
+
+        parent_id = parent.internalId()
+        if parent_id == TYPE_ID:
+            if row < len(self.devices[parent.row()]):
+                return self.createIndex(row, column, (parent.row() + 1) << 32)
+        elif not parent_id & ROW_MASK:
+            node = self.devices[(parent_id >> 32) - 1][parent.row()]
+            if node.properties_fetched and row < len(node._data):
+                return self.createIndex(row, column, parent_id | parent.row() + 1)
+        return QModelIndex()
+
+    def parent(self, index=None):
+        if index is None:
+            # QObject.parent()
+            return super().parent()
+
+        internal_id = index.internalId()
+        if not index.isValid() or internal_id == TYPE_ID:
+            return QModelIndex()
+        row = internal_id & ROW_MASK
+        if not row:
+            return self.createIndex((internal_id >> 32) - 1, 0, TYPE_ID)
+        return self.createIndex(row - 1, 0, internal_id & ~ROW_MASK)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.types)
+        if parent.column() > 0:
+            return 0
+
+        parent_id = parent.internalId()
+        if parent_id == TYPE_ID:
+            return len(self.devices[parent.row()])
+        if not parent_id & ROW_MASK:
+            node = self.devices[(parent_id >> 32) - 1][parent.row()]
+            return len(node._data) if node.properties_fetched else 0
+        return 0
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self.types)
+        if parent.column() > 0:
+            return False
+
+        parent_id = parent.internalId()
+        if parent_id == TYPE_ID:
+            return bool(self.devices[parent.row()])
+        if not parent_id & ROW_MASK:
+            return bool(self.devices[(parent_id >> 32) - 1][parent.row()]._data)
+        return False
+
+    def columnCount(self, parent=QModelIndex()):
+        return 3
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        # the proxy sorts by SORT_ROLE, which is the display data: names and the float time added
+        if (role != Qt.ItemDataRole.DisplayRole and role != SORT_ROLE) or not index.isValid():
+            return None
+
+        column = index.column()
+        internal_id = index.internalId()
+        if internal_id == TYPE_ID:
+            if column == COLUMN_NAME:
+                return self.types[index.row()]
+            if column == COLUMN_TIME_ADDED:
+                return self.type_time_added[index.row()]
+            return None
+
+        row = internal_id & ROW_MASK
+        if not row:
+            node = self.devices[(internal_id >> 32) - 1][index.row()]
+            if column == COLUMN_NAME:
+                return str(node._name)
+            if column == COLUMN_DATA:
+                return node.state_str()
+            return node.time_added
+
+        node = self.devices[(internal_id >> 32) - 1][row - 1]
+        if column == COLUMN_TIME_ADDED or index.row() >= len(node._data):
+            return None
+        key = list(node._data)[index.row()]
+        if column == COLUMN_NAME:
+            return str(key)
+        return str(node._data[key])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return ("Device", "Data", "Added")[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        internal_id = index.internalId()
+        if index.column() == COLUMN_NAME and internal_id != TYPE_ID and not internal_id & ROW_MASK:
+            # devices can be dragged to the playfield
+            flags |= Qt.ItemFlag.ItemIsDragEnabled
+        return flags
+
+
+def device_field(node, field):
+    """Return a field of a device for filter queries.
+
+    Devices have a name, a type, the time of their last change and the
+    properties of their state.
+    """
+    if field == 'name':
+        return node._name
+    if field == 'type':
+        return node._type
+    if field == 'time':
+        return MISSING if node.history is None else node.history.last_time()
+    return node._data.get(field, MISSING)
+
+
+class DeviceFilterProxyModel(QueryFilterProxyModel):
+    """Filters the device tree with a query (see mpfmonitor.core.query).
+
+    Words and name: or type: terms take their candidates from a
+    TrigramIndex of the device names and from the devices of the matching
+    types, so the rest of the query is only evaluated for those. Rows are
+    then accepted by membership in the set of matching devices, without
+    Qt's recursive filtering checking the children of every row. Property
+    rows are shown with their device.
+
+    While the query refers to state properties, the devices which changed
+    are evaluated again once per tick (update_filter).
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent, device_field, ('name', 'type'))
+        self.name_index = TrigramIndex()
+        self.devices_by_type = dict()
+        # None while not filtering
+        self.matching_devices = None
+        self.matching_types = set()
+        self.stateful = False
+        self.changed_devices = set()
+        self.invalidate_pending = False
+
+    def add_device(self, node):
+        """Index a new device. Call before the model inserts it."""
+        self.name_index.add(node, node.name())
+        self.devices_by_type.setdefault(node.type(), []).append(node)
+        if self.matching_devices is None or not self.query.matches(node):
+            return
+
+        self.matching_devices.add(node)
+        if node.type() not in self.matching_types:
+            # the type row might already be filtered out
+            self.matching_types.add(node.type())
+            self.invalidate_pending = True
+
+    def device_changed(self, node):
+        if self.stateful:
+            self.changed_devices.add(node)
+
+    def refresh(self):
+        self.changed_devices = set()
+        self.invalidate_pending = False
+        if self.query is None:
+            self.matching_devices = None
+            self.matching_types = set()
+            self.stateful = False
+        else:
+            self.stateful = bool(self.query.fields() - {None, 'name', 'type'})
+            now = time.time()
+            self.matching_devices = {node for node in self._candidates() if self.query.matches(node, now)}
+            self.matching_types = {node.type() for node in self.matching_devices}
+        self.invalidateRowsFilter()
+
+    def _candidates(self):
+        candidates = None
+        for term in self.query.terms:
+            if term.text[0] in "\"'":
+                continue
+            if term.field is None:
+                found = self.name_index.search(term.text) | self._devices_of_types(term.text)
+            elif term.field == 'name' and term.operator in (':', '='):
+                found = self.name_index.search(term.text)
+            elif term.field == 'type' and term.operator in (':', '='):
+                found = self._devices_of_types(term.text)
+            else:
+                continue
+            candidates = found if candidates is None else candidates & found
+
+        return self.name_index.names if candidates is None else candidates
+
+    def _devices_of_types(self, text):
+        return {node for type_name, nodes in self.devices_by_type.items()
+                if TrigramIndex.matches(text, type_name) for node in nodes}
+
+    def update_filter(self):
+        """Filter the devices which were added or changed again. Called once per tick."""
+        if self.changed_devices:
+            now = time.time()
+            for node in self.changed_devices:
+                if self.query.matches(node, now) != (node in self.matching_devices):
+                    if node in self.matching_devices:
+                        self.matching_devices.discard(node)
+                    else:
+                        self.matching_devices.add(node)
+                    self.invalidate_pending = True
+            self.changed_devices = set()
+
+        if self.invalidate_pending:
+            self.invalidate_pending = False
+            self.matching_types = {node.type() for node in self.matching_devices}
+            self.invalidateRowsFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.matching_devices is None:
+            return True
+
+        model = self.sourceModel()
+        if not source_parent.isValid():
+            return model.types[source_row] in self.matching_types
+
+        parent_id = source_parent.internalId()
+        if parent_id == TYPE_ID:
+            node = model.devices[source_parent.row()][source_row]
+        else:
+            # a property, shown with its device
+            node = model.devices[(parent_id >> 32) - 1][source_parent.row()]
+        return node in self.matching_devices
 
 
 class DeviceDelegate(QStyledItemDelegate):
@@ -303,10 +790,66 @@ class DeviceDelegate(QStyledItemDelegate):
             return QSize(80, 20)
 
 
+class DeviceHistoryDialog(QDialog):
+    """Recent states of a device, newest first. Refreshed while open."""
+
+    def __init__(self, node, parent=None):
+        super().__init__(parent)
+        self.node = node
+        self.shown_recorded = None
+
+        self.setWindowTitle("History of {} {}".format(node.type(), node.name()))
+        self.resize(500, 400)
+
+        self.table = QTableWidget(0, 3, self)
+        self.table.setHorizontalHeaderLabels(["Time", "+ms", "Change"])
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(500)
+        self.refresh()
+
+    def refresh(self):
+        history = self.node.history
+        if history is None:
+            self.table.setRowCount(1)
+            self.table.setItem(0, 2, QTableWidgetItem("Not recorded, the history limit was reached"))
+            return
+
+        if history.recorded == self.shown_recorded:
+            return
+        self.shown_recorded = history.recorded
+
+        entries = history.entries()
+        self.table.setRowCount(len(entries))
+        previous = None
+        for row, (timestamp, changed, value) in zip(range(len(entries) - 1, -1, -1), entries):
+            time_str = time.strftime("%H:%M:%S", time.localtime(timestamp)) + \
+                ".{:03d}".format(int(timestamp * 1000) % 1000)
+            delta = "" if previous is None else "{:.0f}".format((timestamp - previous) * 1000)
+            previous = timestamp
+
+            self.table.setItem(row, 0, QTableWidgetItem(time_str))
+            self.table.setItem(row, 1, QTableWidgetItem(delta))
+            if changed is None:
+                # complete state as (property, value) tuples
+                text = ", ".join("{}: {}".format(key, item) for key, item in value)
+            else:
+                text = "{}: {}".format(changed, value)
+            self.table.setItem(row, 2, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+
 class DeviceWindow(QWidget):
 
     __slots__ = ["mpfmn", "ui", "model", "log", "already_hidden", "added_index", "device_states",
-                 "device_type_widgets", "_debug_enabled"]
+                 "device_count", "_debug_enabled"]
 
     def __init__(self, mpfmon):
         self.mpfmon = mpfmon
@@ -323,15 +866,21 @@ class DeviceWindow(QWidget):
         self.added_index = 0
 
         self.device_states = dict()
-        self.device_type_widgets = dict()
+        self.device_count = 0
         self._debug_enabled = self.log.isEnabledFor(logging.DEBUG)
 
+        # the filter is applied once typing paused
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_string = ""
+
     def draw_ui(self):
         # Load ui file from ./ui/
-        ui_path = os.path.join(os.path.dirname(__file__), "ui", "searchable_tree.ui")
-        self.ui = uic.loadUi(ui_path, self)
+        self.ui = load_ui("searchable_tree.ui", self)
 
-        self.ui.setWindowTitle('Devices')
+        self.ui.setWindowTitle(self.mpfmon.window_title('Devices'))
 
         self.ui.move(self.mpfmon.local_settings.value('windows/devices/pos',
                                             QPoint(200, 200)))
@@ -348,6 +897,9 @@ class DeviceWindow(QWidget):
         assert (self.ui is not None)
         self.ui.treeView.expanded.connect(self.resize_columns_to_content)
         self.ui.treeView.collapsed.connect(self.resize_columns_to_content)
+        self.ui.treeView.collapsed.connect(self.release_properties)
+        self.ui.treeView.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.ui.treeView.customContextMenuRequested.connect(self.show_context_menu)
         self.ui.filterLineEdit.textChanged.connect(self.filter_text)
         self.ui.sortComboBox.currentIndexChanged.connect(self.change_sort)
 
@@ -355,8 +907,7 @@ class DeviceWindow(QWidget):
         assert (self.ui is not None)
         self.treeview = self.ui.treeView
 
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(["Device", "Data"])
+        self.model = DeviceTreeModel(self)
 
         self.treeview.setDragDropMode(QAbstractItemView.DragDropMode.DragOnly)
         # self.treeview.setItemDelegateForColumn(1, DeviceDelegate())
@@ -364,56 +915,76 @@ class DeviceWindow(QWidget):
         # Resizing to contents causes huge performance losses. Only resize when rows expanded or collapsed.
         # self.treeview.header().setSectionResizeMode(QHeaderView.ResizeToContents)
 
-        self.filtered_model = QSortFilterProxyModel(self)
+        self.filtered_model = DeviceFilterProxyModel(self)
         self.filtered_model.setSourceModel(self.model)
-        self.filtered_model.setRecursiveFilteringEnabled(True)
-        self.filtered_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
 
         self.treeview.setModel(self.filtered_model)
+        self.treeview.setColumnHidden(COLUMN_TIME_ADDED, True)
+
+    def release_properties(self, index):
+        self.model.release_properties(self.filtered_model.mapToSource(index))
+
+    def show_context_menu(self, pos):
+        node = self.model.node(self.filtered_model.mapToSource(self.ui.treeView.indexAt(pos)))
+        if node is None:
+            return
+
+        menu = QMenu(self)
+        menu.addAction("Show History", lambda: self.show_history(node))
+        menu.exec(self.ui.treeView.viewport().mapToGlobal(pos))
+
+    def show_history(self, node):
+        dialog = DeviceHistoryDialog(node, self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.show()
+        return dialog
 
     def resize_columns_to_content(self):
         self.ui.treeView.resizeColumnToContents(0)
         self.ui.treeView.resizeColumnToContents(1)
 
     def process_device_update(self, name, state, changes, type):
-        del changes
         if self._debug_enabled:
             self.log.debug("Device Update: %s.%s: %s", type, name, state)
 
-        if type not in self.device_states:
-            self.device_states[type] = dict()
-
-            item = QStandardItem(type)
-            self.device_type_widgets[type] = item
+        devices = self.device_states.get(type)
+        if devices is None:
+            devices = self.device_states[type] = dict()
 
-            self.model.appendRow([item, QStandardItem(), QStandardItem(str(time.perf_counter()))])
-
-        if name not in self.device_states[type]:
+        node = devices.get(name)
+        if node is None:
             node = DeviceNode()
             node.setName(name)
             node.setData(state)
             node.setType(type)
 
-            self.device_states[type][name] = node
-            self.device_type_widgets[type].appendRow(node.get_row())
+            devices[name] = node
+            self.filtered_model.add_device(node)
+            self.model.add_device(node)
+            self.device_count += 1
 
             self.mpfmon.pf.create_widget_from_config(node, type, name)
         else:
-            self.device_states[type][name].setData(state)
+            node.setData(state, changes)
+            if self.filtered_model.stateful:
+                self.filtered_model.device_changed(node)
 
-        self.ui.treeView.setColumnHidden(2, True)
+    def update_devices(self):
+        """Show the device updates of this tick in the tree."""
+        self.model.emit_changes()
+        self.filtered_model.update_filter()
 
     def filter_text(self, string):
-        wc_string = "*" + str(string) + "*"
-        self.filtered_model.setFilterWildcard(wc_string)
-        self.ui.treeView.resizeColumnToContents(0)
-        self.ui.treeView.resizeColumnToContents(1)
+        self.filter_string = string
+        self.filter_timer.start()
 
-    def change_sort(self, index=1):
-        self.model.layoutAboutToBeChanged.emit()
-        self.filtered_model.beginResetModel()
+    def apply_filter(self):
+        self.filtered_model.set_filter_string(self.filter_string)
+        self.resize_columns_to_content()
 
-        # This is a bit sloppy and probably should be reworked.
+    def change_sort(self, index=1):
+        # The proxy sorts once and keeps the order of new and changed rows
+        # itself, so the view keeps its expanded rows and selection.
         if index == 1:  # Received up
             self.filtered_model.sort(2, Qt.SortOrder.AscendingOrder)
         elif index == 2:  # Received down
@@ -423,8 +994,15 @@ class DeviceWindow(QWidget):
         elif index == 4:  # Name down
             self.filtered_model.sort(0, Qt.SortOrder.DescendingOrder)
 
-        self.filtered_model.endResetModel()
-        self.model.layoutChanged.emit()
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
 
     def closeEvent(self, event):
         super().closeEvent(event)
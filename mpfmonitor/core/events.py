@@ -1,9 +1,11 @@
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from PyQt6 import uic
 
-import os
+from mpfmonitor.core.filter_proxy import RECORD_ROLE, SORT_ROLE, QueryFilterProxyModel, Record
+from mpfmonitor.core.ui_loader import load_ui
+
+import time
 
 
 class EventWindow(QWidget):
@@ -23,10 +25,9 @@ class EventWindow(QWidget):
 
     def draw_ui(self):
         # Load ui file from ./ui/
-        ui_path = os.path.join(os.path.dirname(__file__), "ui", "searchable_table.ui")
-        self.ui = uic.loadUi(ui_path, self)
+        self.ui = load_ui("searchable_table.ui", self)
 
-        self.ui.setWindowTitle('Events')
+        self.ui.setWindowTitle(self.mpfmon.window_title('Events'))
 
         self.ui.move(self.mpfmon.local_settings.value('windows/events/pos',
                                                    QPoint(500, 200)))
@@ -50,10 +51,8 @@ class EventWindow(QWidget):
         self.model.setHeaderData(1, Qt.Orientation.Horizontal, "Data")
         # self.model.setHeaderData(2, Qt.Orientation.Horizontal, "Time")
 
-        self.filtered_model = QSortFilterProxyModel(self)
+        self.filtered_model = QueryFilterProxyModel(self)
         self.filtered_model.setSourceModel(self.model)
-        self.filtered_model.setFilterKeyColumn(0)
-        self.filtered_model.setDynamicSortFilter(True)
 
         self.change_sort()  # Default sort
 
@@ -69,8 +68,12 @@ class EventWindow(QWidget):
         event_kwargs.pop('_from_bcp', False)
 
         name = QStandardItem(event_name)
+        name.setData(event_name, SORT_ROLE)
+        name.setData(Record({'name': event_name, 'event': event_name, 'time': time.time()}, event_kwargs),
+                     RECORD_ROLE)
         kwargs = QStandardItem(str(event_kwargs))
-        time_added = QStandardItem(str(self.added_index).zfill(10))
+        time_added = QStandardItem()
+        time_added.setData(float(self.added_index), SORT_ROLE)
         self.added_index += 1
         self.model.insertRow(0, [name, kwargs, time_added])
 
@@ -84,8 +87,7 @@ class EventWindow(QWidget):
             self.already_hidden = True
 
     def filter_text(self, string):
-        wc_string = "*" + str(string) + "*"
-        self.filtered_model.setFilterWildcard(wc_string)
+        self.filtered_model.set_filter_string(str(string))
         self.ui.tableView.resizeColumnToContents(0)
         self.ui.tableView.resizeColumnToContents(1)
 
@@ -100,6 +102,16 @@ class EventWindow(QWidget):
         elif index == 4:  # Name down
             self.filtered_model.sort(0, Qt.SortOrder.DescendingOrder)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
     def closeEvent(self, event):
         self.mpfmon.write_local_settings()
         event.accept()
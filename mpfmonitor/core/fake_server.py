@@ -0,0 +1,173 @@
+"""A stand-in for MPF which serves synthetic BCP traffic to the monitor."""
+
+import asyncio
+import logging
+import random
+
+import mpf.core.bcp.bcp_socket_client as bcp
+
+from mpfmonitor.core.synthetic import SyntheticMachine
+
+MESSAGE_CATEGORIES = {
+    'device': 'devices',
+    'monitored_event': 'events',
+    'mode_list': 'modes',
+    'player_variable': 'player_vars',
+    'machine_variable': 'machine_vars',
+}
+
+
+class FakeMPFClient(object):
+    """One connected monitor."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.categories = set()
+
+    def send(self, messages):
+        """Write the messages of the categories this client monitors."""
+        data = [message for message in messages
+                if MESSAGE_CATEGORIES.get(message.split('?', 1)[0]) in self.categories]
+        if data:
+            self.writer.write(("\n".join(data) + "\n").encode("utf-8"))
+
+
+class FakeMPFServer(object):
+    """Serves the BCP monitor protocol of a SyntheticMachine.
+
+    Each connected monitor gets the state of a category when it sends
+    monitor_start, and from then on all changes of that category. The
+    machine runs a light show, hits random switches, posts events (with
+    occasional bursts), scores points and starts and stops modes at the
+    configured rates. switch commands from the monitor change the switch
+    right away and the update is sent back immediately, so the round trip
+    time of a switch toggle in the monitor can be measured without
+    hardware.
+
+    All rates are per second, 0 disables a generator.
+    """
+
+    def __init__(self, machine=None, host='localhost', port=5051, light_rate=30, pattern='chase',
+                 switch_rate=5, event_rate=10, burst_size=200, burst_interval=10,
+                 variable_rate=2, mode_interval=15):
+        self.log = logging.getLogger('Fake MPF')
+        self.machine = machine if machine is not None else SyntheticMachine()
+        self.host = host
+        self.port = port
+        self.light_rate = light_rate
+        self.pattern = pattern
+        self.switch_rate = switch_rate
+        self.event_rate = event_rate
+        self.burst_size = burst_size
+        self.burst_interval = burst_interval
+        self.variable_rate = variable_rate
+        self.mode_interval = mode_interval
+
+        self.clients = []
+        self.server = None
+        self.received_switches = 0
+        self.sent_messages = 0
+        self._tasks = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.log.info("Fake MPF listening on %s:%s", self.host, self.port)
+
+        generators = (
+            (self.light_rate, lambda: self.machine.light_show_step(self.pattern)),
+            (self.switch_rate, lambda: [self.machine.toggle_random_switch()]),
+            (self.event_rate, lambda: self.machine.event_messages(1)),
+            (self.variable_rate, self.machine.variable_messages),
+        )
+        for rate, generate in generators:
+            if rate:
+                self._tasks.append(asyncio.ensure_future(self._generate(1 / rate, generate)))
+
+        if self.burst_size and self.burst_interval:
+            self._tasks.append(asyncio.ensure_future(self._generate(
+                self.burst_interval, lambda: self.machine.event_messages(self.burst_size))))
+        if self.mode_interval:
+            self._tasks.append(asyncio.ensure_future(self._generate(
+                self.mode_interval, lambda: [self.machine.mode_message()])))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for client in self.clients:
+            client.writer.close()
+
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def broadcast(self, messages):
+        for client in self.clients:
+            client.send(messages)
+        self.sent_messages += len(messages)
+
+    async def _generate(self, interval, generate):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        while True:
+            # jitter a little so the generators do not run in lock step
+            next_run += interval * random.uniform(.8, 1.2)
+            await asyncio.sleep(max(0, next_run - loop.time()))
+            self.broadcast(generate())
+
+    async def _handle_client(self, reader, writer):
+        client = FakeMPFClient(writer)
+        self.clients.append(client)
+        self.log.info("Monitor connected")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").strip()
+                if line and not self.process_command(client, line):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.remove(client)
+            writer.close()
+            self.log.info("Monitor disconnected")
+
+    def process_command(self, client, message):
+        """Handle a command from the monitor. Returns False on goodbye."""
+        cmd, kwargs = bcp.decode_command_string(message)
+
+        if cmd == 'monitor_start':
+            category = kwargs.get('category')
+            client.categories.add(category)
+            client.send(self.get_state(category))
+        elif cmd == 'monitor_stop':
+            client.categories.discard(kwargs.get('category'))
+        elif cmd == 'switch':
+            name = kwargs.get('name')
+            state = int(kwargs.get('state', -1))
+            if state == -1:
+                state = 1 - self.machine.switches.get(name, 0)
+            self.received_switches += 1
+            self.broadcast([self.machine.set_switch(name, state)])
+        elif cmd == 'goodbye':
+            return False
+        elif cmd != 'reset_complete':
+            self.log.debug("Ignoring %s", message)
+
+        return True
+
+    def get_state(self, category):
+        """Return what MPF sends when a category is started."""
+        if category == 'devices':
+            return self.machine.device_messages()
+        if category == 'modes':
+            return [self.machine.mode_list_message()]
+        if category == 'machine_vars':
+            return self.machine.machine_variable_messages()
+        return []
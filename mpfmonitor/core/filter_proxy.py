@@ -0,0 +1,89 @@
+"""Proxy model which sorts the rows of a window and filters them with a Query."""
+
+from PyQt6.QtCore import *
+
+from mpfmonitor.core.query import MISSING, Query
+
+# the Record of a table row is kept in this role of its first item
+RECORD_ROLE = Qt.ItemDataRole.UserRole + 1
+# rows are sorted by this role of the items: numbers (as floats) or strings
+SORT_ROLE = Qt.ItemDataRole.UserRole + 2
+
+
+def sort_value(value):
+    """Return value for SORT_ROLE, so numbers are not sorted as text."""
+    if isinstance(value, (int, float)):
+        # Qt compares by the type of the left value, so all numbers are floats
+        return float(value)
+    return str(value)
+
+
+class Record(object):
+    """The fields of a table row which queries are evaluated against.
+
+    extra holds further fields, e.g. the kwargs of an event, which are only
+    looked up when fields does not have them.
+    """
+
+    __slots__ = ["fields", "extra"]
+
+    def __init__(self, fields, extra=None):
+        self.fields = fields
+        self.extra = extra
+
+
+def record_field(record, field):
+    value = record.fields.get(field, MISSING)
+    if value is MISSING and isinstance(record.extra, dict):
+        value = record.extra.get(field, MISSING)
+    return value
+
+
+class QueryFilterProxyModel(QSortFilterProxyModel):
+    """Sorted view of the rows of the source model which match the filter query.
+
+    Rows are sorted by their SORT_ROLE data, which the source model keeps as
+    numbers where they are numbers. Sorting is dynamic: Qt inserts new and
+    changed rows at their position by binary search, the rows are only
+    sorted completely when the sort column or order changes.
+
+    The query is compiled once per filter text and evaluated against the
+    Record of each row (see RECORD_ROLE), not against the text of the
+    items. Queries with since: are evaluated again every second, so rows
+    disappear once they are too old.
+    """
+
+    def __init__(self, parent=None, get_field=record_field, text_fields=('name',)):
+        super().__init__(parent)
+        self.get_field = get_field
+        self.text_fields = text_fields
+        self.filter_string = ""
+        self.query = None
+
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def set_filter_string(self, string):
+        self.filter_string = string
+        self.query = Query(string, self.get_field, self.text_fields) if string.strip() else None
+
+        if self.query is not None and self.query.time_dependent:
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+        self.refresh()
+
+    def refresh(self):
+        self.invalidateRowsFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.query is None:
+            return True
+
+        record = self.sourceModel().index(source_row, 0, source_parent).data(RECORD_ROLE)
+        return record is not None and self.query.matches(record)
@@ -0,0 +1,294 @@
+"""Runs the monitor without a GUI and streams state changes as JSON lines."""
+
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import time
+
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+from mpfmonitor.core.bcp_client import BCPClient, BCPLoop
+from mpfmonitor.core.metrics import client_metrics, start_metrics_server, tick_metrics
+from mpfmonitor.core.receive_queue import COMMAND_CATEGORIES, ReceiveQueue, STATE_CATEGORIES, state_key
+from mpfmonitor.core.profiler import SessionProfiler
+from mpfmonitor.core.recorder import SessionRecorder
+from mpfmonitor.core.scheduler import TickScheduler
+
+HEADLESS_CATEGORIES = ('devices', 'events', 'modes', 'variables')
+
+# BCP monitor categories needed for each output category
+MONITOR_CATEGORIES = {
+    'devices': ('devices',),
+    'events': ('events',),
+    'modes': ('modes',),
+    'variables': ('machine_vars', 'player_vars'),
+}
+
+
+class RateLimiter(object):
+    """Token bucket which allows rate lines per second, in bursts of up to a second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+
+    def allow(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """Seconds until the next line is allowed."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class HeadlessMonitor(object):
+    """Tracks the state of one machine and writes every change as a JSON line.
+
+    Uses the same BCP client, receive queue and tick scheduler as the GUI,
+    but no widgets. Only the BCP categories needed for the selected output
+    categories are monitored.
+
+    rate_limits maps categories to the maximum number of lines per second.
+    Over the limit, devices, variables and modes only keep their latest
+    state, which is written as soon as the limit allows, so the output
+    never ends on a stale state. Events over the limit are dropped and
+    reported in a "dropped" line.
+    """
+
+    def __init__(self, output, interface='localhost', port=5051, categories=HEADLESS_CATEGORIES,
+                 rate_limits=None, name=None, bcp_loop=None, tick_scheduler=None, recorder=None):
+        self.log = logging.getLogger('Headless')
+        self.output = output
+        self.name = name
+        self.categories = set(categories)
+
+        self.rate_limiters = {category: RateLimiter(rate)
+                              for category, rate in (rate_limits or dict()).items()}
+        self.pending = {category: dict() for category in self.rate_limiters}
+        self.dropped = {category: 0 for category in self.rate_limiters}
+
+        self.devices = dict()
+        self.running_modes = []
+        self.variables = dict()
+        self.tick_stats = (0, 0.0, 0.0)
+
+        if tick_scheduler is None:
+            tick_scheduler = TickScheduler(self.tick)
+        self.tick_scheduler = tick_scheduler
+        self.receive_queue = ReceiveQueue(wakeup=tick_scheduler.wake)
+
+        self.flush_timer = QTimer()
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self.flush)
+
+        monitored = [monitor_category for category in HEADLESS_CATEGORIES if category in self.categories
+                     for monitor_category in MONITOR_CATEGORIES[category]]
+        self.bcp = BCPClient(self, self.receive_queue, queue.Queue(), interface, port,
+                             recorder=recorder, bcp_loop=bcp_loop, monitored_categories=monitored)
+
+    def tick(self):
+        """Process all received messages. Called by the tick scheduler."""
+        start = time.perf_counter()
+        records = []
+        for cmd, kwargs, _ in self.receive_queue.drain():
+            record = self.process_message(cmd, kwargs)
+            if record is not None:
+                records.append((cmd, kwargs, record))
+
+        if records or any(self.pending.values()):
+            self.write(self.limit(records))
+
+        ticks, seconds, _ = self.tick_stats
+        duration = time.perf_counter() - start
+        self.tick_stats = (ticks + 1, seconds + duration, duration)
+
+    def process_message(self, cmd, kwargs):
+        """Update the tracked state. Returns the record to write or None."""
+        if cmd == 'device':
+            self.devices[(kwargs['type'], kwargs['name'])] = kwargs['state']
+            return {'type': 'device', 'device_type': kwargs['type'], 'name': kwargs['name'],
+                    'state': kwargs['state'], 'changes': kwargs.get('changes')}
+        if cmd == 'monitored_event':
+            return {'type': 'event', 'name': kwargs['event_name'], 'kwargs': kwargs.get('event_kwargs')}
+        if cmd in ('mode_start', 'mode_stop', 'mode_list'):
+            if 'running_modes' not in kwargs:
+                # ignore mode_start/stop on newer MPF versions
+                return None
+            self.running_modes = kwargs['running_modes']
+            return {'type': 'modes', 'running_modes': self.running_modes}
+        if cmd in ('player_variable', 'machine_variable'):
+            self.variables[(cmd, kwargs.get('player_num'), kwargs['name'])] = kwargs['value']
+            record = {'type': cmd, 'name': kwargs['name'], 'value': kwargs['value']}
+            if cmd == 'player_variable':
+                record['player_num'] = kwargs.get('player_num')
+            return record
+        if cmd == 'reset':
+            self.devices.clear()
+            self.running_modes = []
+            self.variables.clear()
+            self.bcp.send("reset_complete")
+            return {'type': 'reset'}
+        return None
+
+    def limit(self, records):
+        """Apply the category filters and rate limits. Returns the records to write."""
+        now = time.monotonic()
+        allowed = self.flush_pending(now)
+
+        for cmd, kwargs, record in records:
+            category = COMMAND_CATEGORIES.get(cmd)
+            if category is None:
+                allowed.append(record)
+                continue
+            if category not in self.categories:
+                continue
+
+            limiter = self.rate_limiters.get(category)
+            if limiter is None:
+                allowed.append(record)
+            elif category in STATE_CATEGORIES:
+                pending = self.pending[category]
+                key = state_key(cmd, kwargs)
+                if not pending and limiter.allow(now):
+                    allowed.append(record)
+                else:
+                    # keep only the latest state, written once allowed
+                    pending.pop(key, None)
+                    pending[key] = record
+            elif limiter.allow(now):
+                allowed.append(record)
+            else:
+                self.dropped[category] += 1
+
+        if any(self.pending.values()) and not self.flush_timer.isActive():
+            wait = min(self.rate_limiters[category].wait_time()
+                       for category, pending in self.pending.items() if pending)
+            self.flush_timer.start(max(1, int(wait * 1000)))
+
+        return allowed
+
+    def flush_pending(self, now):
+        records = []
+        for category, limiter in self.rate_limiters.items():
+            pending = self.pending[category]
+            while pending and limiter.allow(now):
+                key = next(iter(pending))
+                records.append(pending.pop(key))
+
+            if self.dropped[category] and limiter.allow(now):
+                records.append({'type': 'dropped', 'category': category,
+                                'count': self.dropped[category]})
+                self.dropped[category] = 0
+        return records
+
+    def flush(self):
+        self.write(self.limit([]))
+
+    def write(self, records):
+        if not records:
+            return
+
+        now = round(time.time(), 3)
+        lines = []
+        for record in records:
+            line = {'time': now}
+            if self.name:
+                line['machine'] = self.name
+            line.update(record)
+            lines.append(json.dumps(line, default=str))
+
+        self.output.write("\n".join(lines) + "\n")
+        self.output.flush()
+
+    def snapshot(self):
+        """Return the current state of the machine as a record."""
+        return {
+            'type': 'snapshot',
+            'devices': [{'device_type': device_type, 'name': name, 'state': state}
+                        for (device_type, name), state in self.devices.items()],
+            'running_modes': self.running_modes,
+            'variables': [{'type': cmd, 'player_num': player_num, 'name': name, 'value': value}
+                          for (cmd, player_num, name), value in self.variables.items()],
+        }
+
+    def collect_metrics(self):
+        """Return the metrics samples of this machine. Called on the metrics server thread."""
+        labels = {'machine': self.name} if self.name else dict()
+        samples = client_metrics(self.bcp, self.receive_queue, labels)
+        samples.extend(tick_metrics(self.tick_stats, labels))
+        return samples
+
+    def stop(self):
+        self.flush_timer.stop()
+        self.bcp.stop()
+
+
+def run(machines, output=None, categories=HEADLESS_CATEGORIES, rate_limits=None,
+        snapshot_on_exit=False, record=False, record_max_bytes=100 * 1024 * 1024,
+        profile=False, metrics_host='127.0.0.1', metrics_port=None):
+    """Run headless monitors until interrupted.
+
+    machines is a list of (interface, port, machine_path) tuples. The name
+    of the machine folder is added to every line when more than one machine
+    is monitored.
+    """
+    app = QCoreApplication(sys.argv)
+    profiler = SessionProfiler(os.path.join(machines[0][2], "logs"))
+    if profile:
+        profiler.start()
+    output_file = open(output, "a", encoding="utf-8") if output else sys.stdout
+
+    bcp_loop = BCPLoop()
+    monitors = []
+
+    def tick():
+        for monitor in monitors:
+            monitor.tick()
+
+    tick_scheduler = TickScheduler(tick)
+
+    for interface, port, machine_path in machines:
+        recorder = None
+        if record:
+            recorder = SessionRecorder(os.path.join(machine_path, "monitor", "recordings"),
+                                       max_bytes=record_max_bytes)
+
+        name = None
+        if len(machines) > 1:
+            name = "{} {}:{}".format(os.path.basename(os.path.normpath(machine_path)), interface, port)
+
+        monitors.append(HeadlessMonitor(
+            output_file, interface, port, categories, rate_limits, name=name,
+            bcp_loop=bcp_loop, tick_scheduler=tick_scheduler, recorder=recorder))
+
+    start_metrics_server(app, [monitor.collect_metrics for monitor in monitors],
+                         metrics_host, metrics_port)
+
+    signal.signal(signal.SIGINT, lambda *args: app.quit())
+    signal.signal(signal.SIGTERM, lambda *args: app.quit())
+    # Python only runs signal handlers when it gets control back from Qt
+    signal_timer = QTimer()
+    signal_timer.timeout.connect(lambda: None)
+    signal_timer.start(250)
+
+    app.exec()
+
+    for monitor in monitors:
+        monitor.tick()
+        if snapshot_on_exit:
+            monitor.write([monitor.snapshot()])
+        monitor.stop()
+
+    bcp_loop.stop()
+    profiler.stop()
+
+    if output:
+        output_file.close()
@@ -0,0 +1,91 @@
+"""Keeps the recent states of every device in fixed size ring buffers."""
+
+from time import time
+from array import array
+from itertools import chain
+
+
+class DeviceHistory(object):
+    """Ring buffer of the last states of one device.
+
+    The times are kept in an array of doubles and the states in lists of
+    the same size, all allocated once, so recording a state only replaces
+    three slots. A state is the new value of the property which changed
+    when MPF reported which one, otherwise the complete state. Lists and
+    dicts are kept as tuples, which the garbage collector does not track
+    once they only hold numbers and strings.
+    """
+
+    __slots__ = ["times", "keys", "values", "size", "next", "recorded"]
+
+    def __init__(self, size):
+        self.times = array('d', bytes(8 * size))
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.size = size
+        self.next = 0
+        self.recorded = 0
+
+    def record(self, data, changed=None, now=None):
+        if changed is None:
+            value = tuple(data.items())
+        else:
+            value = data[changed]
+            if type(value) is list:
+                value = tuple(value)
+
+        i = self.next
+        self.times[i] = now or time()
+        self.keys[i] = changed
+        self.values[i] = value
+
+        i += 1
+        self.next = 0 if i == self.size else i
+        self.recorded += 1
+
+    def __len__(self):
+        return min(self.recorded, self.size)
+
+    def last_time(self):
+        """Return the time of the newest state, or None."""
+        return self.times[self.next - 1] if self.recorded else None
+
+    def entries(self):
+        """Return (time, changed property or None, value) tuples, oldest first."""
+        if self.recorded < self.size:
+            order = range(self.next)
+        else:
+            order = chain(range(self.next, self.size), range(self.next))
+        return [(self.times[i], self.keys[i], self.values[i]) for i in order]
+
+
+class HistoryBuffers(object):
+    """Hands out a DeviceHistory to every device until the memory cap is reached.
+
+    Every device gets a ring buffer of length states while less than
+    max_entries states are allocated in total. Devices which are added
+    after that are not recorded. A length of 0 turns the history off.
+    """
+
+    def __init__(self, length=64, max_entries=200000):
+        self.length = length
+        self.max_entries = max_entries
+        self.allocated = 0
+        self.devices_without_history = 0
+
+    def configure(self, length=64, max_entries=200000):
+        """Set the sizes for devices which are added from now on."""
+        self.length = length
+        self.max_entries = max_entries
+
+    def allocate(self):
+        """Return a DeviceHistory for a new device, or None."""
+        if self.length <= 0 or self.allocated + self.length > self.max_entries:
+            self.devices_without_history += 1
+            return None
+
+        self.allocated += self.length
+        return DeviceHistory(self.length)
+
+
+DEVICE_HISTORY = HistoryBuffers()
@@ -1,14 +1,16 @@
 import logging
-import os
+import time
 
-from PyQt6 import uic
 # will change these to specific imports once code is more final
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 
 from mpfmonitor._version import __version__, __bcp_version__
+from mpfmonitor.core.bcp_client import ConnectionState
 from mpfmonitor.core.playfield import Shape
+from mpfmonitor.core.replay import REPLAY_SPEEDS, MAX_SPEED
+from mpfmonitor.core.ui_loader import load_ui
 
 
 class InspectorWindow(QWidget):
@@ -22,6 +24,7 @@ class InspectorWindow(QWidget):
 
         self.draw_ui()
         self.attach_signals()
+        self.attach_stats_timer()
 
         self.enable_non_default_widgets(enabled=False)
 
@@ -29,10 +32,9 @@ class InspectorWindow(QWidget):
 
     def draw_ui(self):
         # Load ui file from ./ui/
-        ui_path = os.path.join(os.path.dirname(__file__), "ui", "inspector.ui")
-        self.ui = uic.loadUi(ui_path, self)
+        self.ui = load_ui("inspector.ui", self)
 
-        self.ui.setWindowTitle('Inspector')
+        self.ui.setWindowTitle(self.mpfmon.window_title('Inspector'))
 
         self.ui.move(self.mpfmon.local_settings.value('windows/inspector/pos',
                                                    QPoint(1100, 465)))
@@ -60,6 +62,7 @@ class InspectorWindow(QWidget):
 
         self.ui.reset_to_defaults_button.clicked.connect(self.reset_defaults_last_device)
         self.ui.delete_last_device_button.clicked.connect(self.delete_last_device)
+        self.ui.show_history_button.clicked.connect(self.show_last_device_history)
 
     def attach_monitor_tab_signals(self):
         self.ui.toggle_device_win_button.setChecked(self.mpfmon.toggle_device_window_action.isChecked())
@@ -80,6 +83,140 @@ class InspectorWindow(QWidget):
         self.ui.exit_on_close_button.setChecked(self.mpfmon.get_local_settings_bool('settings/exit-on-close'))
         self.ui.exit_on_close_button.stateChanged.connect(self.mpfmon.toggle_exit_on_close)
 
+        self.ui.reconnect_button.clicked.connect(self.reconnect)
+        self.ui.latency_dump_button.clicked.connect(self.dump_latency)
+        self.ui.profile_button.clicked.connect(self.toggle_profiling)
+
+        self.attach_replay_signals()
+
+    def attach_replay_signals(self):
+        replay = self.mpfmon.bcp.replay
+        self.ui.replay_group_box.setVisible(replay is not None)
+        if replay is None:
+            return
+
+        for speed in REPLAY_SPEEDS:
+            self.ui.replay_speed_combo_box.addItem("{:g}x".format(speed), speed)
+        self.ui.replay_speed_combo_box.addItem("Max", MAX_SPEED)
+        self.ui.replay_speed_combo_box.setCurrentIndex(
+            self.ui.replay_speed_combo_box.findData(replay.speed))
+        self.ui.replay_speed_combo_box.currentIndexChanged.connect(self.replay_speed_changed)
+
+        # the slider counts seconds since the start of the recording
+        self.ui.replay_position_slider.setRange(0, (replay.end - replay.start) // 1000000)
+        self.ui.replay_position_slider.sliderReleased.connect(self.replay_seek)
+
+        self.ui.replay_play_button.clicked.connect(self.toggle_replay)
+
+    def attach_stats_timer(self):
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(1000)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start()
+
+    def update_stats(self):
+        if not self.isVisible():
+            return
+
+        self.update_connection_state()
+        self.update_receive_queue_stats()
+        self.update_latency_stats()
+        self.update_profiler_state()
+        self.update_replay_position()
+
+    def update_connection_state(self):
+        bcp = self.mpfmon.bcp
+        address = "{}:{}".format(bcp.interface, bcp.port)
+        state = bcp.connection_state
+
+        if state == ConnectionState.CONNECTED:
+            text = "Connected to {}".format(address)
+        elif state == ConnectionState.CONNECTING:
+            text = "Connecting to {}...".format(address)
+        elif state == ConnectionState.WAITING and bcp.next_attempt is not None:
+            text = "Not connected to {}. Retrying in {:.0f}s".format(
+                address, max(0, bcp.next_attempt - time.monotonic()))
+        elif state == ConnectionState.SIMULATING:
+            text = "Simulating"
+        else:
+            text = "Not connected to {}".format(address)
+
+        self.ui.connection_state_label.setText(text)
+        self.ui.reconnect_button.setEnabled(state == ConnectionState.WAITING)
+
+    def reconnect(self):
+        self.log.info("Reconnect requested")
+        self.mpfmon.bcp.connect_to_mpf()
+        self.update_connection_state()
+
+    def update_receive_queue_stats(self):
+        stats = self.mpfmon.receive_queue.stats()
+
+        # categories which keep every message can exceed max_size
+        kept = [category for category, policy in stats['policies'].items() if policy == 'keep']
+        lines = ["Receive queue: {} queued, peak {} (max {}{})".format(
+            stats['queued'], stats['peak'], stats['max_size'],
+            ", except {}".format(", ".join(kept)) if kept else "")]
+
+        for category, counters in stats['categories'].items():
+            if not counters['received']:
+                continue
+            lines.append("{}: {} received, {} collapsed, {} dropped".format(
+                category, counters['received'], counters['collapsed'], counters['dropped']))
+
+        self.ui.receive_queue_stats_label.setText("\n".join(lines))
+
+    def update_latency_stats(self):
+        stats = self.mpfmon.latency.format_stats()
+        self.ui.latency_stats_label.setText("Latency since read:\n" + stats if stats else "Latency: -")
+
+    def dump_latency(self):
+        filename = self.mpfmon.dump_latency()
+        self.ui.latency_dump_button.setToolTip("Written to {}".format(filename))
+
+    def toggle_profiling(self):
+        self.mpfmon.profiler.toggle()
+        self.update_profiler_state()
+
+    def update_profiler_state(self):
+        profiler = self.mpfmon.profiler
+        if profiler.running:
+            self.ui.profile_button.setText("Stop profiling")
+            self.ui.profile_label.setText("Profiling for {:.0f}s".format(time.time() - profiler.started))
+        else:
+            self.ui.profile_button.setText("Start profiling")
+            self.ui.profile_label.setText(
+                "Written to {}".format(profiler.last_file) if profiler.last_file else "Not profiling")
+
+    def update_replay_position(self):
+        replay = self.mpfmon.bcp.replay
+        if replay is None:
+            return
+
+        position = (replay.current_position() - replay.start) // 1000000
+        duration = (replay.end - replay.start) // 1000000
+
+        if not self.ui.replay_position_slider.isSliderDown():
+            self.ui.replay_position_slider.setValue(position)
+        self.ui.replay_position_label.setText("{}:{:02d} / {}:{:02d}".format(
+            position // 60, position % 60, duration // 60, duration % 60))
+        self.ui.replay_play_button.setText("Pause" if replay.playing else "Play")
+
+    def toggle_replay(self):
+        if self.mpfmon.bcp.replay.playing:
+            self.mpfmon.bcp.replay_pause()
+        else:
+            self.mpfmon.bcp.replay_play()
+        self.update_replay_position()
+
+    def replay_speed_changed(self):
+        self.mpfmon.bcp.replay.set_speed(self.ui.replay_speed_combo_box.currentData())
+
+    def replay_seek(self):
+        replay = self.mpfmon.bcp.replay
+        self.mpfmon.bcp.replay_seek(replay.start + self.ui.replay_position_slider.value() * 1000000)
+        self.update_replay_position()
+
     def toggle_inspector_mode(self):
         inspector_enabled = not self.mpfmon.inspector_enabled
         if self.registered_inspector_cb:
@@ -161,6 +298,7 @@ class InspectorWindow(QWidget):
         if self.ui is not None:
             self.ui.rotationDial.setEnabled(enabled)
             self.ui.shape_combo_box.setEnabled(enabled)
+            self.ui.show_history_button.setEnabled(enabled)
 
 
     def update_last_device(self, new_size=None, rotation=None, shape=None, save=True):
@@ -205,6 +343,10 @@ class InspectorWindow(QWidget):
         else:
             self.log.info("No device selected to delete")
 
+    def show_last_device_history(self):
+        if self.last_pf_widget is not None:
+            self.mpfmon.device_window.show_history(self.last_pf_widget.widget)
+
     def reset_defaults_last_device(self):
         if self.last_pf_widget is not None:
 
@@ -0,0 +1,174 @@
+"""Measures how long BCP messages take from the socket to the screen."""
+
+import json
+import time
+
+# Every message is timestamped when it is read from the socket. The latency
+# is recorded again at these stages:
+#   queue - MPFMonitor.tick took the message from the receive queue
+#   model - the message was applied to the window models
+#   paint - a playfield widget showing the device was painted
+STAGES = ('queue', 'model', 'paint')
+
+PERCENTILES = (50, 95, 99)
+
+# 4 buckets per power of two, so a bucket is at most 19% wide
+SUB_BUCKET_BITS = 2
+BUCKET_COUNT = (64 + 1) << SUB_BUCKET_BITS
+
+
+def bucket_index(value):
+    """Return the histogram bucket of a latency in ns."""
+    if value < 1 << SUB_BUCKET_BITS:
+        return max(0, value)
+    bits = value.bit_length()
+    sub_bucket = (value >> (bits - SUB_BUCKET_BITS - 1)) & ((1 << SUB_BUCKET_BITS) - 1)
+    return ((bits - SUB_BUCKET_BITS) << SUB_BUCKET_BITS) | sub_bucket
+
+
+def bucket_range(index):
+    """Return the lowest and the first value above a bucket."""
+    if index < 1 << SUB_BUCKET_BITS:
+        return index, index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    base = (1 << SUB_BUCKET_BITS) | (index & ((1 << SUB_BUCKET_BITS) - 1))
+    return base << shift, (base + 1) << shift
+
+
+class LatencyHistogram(object):
+    """Log-bucketed histogram of the latencies of the last window seconds.
+
+    Recording is a bit_length() and a list increment, so it is cheap enough
+    for every message. The counts are kept in two generations of window / 2
+    seconds each; when the current generation is full it replaces the
+    previous one. Percentiles are computed over both, so they cover between
+    window / 2 and window seconds of data.
+    """
+
+    def __init__(self, window=60):
+        self.generation_ns = int(window * 1e9 / 2)
+        self.current = [0] * BUCKET_COUNT
+        self.previous = [0] * BUCKET_COUNT
+        self.generation_start = None
+        self.max = 0
+
+    def record(self, latency, now):
+        """Record a latency in ns which was measured at now (monotonic ns)."""
+        if self.generation_start is None:
+            self.generation_start = now
+        elif now - self.generation_start >= self.generation_ns:
+            self._rotate(now)
+
+        self.current[bucket_index(latency)] += 1
+        if latency > self.max:
+            self.max = latency
+
+    def _rotate(self, now):
+        if now - self.generation_start >= 2 * self.generation_ns:
+            # nothing recorded for a whole window
+            self.previous = [0] * BUCKET_COUNT
+        else:
+            self.previous = self.current
+        self.current = [0] * BUCKET_COUNT
+        self.generation_start = now
+        self.max = 0
+
+    def counts(self, now=None):
+        if now is not None and self.generation_start is not None and \
+                now - self.generation_start >= self.generation_ns:
+            self._rotate(now)
+        return [current + previous for current, previous in zip(self.current, self.previous)]
+
+    def percentiles(self, percents=PERCENTILES, now=None):
+        """Return the count and the latencies in ns at the given percents.
+
+        A latency is the middle of its bucket, so it is accurate to about
+        +-10%.
+        """
+        counts = self.counts(now)
+        total = sum(counts)
+        if not total:
+            return 0, [None] * len(percents)
+
+        results = []
+        for percent in percents:
+            rank = max(1, percent / 100 * total)
+            seen = 0
+            for index, count in enumerate(counts):
+                seen += count
+                if seen >= rank:
+                    low, high = bucket_range(index)
+                    results.append((low + high - 1) // 2)
+                    break
+        return total, results
+
+
+class LatencyTracker(object):
+    """Rolling latency histograms per message category and stage.
+
+    current_received is the socket read time of the message which is being
+    processed right now. Playfield widgets pick it up when their device
+    changes, so they can record the paint latency later.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.histograms = dict()
+        self.current_received = None
+
+    def record(self, category, stage, received, now=None):
+        """Record the latency of a message read from the socket at received."""
+        if received is None:
+            return
+        if now is None:
+            now = time.monotonic_ns()
+
+        histogram = self.histograms.get((category, stage))
+        if histogram is None:
+            histogram = self.histograms[category, stage] = LatencyHistogram(self.window)
+        histogram.record(now - received, now)
+
+    def stats(self, now=None):
+        """Return {category: {stage: {count, p50, p95, p99}}} in ms."""
+        if now is None:
+            now = time.monotonic_ns()
+
+        stats = dict()
+        for (category, stage), histogram in sorted(self.histograms.items()):
+            count, values = histogram.percentiles(PERCENTILES, now)
+            if not count:
+                continue
+            stage_stats = {'count': count}
+            for percent, value in zip(PERCENTILES, values):
+                stage_stats['p{}'.format(percent)] = value / 1e6
+            stats.setdefault(category, dict())[stage] = stage_stats
+        return stats
+
+    def format_stats(self, now=None):
+        """Return the stats as one line per category and stage."""
+        lines = []
+        for category, stages in self.stats(now).items():
+            for stage in STAGES:
+                if stage in stages:
+                    lines.append("{} {}: p50 {p50:.1f} p95 {p95:.1f} p99 {p99:.1f} ms ({count})".format(
+                        category, stage, **stages[stage]))
+        return "\n".join(lines)
+
+    def dump(self, filename, now=None):
+        """Write the stats and the raw histogram buckets to a JSON file."""
+        if now is None:
+            now = time.monotonic_ns()
+
+        histograms = dict()
+        for (category, stage), histogram in sorted(self.histograms.items()):
+            buckets = [[*bucket_range(index), count]
+                       for index, count in enumerate(histogram.counts(now)) if count]
+            histograms.setdefault(category, dict())[stage] = buckets
+
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({
+                'time': time.time(),
+                'window_seconds': self.window,
+                'stats_ms': self.stats(now),
+                'histograms_ns': histograms,
+            }, f, indent=2)
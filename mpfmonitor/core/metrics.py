@@ -0,0 +1,192 @@
+"""Serves the health of the monitor as Prometheus metrics over HTTP."""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mpfmonitor.core.bcp_client import ConnectionState
+
+# name: (type, help)
+METRICS = {
+    'mpf_monitor_messages_received_total': (
+        'counter', 'BCP messages received, per command'),
+    'mpf_monitor_messages_collapsed_total': (
+        'counter', 'Queued states replaced by a newer state, per category'),
+    'mpf_monitor_messages_dropped_total': (
+        'counter', 'Messages dropped because the receive queue was full, per category'),
+    'mpf_monitor_receive_queue_depth': (
+        'gauge', 'Messages waiting for the next tick'),
+    'mpf_monitor_receive_queue_peak_depth': (
+        'gauge', 'Highest number of messages waiting for a tick so far'),
+    'mpf_monitor_ticks_total': (
+        'counter', 'Ticks which processed received messages'),
+    'mpf_monitor_tick_seconds_total': (
+        'counter', 'Time spent processing received messages'),
+    'mpf_monitor_last_tick_seconds': (
+        'gauge', 'Duration of the last tick'),
+    'mpf_monitor_model_rows': (
+        'gauge', 'Rows in the models of the monitor windows'),
+    'mpf_monitor_connected': (
+        'gauge', '1 while connected to MPF'),
+    'mpf_monitor_reconnects_total': (
+        'counter', 'Connections to MPF which were lost and reconnected'),
+    'mpf_monitor_recorder_messages_total': (
+        'counter', 'Messages written to the recording'),
+    'mpf_monitor_recorder_write_lag_seconds': (
+        'gauge', 'Time from receiving the last recorded message until it was written'),
+}
+
+
+def client_metrics(bcp, receive_queue, labels):
+    """Return the samples of a BCP client and its receive queue.
+
+    Everything read here is kept up to date by the BCP and recorder threads
+    or is protected by the receive queue lock, so this can be called from
+    any thread.
+    """
+    stats = receive_queue.stats()
+    samples = [('mpf_monitor_messages_received_total', dict(labels, command=command), count)
+               for command, count in sorted(stats['commands'].items())]
+    for category, counters in stats['categories'].items():
+        samples.append(('mpf_monitor_messages_collapsed_total', dict(labels, category=category),
+                        counters['collapsed']))
+        samples.append(('mpf_monitor_messages_dropped_total', dict(labels, category=category),
+                        counters['dropped']))
+
+    samples.extend([
+        ('mpf_monitor_receive_queue_depth', labels, stats['queued']),
+        ('mpf_monitor_receive_queue_peak_depth', labels, stats['peak']),
+        ('mpf_monitor_connected', labels, int(bcp.connection_state == ConnectionState.CONNECTED)),
+        ('mpf_monitor_reconnects_total', labels, bcp.reconnect_count),
+    ])
+
+    recorder = bcp.recorder
+    if recorder:
+        samples.append(('mpf_monitor_recorder_messages_total', labels, recorder.written_messages))
+        samples.append(('mpf_monitor_recorder_write_lag_seconds', labels, recorder.write_lag_ns / 1e9))
+
+    return samples
+
+
+def tick_metrics(tick_stats, labels):
+    """Return the samples of (ticks, total seconds, last seconds)."""
+    ticks, seconds, last = tick_stats
+    return [
+        ('mpf_monitor_ticks_total', labels, ticks),
+        ('mpf_monitor_tick_seconds_total', labels, seconds),
+        ('mpf_monitor_last_tick_seconds', labels, last),
+    ]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_metrics(samples):
+    """Return (name, labels, value) samples in the Prometheus text format."""
+    by_name = dict()
+    for name, labels, value in samples:
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, values in by_name.items():
+        metric_type, description = METRICS[name]
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+        for labels, value in values:
+            if labels:
+                lines.append("{}{{{}}} {}".format(name, ",".join(
+                    '{}="{}"'.format(key, _escape(label)) for key, label in labels.items()), value))
+            else:
+                lines.append("{} {}".format(name, value))
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer(object):
+    """HTTP server thread which serves /metrics.
+
+    collectors are callables returning lists of (name, labels, value)
+    samples. They are called on the server thread for every scrape, so they
+    must only read counters which are kept up to date elsewhere, never Qt
+    objects.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9105):
+        self.log = logging.getLogger('Metrics')
+        self.host = host
+        self.port = port
+        self.collectors = []
+        self.server = None
+        self.thread = None
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def collect(self):
+        samples = []
+        for collector in self.collectors:
+            samples.extend(collector())
+        return format_metrics(samples)
+
+    def start(self):
+        metrics_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics_server.collect().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                metrics_server.log.debug(format, *args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name='Metrics')
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.log.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    def stop(self):
+        if self.server is None:
+            return
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.server = None
+
+
+def start_metrics_server(app, collectors, host, port):
+    """Serve the metrics of the collectors until the Qt application quits.
+
+    Returns the server, or None when no port is given or it can not be
+    opened. The monitor keeps running without metrics in that case.
+    """
+    if port is None:
+        return None
+
+    server = MetricsServer(host, port)
+    for collector in collectors:
+        server.add_collector(collector)
+
+    try:
+        server.start()
+    except OSError as e:
+        server.log.error("Could not serve metrics on %s:%s: %s", host, port, e)
+        return None
+
+    app.aboutToQuit.connect(server.stop)
+    return server
@@ -1,10 +1,10 @@
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from PyQt6 import uic
 
-import os
-import time
+from mpfmonitor.core.filter_proxy import RECORD_ROLE, SORT_ROLE, QueryFilterProxyModel, Record, sort_value
+from mpfmonitor.core.ui_loader import load_ui
+
 
 class ModeWindow(QWidget):
 
@@ -22,10 +22,9 @@ class ModeWindow(QWidget):
 
     def draw_ui(self):
         # Load ui file from ./ui/
-        ui_path = os.path.join(os.path.dirname(__file__), "ui", "searchable_table.ui")
-        self.ui = uic.loadUi(ui_path, self)
+        self.ui = load_ui("searchable_table.ui", self)
 
-        self.ui.setWindowTitle('Running Modes')
+        self.ui.setWindowTitle(self.mpfmon.window_title('Running Modes'))
 
         self.ui.move(self.mpfmon.local_settings.value('windows/modes/pos',
                                                    QPoint(1100, 200)))
@@ -54,10 +53,8 @@ class ModeWindow(QWidget):
         self.model.setHeaderData(1, Qt.Orientation.Horizontal, "Priority")
         # self.model.setHeaderData(2, Qt.Orientation.Horizontal, "Time")
 
-        self.filtered_model = QSortFilterProxyModel(self)
+        self.filtered_model = QueryFilterProxyModel(self)
         self.filtered_model.setSourceModel(self.model)
-        self.filtered_model.setFilterKeyColumn(0)
-        self.filtered_model.setDynamicSortFilter(True)
 
         self.change_sort()  # Default sort
 
@@ -71,9 +68,13 @@ class ModeWindow(QWidget):
 
         for mode in running_modes:
             mode_name = QStandardItem(mode[0])
+            mode_name.setData(mode[0], SORT_ROLE)
+            mode_name.setData(Record({'name': mode[0], 'mode': mode[0], 'priority': mode[1]}), RECORD_ROLE)
             mode_priority = QStandardItem(str(mode[1]))
-            mode_priority_padded = QStandardItem(str(mode[1]).zfill(10))
-            self.model.insertRow(0, [mode_name, mode_priority, mode_priority_padded])
+            mode_priority.setData(sort_value(mode[1]), SORT_ROLE)
+            mode_priority_sort = QStandardItem()
+            mode_priority_sort.setData(sort_value(mode[1]), SORT_ROLE)
+            self.model.insertRow(0, [mode_name, mode_priority, mode_priority_sort])
 
         # Reset the headers for the tree. For some reason clear() wipes these too.
         self.model.setHeaderData(0, Qt.Orientation.Horizontal, "Mode")
@@ -82,8 +83,7 @@ class ModeWindow(QWidget):
         self.ui.tableView.setColumnHidden(2, True)
 
     def filter_text(self, string):
-        wc_string = "*" + str(string) + "*"
-        self.filtered_model.setFilterWildcard(wc_string)
+        self.filtered_model.set_filter_string(str(string))
         self.ui.tableView.resizeColumnToContents(0)
         self.ui.tableView.resizeColumnToContents(1)
 
@@ -98,6 +98,16 @@ class ModeWindow(QWidget):
         elif index == 4:  # Name down
             self.filtered_model.sort(0, Qt.SortOrder.DescendingOrder)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
     def closeEvent(self, event):
         self.mpfmon.write_local_settings()
         event.accept()
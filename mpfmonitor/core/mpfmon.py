@@ -5,8 +5,6 @@ import os
 import time
 
 # will change these to specific imports once code is more final
-from collections import deque
-
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
@@ -17,7 +15,14 @@ from ruamel import yaml
 
 from mpfmonitor.core.devices import *
 from mpfmonitor.core.playfield import *
-from mpfmonitor.core.bcp_client import BCPClient
+from mpfmonitor.core.bcp_client import BCPClient, BCPLoop
+from mpfmonitor.core.history import DEVICE_HISTORY
+from mpfmonitor.core.latency import LatencyTracker
+from mpfmonitor.core.metrics import client_metrics, start_metrics_server, tick_metrics
+from mpfmonitor.core.profiler import SessionProfiler
+from mpfmonitor.core.receive_queue import COMMAND_CATEGORIES, ReceiveQueue
+from mpfmonitor.core.recorder import SessionRecorder
+from mpfmonitor.core.scheduler import TickScheduler
 from mpfmonitor.core.events import EventWindow
 from mpfmonitor.core.modes import ModeWindow
 from mpfmonitor.core.inspector import InspectorWindow
@@ -25,7 +30,10 @@ from mpfmonitor.core.variables import VariableWindow
 
 
 class MPFMonitor():
-    def __init__(self, app, machine_path, thread_stopper, config_file, parent=None, testing=False):
+    def __init__(self, app, machine_path, thread_stopper, config_file, parent=None, testing=False,
+                 record=False, record_max_bytes=100 * 1024 * 1024, replay_file=None,
+                 replay_speed=1, interface='localhost', port=5051, name=None, bcp_loop=None,
+                 tick_scheduler=None, profiler=None):
 
         # super().__init__(parent)
 
@@ -34,12 +42,13 @@ class MPFMonitor():
         sys.excepthook = self.except_hook
 
         self.bcp_client_connected = False
-        self.receive_queue = queue.Queue()
+        self.receive_queue = None
         self.sending_queue = queue.Queue()
         self.crash_queue = queue.Queue()
         self.thread_stopper = thread_stopper
         self.machine_path = machine_path
         self.app = app
+        self.name = name
         self.config = None
         self.layout = None
         self.config_file = os.path.join(self.machine_path, "monitor",
@@ -48,23 +57,62 @@ class MPFMonitor():
                                                  "monitor", "playfield.jpg")
 
         self.local_settings = QSettings("mpf", "mpf-monitor")
+        if self.name:
+            # window positions etc. are stored per machine
+            self.local_settings.beginGroup("machines/{}".format(self.name))
 
         self.load_config()
 
+        receive_queue_config = self.config.get("receive_queue", dict())
+        self.receive_queue = ReceiveQueue(
+            max_size=receive_queue_config.get("max_size", 20000),
+            policies=receive_queue_config.get("policies"))
+        self.latency = LatencyTracker(self.config.get("latency_window", 60))
+        # (ticks, seconds, last tick seconds) and row counts, replaced by
+        # every tick and read by the metrics server thread
+        self.tick_stats = (0, 0.0, 0.0)
+        self.model_rows = dict()
+
+        light_brushes_config = self.config.get("light_brushes")
+        if light_brushes_config:
+            # shared by all machines of this process
+            LIGHT_BRUSHES.configure(gamma=light_brushes_config.get("gamma", 0.5),
+                                    constant=light_brushes_config.get("constant", 18),
+                                    max_brushes=light_brushes_config.get("max_brushes", 256))
+
+        device_history_config = self.config.get("device_history")
+        if device_history_config:
+            DEVICE_HISTORY.configure(length=device_history_config.get("length", 64),
+                                     max_entries=device_history_config.get("max_entries", 200000))
+
         self.device_window = DeviceWindow(self)
 
         self.pf_device_size = self.config.get("device_size", .02)
         if not isinstance(self.pf_device_size, float):  # Protect against corrupted device size
             self.pf_device_size = .02
 
+        self.recorder = None
+        if record:
+            self.recorder = SessionRecorder(os.path.join(self.machine_path, "monitor", "recordings"),
+                                            max_bytes=record_max_bytes)
+
+        # the client may receive messages right away, which have to wake the tick
+        if tick_scheduler is None:
+            tick_scheduler = TickScheduler(self.tick)
+        self.tick_scheduler = tick_scheduler
+        self.receive_queue.wakeup = self.tick_scheduler.wake
+
         self.bcp = BCPClient(self, self.receive_queue,
-                             self.sending_queue, 'localhost', 5051,
-                             simulate=testing, cache=False)
+                             self.sending_queue, interface, port,
+                             simulate=testing, bcp_loop=bcp_loop, recorder=self.recorder,
+                             replay_file=replay_file, replay_speed=replay_speed,
+                             read_size=self.config.get("bcp_read_size", 65536),
+                             monitored_categories=())
+        self.app.aboutToQuit.connect(self.bcp.stop)
 
-        self.tick_timer = QTimer(self.device_window)
-        self.tick_timer.setInterval(20)
-        self.tick_timer.timeout.connect(self.tick)
-        self.tick_timer.start()
+        if profiler is None:
+            profiler = SessionProfiler(os.path.join(self.machine_path, "logs"))
+        self.profiler = profiler
 
         self.toggle_pf_window_action = QAction('&Playfield', self.device_window,
                                         statusTip='Show the playfield window',
@@ -138,6 +186,10 @@ class MPFMonitor():
 
         self.inspector_window.register_set_inspector_val_cb(self.set_inspector_mode)
 
+        # Subscribe to what the visible windows need. Showing and hiding
+        # windows updates this from now on.
+        self.update_monitored_categories()
+
         self.menu_bar = QMenuBar()
         self.view_menu = self.menu_bar.addMenu("&View")
         self.view_menu.addAction(self.toggle_pf_window_action)
@@ -146,6 +198,12 @@ class MPFMonitor():
         self.view_menu.addAction(self.toggle_mode_window_action)
         self.view_menu.addAction(self.toggle_variables_window_action)
 
+    def window_title(self, title):
+        """Prefix a window title with the machine name."""
+        if self.name:
+            return "{} - {}".format(self.name, title)
+        return title
+
     def toggle_pf_window(self):
         if self.view.isVisible():
             self.view.hide()
@@ -186,6 +244,26 @@ class MPFMonitor():
             self.variables_window.show()
             self.toggle_variables_window_action.setChecked(True)
 
+    def update_monitored_categories(self):
+        """Only monitor the BCP categories of windows which are visible.
+
+        Player variables are always monitored. MPF does not send their
+        values again on monitor_start, so the variables window would show
+        stale values after it was hidden. There are only a few of them.
+        """
+        categories = {'player_vars'}
+
+        if self.device_window.isVisible() or self.view.isVisible():
+            categories.add('devices')
+        if self.event_window.isVisible():
+            categories.add('events')
+        if self.mode_window.isVisible():
+            categories.add('modes')
+        if self.variables_window.isVisible():
+            categories.add('machine_vars')
+
+        self.bcp.set_monitored_categories(categories)
+
     def toggle_exit_on_close(self):
         if self.exit_on_close:
             self.exit_on_close = False
@@ -221,19 +299,27 @@ class MPFMonitor():
 
     def tick(self):
         """
-        Called every 20 mSec
-        Check the queue to see if BCP has any messages to process.
+        Called by the tick scheduler after BCP messages were received.
+        Process all queued messages.
         If any devices have updated, refresh the model data.
         """
+        start = time.perf_counter()
         # get the complete queue
-        with self.receive_queue.mutex:
-            local_queue = self.receive_queue.queue
-            self.receive_queue.queue = deque()
+        local_queue = self.receive_queue.drain()
+        latency = self.latency
+        dequeued = time.monotonic_ns()
 
         added_events = False
-        for cmd, kwargs in local_queue:
+        updated_devices = False
+        for cmd, kwargs, received in local_queue:
+            category = COMMAND_CATEGORIES.get(cmd, 'other')
+            latency.record(category, 'queue', received, dequeued)
+            # picked up by the playfield widgets for the paint latency
+            latency.current_received = received
+
             if cmd == 'device':
                 self.device_window.process_device_update(**kwargs)
+                updated_devices = True
             elif cmd == 'monitored_event':
                 self.event_window.add_event_to_model(**kwargs)
                 added_events = True
@@ -250,9 +336,43 @@ class MPFMonitor():
             elif cmd == 'machine_variable':
                 self.variables_window.update_variable("machine", kwargs["name"], kwargs["value"])
 
+            latency.record(category, 'model', received)
+
+        latency.current_received = None
+        if updated_devices:
+            self.device_window.update_devices()
         if added_events:
             self.event_window.update_events()
 
+        self.model_rows = {'devices': self.device_window.device_count,
+                           'events': self.event_window.model.rowCount()}
+        ticks, seconds, _ = self.tick_stats
+        duration = time.perf_counter() - start
+        self.tick_stats = (ticks + 1, seconds + duration, duration)
+
+    def collect_metrics(self):
+        """Return the metrics samples of this machine.
+
+        Called on the metrics server thread, so only precomputed counters
+        are read.
+        """
+        labels = {'machine': self.name} if self.name else dict()
+        samples = client_metrics(self.bcp, self.receive_queue, labels)
+        samples.extend(tick_metrics(self.tick_stats, labels))
+        samples.extend(('mpf_monitor_model_rows', dict(labels, window=window), rows)
+                       for window, rows in self.model_rows.items())
+        return samples
+
+    def dump_latency(self):
+        """Write the latency histograms to the logs folder of the machine."""
+        log_path = os.path.join(self.machine_path, "logs")
+        os.makedirs(log_path, exist_ok=True)
+        filename = os.path.join(log_path, "latency-{}{}.json".format(
+            "{}-".format(self.name) if self.name else "", time.strftime("%Y%m%d-%H%M%S")))
+        self.latency.dump(filename)
+        self.log.info("Latency histograms written to %s", filename)
+        return filename
+
     def about(self):
         QMessageBox.about(self, "About MPF Monitor",
                 "This is the MPF Monitor")
@@ -318,8 +438,62 @@ class MPFMonitor():
 
 
 
-def run(machine_path, thread_stopper, config_file, testing=False):
+def run(machine_path, thread_stopper, config_file, testing=False, record=False,
+        record_max_bytes=100 * 1024 * 1024, replay_file=None, replay_speed=1, machines=None,
+        profile=False, metrics_host='127.0.0.1', metrics_port=None):
+    """Run the monitor.
+
+    machines is an optional list of (interface, port, machine_path) tuples.
+    When given, all of these machines are monitored from this process
+    instead of the one in machine_path at localhost:5051.
+
+    When profile is set, the whole session is profiled and the profile is
+    written to <machine_path>/logs on exit.
+
+    When metrics_port is set, the metrics of all machines are served at
+    http://<metrics_host>:<metrics_port>/metrics.
+    """
 
     app = QApplication(sys.argv)
-    MPFMonitor(app, machine_path, thread_stopper, config_file, testing=testing)
+
+    # profiles the whole process, so it is shared by all machines
+    profiler = SessionProfiler(os.path.join(machine_path, "logs"))
+    app.aboutToQuit.connect(profiler.stop)
+    if profile:
+        profiler.start()
+
+    if not machines:
+        monitor = MPFMonitor(app, machine_path, thread_stopper, config_file, testing=testing,
+                             record=record, record_max_bytes=record_max_bytes,
+                             replay_file=replay_file, replay_speed=replay_speed, profiler=profiler)
+        start_metrics_server(app, [monitor.collect_metrics], metrics_host, metrics_port)
+        app.exec()
+        return
+
+    # All machines share the Qt application, the BCP loop (thread) and the
+    # tick scheduler. Each machine keeps its own windows and state.
+    bcp_loop = BCPLoop()
+    monitors = []
+
+    def tick():
+        for monitor in monitors:
+            monitor.tick()
+
+    tick_scheduler = TickScheduler(tick)
+
+    names = [os.path.basename(os.path.normpath(path)) for _, _, path in machines]
+    for (interface, port, path), name in zip(machines, names):
+        if names.count(name) > 1:
+            name = "{} {}:{}".format(name, interface, port)
+        monitors.append(MPFMonitor(app, path, thread_stopper, config_file, testing=testing,
+                                   record=record, record_max_bytes=record_max_bytes,
+                                   interface=interface, port=port, name=name,
+                                   bcp_loop=bcp_loop, tick_scheduler=tick_scheduler,
+                                   profiler=profiler))
+
+    start_metrics_server(app, [monitor.collect_metrics for monitor in monitors],
+                         metrics_host, metrics_port)
+
+    # connected last, so it runs after every client was closed
+    app.aboutToQuit.connect(bcp_loop.stop)
     app.exec()
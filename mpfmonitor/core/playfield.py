@@ -29,7 +29,6 @@ class PfView(QGraphicsView):
         self.mpfmon = mpfmon
         super().__init__(parent)
 
-        self.setWindowTitle("Playfield")
         self.set_inspector_mode_title(inspect=False)
 
     def resizeEvent(self, event=None):
@@ -37,9 +36,19 @@ class PfView(QGraphicsView):
 
     def set_inspector_mode_title(self, inspect=False):
         if inspect:
-            self.setWindowTitle('Inspector Enabled - Playfield')
+            self.setWindowTitle(self.mpfmon.window_title('Inspector Enabled - Playfield'))
         else:
-            self.setWindowTitle("Playfield")
+            self.setWindowTitle(self.mpfmon.window_title("Playfield"))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
 
     def closeEvent(self, event):
         self.mpfmon.write_local_settings()
@@ -144,6 +153,8 @@ class PfWidget(QGraphicsItem):
         self.click_start = 0
         self.release_switch = False
         self.pen = QPen(Qt.GlobalColor.white, 3, Qt.PenStyle.SolidLine)
+        # socket read time of the oldest change which has not been painted yet
+        self.unpainted_received = None
 
         self.log = logging.getLogger('Core')
 
@@ -201,6 +212,10 @@ class PfWidget(QGraphicsItem):
 
         painter.setBrush(self.widget.get_colored_brush())
 
+        if self.unpainted_received is not None:
+            self.mpfmon.latency.record('devices', 'paint', self.unpainted_received)
+            self.unpainted_received = None
+
         draw_shape = self.shape
 
         # Preserve legacy and regular use
@@ -277,6 +292,8 @@ class PfWidget(QGraphicsItem):
             painter.drawPolygon(points)
 
     def notify(self, destroy=False, resize=False):
+        if self.unpainted_received is None:
+            self.unpainted_received = self.mpfmon.latency.current_received
         self.update()
 
         if destroy:
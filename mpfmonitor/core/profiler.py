@@ -0,0 +1,75 @@
+"""Profiles the monitor on demand and writes the results to the logs folder."""
+
+import cProfile
+import logging
+import os
+import pstats
+import time
+
+
+class SessionProfiler(object):
+    """Deterministic profiler (cProfile) of the Qt main thread.
+
+    It is started and stopped with --profile or from the inspector, so a
+    profile can be captured exactly when the monitor starts lagging. Every
+    stop writes <log_path>/<start time>-monitor-profile.prof, which can be
+    loaded with pstats or snakeviz, and a text summary of the slowest call
+    paths next to it.
+    """
+
+    def __init__(self, log_path, summary_lines=50):
+        self.log = logging.getLogger('Profiler')
+        self.log_path = log_path
+        self.summary_lines = summary_lines
+        self.profile = None
+        self.started = None
+        self.last_file = None
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self):
+        if self.running:
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # another profiler is already active
+            self.log.warning("Could not start profiling: %s", e)
+            return
+
+        self.profile = profile
+        self.started = time.time()
+        self.log.info("Profiling started")
+
+    def stop(self):
+        """Stop profiling and return the name of the profile file."""
+        if not self.running:
+            return None
+
+        profile = self.profile
+        profile.disable()
+        self.profile = None
+
+        os.makedirs(self.log_path, exist_ok=True)
+        filename = os.path.join(self.log_path, time.strftime(
+            "%Y-%m-%d-%H-%M-%S-monitor-profile", time.localtime(self.started)))
+        profile.dump_stats(filename + ".prof")
+
+        with open(filename + ".txt", "w", encoding="utf-8") as f:
+            f.write("Profiled {:.1f} s\n".format(time.time() - self.started))
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.summary_lines)
+
+        self.last_file = filename + ".prof"
+        self.log.info("Profile written to %s", self.last_file)
+        return self.last_file
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
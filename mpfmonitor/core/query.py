@@ -0,0 +1,196 @@
+"""Filter queries of the monitor windows, e.g. "type:light color!=[0,0,0]"."""
+
+import json
+import re
+import time
+from fnmatch import fnmatchcase
+
+# returned by get_field for fields an item does not have
+MISSING = object()
+
+TERM = re.compile(r'^([A-Za-z_]\w*)(!=|<=|>=|:|=|<|>)(.+)$', re.S)
+DURATION = re.compile(r'^(\d+(?:\.\d+)?)(ms|s|m|h)?$')
+DURATION_UNITS = {'ms': .001, 's': 1, 'm': 60, 'h': 3600, None: 1}
+WILDCARDS = re.compile(r'[*?\[]')
+
+
+def split_terms(text):
+    """Split a query at spaces, except within brackets and quotes."""
+    terms = []
+    current = []
+    depth = 0
+    quote = None
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth = max(depth - 1, 0)
+        elif char.isspace() and not depth:
+            if current:
+                terms.append("".join(current))
+                current = []
+            continue
+        current.append(char)
+
+    if current:
+        terms.append("".join(current))
+    return terms
+
+
+def parse_value(text):
+    """Return the value of a term: JSON (numbers, lists, true, "a b") or else the text."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    if text in ('True', 'False'):
+        return text == 'True'
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1]
+    return text
+
+
+def parse_duration(text):
+    """Return seconds of e.g. 500ms, 10s, 5m or 1h, or None."""
+    match = DURATION.match(text)
+    if not match:
+        return None
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class Term(object):
+    """One compiled term of a query."""
+
+    __slots__ = ["field", "operator", "text", "predicate"]
+
+    def __init__(self, field, operator, text, predicate):
+        self.field = field
+        self.operator = operator
+        self.text = text
+        self.predicate = predicate
+
+
+class Query(object):
+    """A filter query, compiled once into one predicate per term.
+
+    A query is a list of terms separated by spaces which all have to match:
+
+        word            the name (or another text field) contains word,
+                        * and ? are wildcards
+        field:value     the field is value (same as field=value). Strings
+                        are case insensitive and may contain wildcards.
+        field!=value    the field is not value
+        field<value     also <=, > and >=, for numbers
+        since:10s       changed or received within the last 10 s (ms, s, m, h)
+
+    Values are read as JSON where possible, e.g. [0,0,0], 1.5, true or
+    "a b". A field which an item does not have never matches.
+
+    get_field(item, field) returns the value of a field of an item, or
+    MISSING. It is called while matching, so the items are never turned
+    into text first.
+    """
+
+    def __init__(self, text, get_field, text_fields=('name',)):
+        self.text = text
+        self.get_field = get_field
+        self.text_fields = text_fields
+        self.terms = [self._compile(term) for term in split_terms(text)]
+        self.time_dependent = any(term.field == 'since' for term in self.terms)
+
+    def fields(self):
+        """Return the fields the terms refer to, None stands for the text fields."""
+        return {term.field for term in self.terms}
+
+    def matches(self, item, now=None):
+        if now is None and self.time_dependent:
+            now = time.time()
+        for term in self.terms:
+            if not term.predicate(item, now):
+                return False
+        return True
+
+    def _compile(self, term):
+        get_field = self.get_field
+        match = TERM.match(term)
+        if not match:
+            return self._compile_text(term)
+
+        field, operator, text = match.groups()
+        if field == 'since' and operator in (':', '='):
+            seconds = parse_duration(text)
+            if seconds is not None:
+                def since(item, now):
+                    changed = get_field(item, 'time')
+                    return changed is not MISSING and changed is not None and changed >= now - seconds
+                return Term(field, operator, text, since)
+
+        value = parse_value(text)
+        if operator in (':', '=', '!='):
+            equal = self._equality(value)
+            if operator == '!=':
+                def predicate(item, now):
+                    actual = get_field(item, field)
+                    return actual is not MISSING and not equal(actual)
+            else:
+                def predicate(item, now):
+                    actual = get_field(item, field)
+                    return actual is not MISSING and equal(actual)
+            return Term(field, operator, text, predicate)
+
+        compare = {
+            '<': lambda actual: actual < value,
+            '<=': lambda actual: actual <= value,
+            '>': lambda actual: actual > value,
+            '>=': lambda actual: actual >= value,
+        }[operator]
+
+        def predicate(item, now):
+            actual = get_field(item, field)
+            if actual is MISSING:
+                return False
+            try:
+                return compare(actual)
+            except TypeError:
+                return False
+        return Term(field, operator, text, predicate)
+
+    @staticmethod
+    def _equality(value):
+        if isinstance(value, str):
+            pattern = value.lower()
+            if WILDCARDS.search(pattern):
+                return lambda actual: fnmatchcase(str(actual).lower(), pattern)
+            return lambda actual: str(actual).lower() == pattern
+
+        if isinstance(value, list):
+            # states may hold tuples as well
+            return lambda actual: (list(actual) if isinstance(actual, tuple) else actual) == value
+        return lambda actual: actual == value
+
+    def _compile_text(self, text):
+        get_field = self.get_field
+        text_fields = self.text_fields
+        pattern = text.lower()
+        if WILDCARDS.search(pattern):
+            pattern = "*" + pattern + "*"
+
+            def predicate(item, now):
+                for field in text_fields:
+                    value = get_field(item, field)
+                    if value is not MISSING and fnmatchcase(str(value).lower(), pattern):
+                        return True
+                return False
+        else:
+            def predicate(item, now):
+                for field in text_fields:
+                    value = get_field(item, field)
+                    if value is not MISSING and pattern in str(value).lower():
+                        return True
+                return False
+        return Term(None, None, text, predicate)
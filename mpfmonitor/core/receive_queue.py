@@ -0,0 +1,208 @@
+"""Queue of received BCP messages waiting for the GUI tick."""
+
+import threading
+from collections import deque
+
+COMMAND_CATEGORIES = {
+    'device': 'devices',
+    'monitored_event': 'events',
+    'mode_start': 'modes',
+    'mode_stop': 'modes',
+    'mode_list': 'modes',
+    'player_variable': 'variables',
+    'machine_variable': 'variables',
+}
+
+CATEGORIES = ('devices', 'events', 'modes', 'variables', 'other')
+
+# Policies:
+#   coalesce    - a newer state replaces the queued state for the same
+#                 device/variable/mode list. Never dropped otherwise.
+#   keep        - never dropped, even when the queue is full. These
+#                 categories can take the queue past max_size.
+#   drop_oldest - when the queue is full the oldest queued message of this
+#                 category is dropped to make room.
+#   drop_newest - when the queue is full the new message is dropped.
+POLICIES = ('coalesce', 'keep', 'drop_oldest', 'drop_newest')
+
+STATE_CATEGORIES = ('devices', 'variables', 'modes')
+
+# MPF waits for the answer to these, so they are never dropped
+NEVER_DROPPED = ('reset',)
+
+
+def state_key(cmd, kwargs):
+    """Return the key of the state a message replaces, or None.
+
+    A newer message with the same key supersedes an older one. Only
+    devices, variables and mode lists carry state, events do not.
+    """
+    category = COMMAND_CATEGORIES.get(cmd)
+    if category == 'devices':
+        return category, kwargs.get('type'), kwargs.get('name')
+    if category == 'variables':
+        return cmd, kwargs.get('player_num'), kwargs.get('name')
+    if category == 'modes':
+        return category
+    return None
+
+
+def merge_changes(queued, newer):
+    """Return the changes of a device update which replaces a queued one.
+
+    MPF sends the property which changed as [name, old, new], or False with
+    a full state. Once two updates of different properties are merged the
+    result is a full state again, so the receiver compares all properties.
+    """
+    if queued and newer and queued[0] == newer[0]:
+        return [newer[0], queued[1], newer[2]]
+    return False
+
+
+DEFAULT_POLICIES = {
+    'devices': 'coalesce',
+    'events': 'keep',
+    'modes': 'keep',
+    'variables': 'coalesce',
+    'other': 'drop_oldest',
+}
+
+
+class ReceiveQueue(object):
+    """Thread safe, bounded queue between the BCP client and MPFMonitor.tick.
+
+    Every message belongs to a category (see COMMAND_CATEGORIES) and each
+    category has a policy which decides what happens to superseded states
+    and what happens when more than max_size messages are waiting. By
+    default device updates are coalesced last-write-wins: while an update
+    for a device is waiting for the next tick, a newer update for the same
+    (type, name) replaces its state in place instead of being queued again.
+    Player and machine variables are coalesced the same way, and other
+    messages are dropped oldest first while the queue is full. Events and
+    modes are kept, so they can take the queue past max_size.
+    Messages of categories which are not coalesced keep their order.
+
+    wakeup is called (outside the lock) whenever the queue goes from empty
+    to non-empty, so the consumer does not have to poll.
+    """
+
+    def __init__(self, wakeup=None, max_size=20000, policies=None):
+        self.mutex = threading.Lock()
+        self.queue = deque()
+        self.wakeup = wakeup
+        self.max_size = max_size
+        self.size = 0
+        self.peak_size = 0
+
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            for category, policy in policies.items():
+                if category not in self.policies or policy not in POLICIES:
+                    raise ValueError("Invalid receive queue policy {}: {}".format(category, policy))
+                self.policies[category] = policy
+
+        self.counters = {category: {'received': 0, 'collapsed': 0, 'dropped': 0}
+                         for category in CATEGORIES}
+        self.command_counters = dict()
+
+        self._coalesce_entries = dict()
+        self._category_entries = {category: deque() for category in CATEGORIES}
+        self._has_dropped = False
+
+    def put(self, item, received=None):
+        """Add a (cmd, kwargs) tuple to the queue.
+
+        received is the time.monotonic_ns() the message was read from the
+        socket, it is handed on to the consumer for latency measurements.
+        """
+        cmd, kwargs = item
+        category = COMMAND_CATEGORIES.get(cmd, 'other')
+        policy = self.policies[category]
+        counters = self.counters[category]
+
+        with self.mutex:
+            was_empty = not self.size
+            counters['received'] += 1
+            self.command_counters[cmd] = self.command_counters.get(cmd, 0) + 1
+
+            key = None
+            if policy == 'coalesce':
+                key = state_key(cmd, kwargs)
+                entry = self._coalesce_entries.get(key)
+                if entry is not None:
+                    # only the newest state will ever be visible
+                    if 'changes' in kwargs:
+                        kwargs = dict(kwargs, changes=merge_changes(entry[1].get('changes'),
+                                                                    kwargs['changes']))
+                    entry[1] = kwargs
+                    entry[2] = received
+                    counters['collapsed'] += 1
+                    return
+
+            if self.size >= self.max_size:
+                if policy == 'drop_newest' and cmd not in NEVER_DROPPED:
+                    counters['dropped'] += 1
+                    return
+                if policy == 'drop_oldest' and self._category_entries[category]:
+                    oldest = self._category_entries[category].popleft()
+                    oldest[0] = None
+                    self.size -= 1
+                    self._has_dropped = True
+                    counters['dropped'] += 1
+
+            entry = [cmd, kwargs, received]
+            self.queue.append(entry)
+            self.size += 1
+            if self.size > self.peak_size:
+                self.peak_size = self.size
+
+            if key is not None:
+                self._coalesce_entries[key] = entry
+            elif policy == 'drop_oldest' and cmd not in NEVER_DROPPED:
+                self._category_entries[category].append(entry)
+
+        if was_empty and self.wakeup:
+            self.wakeup()
+
+    def drain(self):
+        """Remove and return all queued [cmd, kwargs, received] entries."""
+        with self.mutex:
+            items = self.queue
+            has_dropped = self._has_dropped
+            self._reset()
+
+        if has_dropped:
+            items = [entry for entry in items if entry[0] is not None]
+
+        return items
+
+    def clear(self):
+        with self.mutex:
+            self._reset()
+
+    def _reset(self):
+        self.queue = deque()
+        self.size = 0
+        self._coalesce_entries = dict()
+        for entries in self._category_entries.values():
+            entries.clear()
+        self._has_dropped = False
+
+    def qsize(self):
+        return self.size
+
+    def empty(self):
+        return not self.size
+
+    def stats(self):
+        """Return a snapshot of the queue depth and per category counters."""
+        with self.mutex:
+            return {
+                'queued': self.size,
+                'peak': self.peak_size,
+                'max_size': self.max_size,
+                'policies': dict(self.policies),
+                'categories': {category: dict(counters)
+                               for category, counters in self.counters.items()},
+                'commands': dict(self.command_counters),
+            }
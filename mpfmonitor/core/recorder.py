@@ -0,0 +1,115 @@
+"""Records the received BCP stream to disk for later replay."""
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+RECORDING_HEADER = "# mpf-monitor recording v1"
+RECORDING_EXTENSION = ".bcprec"
+
+
+def read_recording(file):
+    """Yield (offset_us, message) pairs from an open recording file."""
+    for line in file:
+        if not line or line[0] == '#':
+            continue
+        offset, message = line.rstrip('\n').split(',', 1)
+        yield int(offset), message
+
+
+class SessionRecorder(object):
+    """Writes received BCP messages to disk without slowing the receive path.
+
+    record() only puts the message and its receive time on a queue. A
+    background thread writes everything that is waiting in one go through a
+    buffered file. Each line is "<offset_us>,<message>" where the offset is
+    taken from time.monotonic_ns() and counts microseconds since the start
+    of the session, so gaps of any length are preserved exactly and every
+    file of a rotated session can be read on its own.
+
+    Files are rotated once they grow beyond max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024, buffer_size=1024 * 1024):
+        self.log = logging.getLogger('Recorder')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+
+        self.start_ns = time.monotonic_ns()
+        self.session_name = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-session")
+        self.part = 0
+        self.file = None
+        self.filename = None
+
+        self.written_messages = 0
+        self.write_lag_ns = 0
+
+        self._queue = queue.SimpleQueue()
+        self._stop = object()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._open_next_file()
+
+        self.thread = threading.Thread(target=self._run, name='Recorder')
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.log.info("Recording BCP session to %s", self.filename)
+
+    def record(self, received_ns, message):
+        """Queue a message received at time.monotonic_ns() received_ns."""
+        self._queue.put((received_ns, message))
+
+    def close(self):
+        """Write everything which is still queued and close the file."""
+        if not self.thread.is_alive():
+            return
+
+        self._queue.put(self._stop)
+        self.thread.join()
+
+    def _open_next_file(self):
+        if self.file:
+            self.file.close()
+
+        self.part += 1
+        self.filename = os.path.join(self.directory, "{}-{:03d}{}".format(
+            self.session_name, self.part, RECORDING_EXTENSION))
+        self.file = open(self.filename, "w", buffering=self.buffer_size, encoding="utf-8", newline="\n")
+        self.file.write("{} start={}\n".format(RECORDING_HEADER, datetime.now().isoformat()))
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if self._stop in batch:
+                batch = batch[:batch.index(self._stop)]
+                stop = True
+
+            if batch:
+                self._write(batch)
+
+        self.file.close()
+
+    def _write(self, batch):
+        start_ns = self.start_ns
+        self.file.write("".join(
+            "{},{}\n".format((received_ns - start_ns) // 1000, message)
+            for received_ns, message in batch))
+        self.file.flush()
+
+        self.written_messages += len(batch)
+        self.write_lag_ns = time.monotonic_ns() - batch[-1][0]
+
+        if self.file.tell() >= self.max_bytes:
+            self._open_next_file()
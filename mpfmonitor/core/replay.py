@@ -0,0 +1,280 @@
+"""Indexed, seekable playback of recorded BCP sessions."""
+
+import bisect
+import json
+import logging
+import os
+import time
+from array import array
+
+import mpf.core.bcp.bcp_socket_client as bcp
+
+from mpfmonitor.core.receive_queue import COMMAND_CATEGORIES, STATE_CATEGORIES, state_key
+
+INDEX_VERSION = 1
+INDEX_EXTENSION = ".idx"
+
+REPLAY_SPEEDS = (0.25, 0.5, 1, 2, 5, 10, 25, 50)
+MAX_SPEED = 0  # as fast as possible
+
+
+class RecordingIndex(object):
+    """Keyframes of a recording.
+
+    A keyframe is taken every keyframe_interval microseconds of session
+    time. It stores the byte position of the first message at or after the
+    keyframe and the byte positions of the latest message for every device,
+    variable and mode list before it. Reading those messages restores the
+    full state at the keyframe without replaying anything older.
+
+    The index is built by scanning the recording once and is stored next to
+    it (<recording>.idx), so it only has to be built again when the
+    recording changes.
+    """
+
+    def __init__(self, size=0, start=0, end=0, offsets=None, positions=None, snapshots=None):
+        self.size = size    # of the recording in bytes
+        self.start = start  # offset of the first message
+        self.end = end      # offset of the last message
+        self.offsets = offsets if offsets is not None else array('q')
+        self.positions = positions if positions is not None else array('q')
+        self.snapshots = snapshots if snapshots is not None else []
+
+    @classmethod
+    def build(cls, file, keyframe_interval=5000000):
+        """Scan an open binary recording file and return its index."""
+        index = cls()
+        state = dict()
+        next_keyframe = None
+        position = 0
+
+        file.seek(0)
+        for line in file:
+            line_position = position
+            position += len(line)
+            if line[:1] == b'#' or not line.strip():
+                continue
+
+            comma = line.index(b',')
+            offset = int(line[:comma])
+
+            if next_keyframe is None:
+                index.start = next_keyframe = offset
+
+            if offset >= next_keyframe:
+                index.offsets.append(offset)
+                index.positions.append(line_position)
+                index.snapshots.append(array('q', sorted(state.values())))
+                while next_keyframe <= offset:
+                    next_keyframe += keyframe_interval
+
+            # only stateful messages end up in snapshots, skip decoding the rest
+            cmd = line[comma + 1:line.find(b'?', comma)].decode()
+            if COMMAND_CATEGORIES.get(cmd) in STATE_CATEGORIES:
+                cmd, kwargs = bcp.decode_command_string(line[comma + 1:].decode().rstrip('\n'))
+                state[state_key(cmd, kwargs)] = line_position
+
+            index.end = offset
+
+        index.size = position
+        return index
+
+    @classmethod
+    def load(cls, filename, size):
+        """Load an index file. Returns None when it is missing or stale."""
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get('version') != INDEX_VERSION or data.get('size') != size:
+            return None
+
+        return cls(data['size'], data['start'], data['end'],
+                   array('q', data['offsets']), array('q', data['positions']),
+                   [array('q', snapshot) for snapshot in data['snapshots']])
+
+    def save(self, filename):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'size': self.size,
+                'start': self.start,
+                'end': self.end,
+                'offsets': self.offsets.tolist(),
+                'positions': self.positions.tolist(),
+                'snapshots': [snapshot.tolist() for snapshot in self.snapshots],
+            }, f)
+
+    def find_keyframe(self, offset):
+        """Return the number of the last keyframe at or before offset."""
+        return max(0, bisect.bisect_right(self.offsets, offset) - 1)
+
+
+class ReplayEngine(object):
+    """Plays a recording back through dispatch(message) at any speed.
+
+    The recording is read sequentially, one message ahead, so memory use
+    does not depend on the length of the session. advance() is called
+    periodically and dispatches every message which is due according to
+    the session clock, which runs at speed times the wall clock. At
+    MAX_SPEED the clock is ignored and up to batch_size messages are
+    dispatched per call.
+
+    seek() jumps to any offset by restoring the state of the closest
+    keyframe before it and replaying the few seconds in between.
+
+    All times are microseconds since the start of the recorded session.
+    """
+
+    def __init__(self, filename, dispatch, keyframe_interval=5.0, batch_size=5000):
+        self.log = logging.getLogger('Replay')
+        self.filename = filename
+        self.dispatch = dispatch
+        self.batch_size = batch_size
+
+        self.file = open(filename, "rb")
+        self.index = self._load_index(int(keyframe_interval * 1000000))
+
+        self.speed = 1
+        self.playing = False
+        self.finished = False
+        self.position = self.index.start
+        self._anchor = None  # wall clock time at which position was reached
+        self._next = None
+
+        self.file.seek(0)
+
+    def _load_index(self, keyframe_interval):
+        size = os.fstat(self.file.fileno()).st_size
+        index_file = self.filename + INDEX_EXTENSION
+
+        index = RecordingIndex.load(index_file, size)
+        if index is None:
+            self.log.info("Indexing recording %s", self.filename)
+            index = RecordingIndex.build(self.file, keyframe_interval)
+            try:
+                index.save(index_file)
+            except OSError as e:
+                self.log.warning("Could not save index %s: %s", index_file, e)
+
+        return index
+
+    @property
+    def start(self):
+        return self.index.start
+
+    @property
+    def end(self):
+        return self.index.end
+
+    def close(self):
+        self.playing = False
+        self.file.close()
+
+    def _read_next(self):
+        """Return the next (offset, message) of the recording or None."""
+        if self._next is None:
+            for line in self.file:
+                if line[:1] == b'#' or not line.strip():
+                    continue
+                offset, message = line.decode().rstrip('\n').split(',', 1)
+                self._next = int(offset), message
+                break
+        return self._next
+
+    def current_position(self, now=None):
+        if not self.playing or self.speed == MAX_SPEED:
+            return self.position
+
+        if now is None:
+            now = time.monotonic()
+        return min(self.end, self.position + int((now - self._anchor) * 1000000 * self.speed))
+
+    def play(self, now=None):
+        if self.finished:
+            self.seek(self.start)
+        self.playing = True
+        self._anchor = time.monotonic() if now is None else now
+
+    def pause(self, now=None):
+        self.position = self.current_position(now)
+        self.playing = False
+
+    def set_speed(self, speed, now=None):
+        """Change the speed multiplier. MAX_SPEED plays as fast as possible."""
+        if speed != MAX_SPEED and not REPLAY_SPEEDS[0] <= speed <= REPLAY_SPEEDS[-1]:
+            raise ValueError("Invalid replay speed {}".format(speed))
+
+        self.position = self.current_position(now)
+        self._anchor = time.monotonic() if now is None else now
+        self.speed = speed
+
+    def seek(self, offset, now=None):
+        """Jump to offset and dispatch the state at that point of the session."""
+        if not self.index.snapshots:
+            # a recording without messages has nothing to restore or play
+            self.position = self.start
+            self.finished = True
+            return
+
+        offset = min(max(offset, self.start), self.end)
+        keyframe = self.index.find_keyframe(offset)
+
+        for position in self.index.snapshots[keyframe]:
+            self.file.seek(position)
+            self.dispatch(self.file.readline().decode().rstrip('\n').split(',', 1)[1])
+
+        self.file.seek(self.index.positions[keyframe])
+        self._next = None
+        while True:
+            message = self._read_next()
+            if message is None or message[0] > offset:
+                break
+            self.dispatch(message[1])
+            self._next = None
+
+        self.position = offset
+        self.finished = False
+        self._anchor = time.monotonic() if now is None else now
+
+    def advance(self, now=None):
+        """Dispatch all messages which are due. Returns how many were sent."""
+        if not self.playing:
+            return 0
+
+        if now is None:
+            now = time.monotonic()
+
+        if self.speed == MAX_SPEED:
+            target = self.end
+        else:
+            target = self.current_position(now)
+
+        dispatched = 0
+        last_offset = None
+        while dispatched < self.batch_size:
+            message = self._read_next()
+            if message is None:
+                self.log.info("End of recording reached.")
+                self.playing = False
+                self.finished = True
+                self.position = self.end
+                return dispatched
+
+            if message[0] > target:
+                break
+
+            self.dispatch(message[1])
+            self._next = None
+            last_offset = message[0]
+            dispatched += 1
+
+        if last_offset is not None and (self.speed == MAX_SPEED or dispatched == self.batch_size):
+            # Behind schedule, continue the clock from the last message sent
+            # instead of skipping ahead.
+            self.position = max(self.position, last_offset)
+            self._anchor = now
+
+        return dispatched
@@ -0,0 +1,57 @@
+"""Wakes the GUI thread when received BCP messages are waiting."""
+
+import time
+
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+
+class TickScheduler(QObject):
+    """Runs the tick callback only when there is something to process.
+
+    The receive queue calls wake() from the BCP thread when it goes from
+    empty to non-empty. wake() posts a queued signal to the GUI thread,
+    which runs the tick as soon as the minimum interval since the previous
+    tick has passed. The interval adapts to how long ticks take, so a burst
+    of messages is still processed in batches while an idle monitor does
+    not tick at all.
+    """
+
+    _woken = pyqtSignal()
+
+    def __init__(self, callback, min_interval=2, max_interval=50, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.min_interval = min_interval  # ms
+        self.max_interval = max_interval  # ms
+        self.interval = min_interval
+        self.last_tick = 0.0
+        self.last_duration = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._tick)
+
+        self._woken.connect(self._schedule, Qt.ConnectionType.QueuedConnection)
+
+    def wake(self):
+        """Request a tick. Can be called from any thread."""
+        self._woken.emit()
+
+    def _schedule(self):
+        if self.timer.isActive():
+            # a tick is already pending and will pick up the new messages
+            return
+
+        elapsed = (time.perf_counter() - self.last_tick) * 1000
+        self.timer.start(max(0, int(self.interval - elapsed)))
+
+    def _tick(self):
+        start = time.perf_counter()
+        self.callback()
+        self.last_tick = time.perf_counter()
+        self.last_duration = (self.last_tick - start) * 1000
+
+        # Slow ticks mean a burst is going on. Wait a bit longer before the
+        # next one so more messages are handled per tick.
+        self.interval = min(self.max_interval,
+                            max(self.min_interval, self.last_duration * 2))
@@ -0,0 +1,73 @@
+"""Index for searching names as they are typed into a filter box."""
+
+import re
+from fnmatch import fnmatchcase
+
+# *, ? and [character sets] as in fnmatch
+WILDCARDS = re.compile(r'\[[^\]]*\]|[*?]')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex(object):
+    """Case insensitive substring search over the names of many items.
+
+    Every name is split into its trigrams (the substrings of three
+    characters) and each trigram maps to the items whose name contains it.
+    A search only checks the items which contain all trigrams of the
+    text, instead of every name. Items can be added at any time.
+
+    The text may contain the wildcards * and ? (as in the filter wildcard of
+    Qt). Then the longest part without wildcards selects the candidates.
+    """
+
+    def __init__(self):
+        self.names = dict()
+        self.items = dict()
+
+    def add(self, item, name):
+        name = str(name).lower()
+        self.names[item] = name
+        for trigram in trigrams(name):
+            items = self.items.get(trigram)
+            if items is None:
+                self.items[trigram] = {item}
+            else:
+                items.add(item)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, text):
+        """Return the set of items whose name contains text."""
+        text = text.lower()
+        literal = max(WILDCARDS.split(text), key=len)
+
+        if len(literal) < 3:
+            candidates = self.names
+        else:
+            candidate_sets = []
+            for trigram in trigrams(literal):
+                items = self.items.get(trigram)
+                if items is None:
+                    return set()
+                candidate_sets.append(items)
+            candidate_sets.sort(key=len)
+            candidates = candidate_sets[0].intersection(*candidate_sets[1:])
+
+        names = self.names
+        if literal == text:
+            return {item for item in candidates if text in names[item]}
+        pattern = "*" + text + "*"
+        return {item for item in candidates if fnmatchcase(names[item], pattern)}
+
+    @staticmethod
+    def matches(text, name):
+        """Return whether a single name matches a search text, without an index."""
+        text = text.lower()
+        name = str(name).lower()
+        if WILDCARDS.search(text):
+            return fnmatchcase(name, "*" + text + "*")
+        return text in name
@@ -0,0 +1,159 @@
+"""Generates the BCP messages of a made-up MPF machine."""
+
+import random
+
+import mpf.core.bcp.bcp_socket_client as bcp
+
+LIGHT_PATTERNS = ('chase', 'blink', 'fade', 'random')
+
+MODES = (('attract', 10), ('game', 20), ('base', 100), ('skillshot', 200),
+         ('multiball', 500), ('bonus', 1000))
+
+
+class SyntheticMachine(object):
+    """State of a fake machine with switches, lights and variables.
+
+    Every method returns BCP message strings the way MPF would send them to
+    the monitor, so they can be fed to BCPClient.process_received_message()
+    or written to a socket. The state is kept so changes are reported with
+    their old and new values.
+    """
+
+    def __init__(self, switches=64, lights=128, seed=None):
+        self.random = random.Random(seed)
+        self.switches = {"s_switch_{}".format(i): 0 for i in range(switches)}
+        self.lights = {"l_light_{}".format(i): [0, 0, 0] for i in range(lights)}
+        self.light_names = list(self.lights)
+        self.running_modes = [MODES[0]]
+        self.machine_variables = {'credits_string': "FREE PLAY", 'max_volume': 8}
+        self.score = 0
+        self.ball = 1
+        self.step = 0
+
+    def device_messages(self):
+        """Return the state of all devices, like MPF does on monitor_start."""
+        messages = [self._device('switch', name, False, {'state': state, 'recycle_jitter_count': 0})
+                    for name, state in self.switches.items()]
+        messages.extend(self._device('light', name, False, {'color': color})
+                        for name, color in self.lights.items())
+        return messages
+
+    def set_switch(self, name, state):
+        """Change a switch like a switch command would and return the update."""
+        old = self.switches.get(name, 0)
+        self.switches[name] = state
+        return self._device('switch', name, ['state', old, state],
+                            {'state': state, 'recycle_jitter_count': 0})
+
+    def toggle_random_switch(self):
+        name = self.random.choice(list(self.switches))
+        return self.set_switch(name, 1 - self.switches[name])
+
+    def set_light(self, name, color):
+        old = self.lights[name]
+        if old == color:
+            return None
+        self.lights[name] = color
+        return self._device('light', name, ['color', old, color], {'color': color})
+
+    def light_show_step(self, pattern='chase'):
+        """Advance a light show pattern by one step and return the updates."""
+        self.step += 1
+        count = len(self.light_names)
+        messages = []
+
+        for i, name in enumerate(self.light_names):
+            if pattern == 'chase':
+                brightness = 255 if (i - self.step) % 8 == 0 else 0
+                color = [brightness, brightness, brightness]
+            elif pattern == 'blink':
+                color = [255, 0, 0] if self.step % 2 else [0, 0, 0]
+            elif pattern == 'fade':
+                brightness = (self.step * 16 + i * 256 // max(1, count)) % 256
+                color = [brightness, brightness // 2, 0]
+            elif pattern == 'random':
+                if self.random.random() > .25:
+                    continue
+                color = [self.random.randrange(256) for _ in range(3)]
+            else:
+                raise ValueError("Unknown light pattern {}".format(pattern))
+
+            message = self.set_light(name, color)
+            if message:
+                messages.append(message)
+
+        return messages
+
+    def event_messages(self, count=1):
+        """Return a burst of count events."""
+        return [bcp.encode_command_string(
+            'monitored_event', event_name="synthetic_event_{}".format(self.random.randrange(50)),
+            event_type=None, event_callback=None,
+            event_kwargs={'step': self.step, 'value': self.random.randrange(1000)},
+            registered_handlers=[]) for _ in range(count)]
+
+    def mode_message(self):
+        """Start or stop a random mode and return the new mode list."""
+        mode = self.random.choice(MODES[1:])
+        if mode in self.running_modes:
+            self.running_modes.remove(mode)
+        else:
+            self.running_modes.append(mode)
+        return self.mode_list_message()
+
+    def mode_list_message(self):
+        return bcp.encode_command_string('mode_list', running_modes=[list(m) for m in self.running_modes])
+
+    def machine_variable_messages(self):
+        """Return all machine variables, like MPF does on monitor_start."""
+        return [bcp.encode_command_string('machine_variable', name=name, value=value,
+                                          prev_value=None, change=False)
+                for name, value in self.machine_variables.items()]
+
+    def variable_messages(self):
+        """Score some points and return the changed variables."""
+        points = self.random.choice((10, 100, 1000, 5000))
+        self.score += points
+        messages = [bcp.encode_command_string(
+            'player_variable', name='score', value=self.score, prev_value=self.score - points,
+            change=points, player_num=1)]
+
+        if self.random.random() < .01:
+            self.ball = self.ball % 3 + 1
+            messages.append(bcp.encode_command_string(
+                'player_variable', name='ball', value=self.ball, prev_value=None,
+                change=True, player_num=1))
+            volume = self.machine_variables['max_volume']
+            self.machine_variables['max_volume'] = volume % 8 + 1
+            messages.append(bcp.encode_command_string(
+                'machine_variable', name='max_volume', value=volume % 8 + 1,
+                prev_value=volume, change=True))
+
+        return messages
+
+    def stream(self, count, pattern='chase'):
+        """Yield count messages of a busy game.
+
+        Mostly light show updates, mixed with switch hits, events, score
+        changes and the occasional mode change.
+        """
+        produced = 0
+        messages = self.device_messages()
+        while produced < count:
+            if not messages:
+                messages = self.light_show_step(pattern)
+                messages.append(self.toggle_random_switch())
+                messages.extend(self.event_messages(self.random.randrange(5)))
+                messages.extend(self.variable_messages())
+                if self.random.random() < .05:
+                    messages.append(self.mode_message())
+
+            for message in messages[:count - produced]:
+                yield message
+            produced += len(messages)
+            messages = []
+
+    @staticmethod
+    def _device(device_type, name, changes, state):
+        return bcp.encode_command_string('device', type=device_type, name=name, changes=changes,
+                                         state=state)
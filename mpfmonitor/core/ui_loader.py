@@ -0,0 +1,31 @@
+"""Builds the monitor windows from the Qt Designer files in ./ui/."""
+
+import os
+from functools import lru_cache
+
+from PyQt6 import uic
+
+UI_PATH = os.path.join(os.path.dirname(__file__), "ui")
+
+
+@lru_cache(maxsize=None)
+def get_form_class(filename):
+    """Parse and compile a .ui file once."""
+    form_class, _ = uic.loadUiType(os.path.join(UI_PATH, filename))
+    return form_class
+
+
+def load_ui(filename, widget):
+    """Set up the widgets of a .ui file on widget, like uic.loadUi().
+
+    Every window of every monitored machine shares the compiled form class,
+    so the XML is only parsed for the first one.
+    """
+    form = get_form_class(filename)()
+    form.setupUi(widget)
+
+    # make the children accessible as attributes, like uic.loadUi() does
+    for name, child in vars(form).items():
+        setattr(widget, name, child)
+
+    return widget
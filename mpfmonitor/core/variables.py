@@ -1,11 +1,25 @@
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from PyQt6 import uic
 
-import os
+from mpfmonitor.core.filter_proxy import RECORD_ROLE, SORT_ROLE, QueryFilterProxyModel, Record, sort_value
+from mpfmonitor.core.ui_loader import load_ui
+
 import time
 
+
+class VariableFilterProxyModel(QueryFilterProxyModel):
+    """Sorts numbers before strings, as variables of both kinds share the value column."""
+
+    def lessThan(self, left, right):
+        left_value = left.data(SORT_ROLE)
+        right_value = right.data(SORT_ROLE)
+        left_is_number = isinstance(left_value, float)
+        if left_is_number != isinstance(right_value, float):
+            return left_is_number
+        return left_value < right_value
+
+
 class VariableWindow(QWidget):
 
     def __init__(self, mpfmon):
@@ -21,13 +35,13 @@ class VariableWindow(QWidget):
         self.added_index = 0
 
         self.variables = dict()  # keys are tuples of (variable, type), values are the var's value model
+        self.records = dict()  # same keys, values are the Records the filter queries
 
     def draw_ui(self):
         # Load ui file from ./ui/
-        ui_path = os.path.join(os.path.dirname(__file__), "ui", "searchable_table.ui")
-        self.ui = uic.loadUi(ui_path, self)
+        self.ui = load_ui("searchable_table.ui", self)
 
-        self.ui.setWindowTitle('Player/Machine Variables')
+        self.ui.setWindowTitle(self.mpfmon.window_title('Player/Machine Variables'))
 
         self.ui.move(self.mpfmon.local_settings.value('windows/modes/pos',
                                                    QPoint(1100, 200)))
@@ -59,10 +73,8 @@ class VariableWindow(QWidget):
         self.model.setHeaderData(1, Qt.Orientation.Horizontal, "Variable Name")
         self.model.setHeaderData(2, Qt.Orientation.Horizontal, "Value")
 
-        self.filtered_model = QSortFilterProxyModel(self)
+        self.filtered_model = VariableFilterProxyModel(self)
         self.filtered_model.setSourceModel(self.model)
-        self.filtered_model.setFilterKeyColumn(1)
-        self.filtered_model.setDynamicSortFilter(True)
 
         self.change_sort()  # Default sort
 
@@ -80,15 +92,28 @@ class VariableWindow(QWidget):
         """
 
         if (variable, var_type) in self.variables:
-            self.variables[(variable, var_type)].setData(str(value), Qt.ItemDataRole.DisplayRole)
+            record = self.records[(variable, var_type)]
+            record.fields['value'] = value
+            record.fields['time'] = time.time()
+            # one dataChanged, which filters the row again and moves it to its sorted position
+            self.model.setItemData(self.variables[(variable, var_type)].index(),
+                                   {Qt.ItemDataRole.DisplayRole: str(value), SORT_ROLE: sort_value(value)})
         else:
+            record = Record({'name': variable, 'variable': variable, 'type': var_type, 'value': value,
+                             'time': time.time()})
+            type_item = QStandardItem(var_type)
+            type_item.setData(record, RECORD_ROLE)
+            type_item.setData(var_type, SORT_ROLE)
+            name_item = QStandardItem(str(variable))
+            name_item.setData(str(variable), SORT_ROLE)
             value_model = QStandardItem(str(value))
+            value_model.setData(sort_value(value), SORT_ROLE)
             self.variables[(variable, var_type)] = value_model
-            self.model.insertRow(0, [QStandardItem(var_type), QStandardItem(str(variable)), value_model])
+            self.records[(variable, var_type)] = record
+            self.model.insertRow(0, [type_item, name_item, value_model])
 
     def filter_text(self, string):
-        wc_string = "*" + str(string) + "*"
-        self.filtered_model.setFilterWildcard(wc_string)
+        self.filtered_model.set_filter_string(str(string))
         self.ui.tableView.resizeColumnToContents(0)
         self.ui.tableView.resizeColumnToContents(1)
 
@@ -103,6 +128,16 @@ class VariableWindow(QWidget):
         elif index == 4:  # Value down
             self.filtered_model.sort(2, Qt.SortOrder.DescendingOrder)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if not event.spontaneous():
+            self.mpfmon.update_monitored_categories()
+
     def closeEvent(self, event):
         self.mpfmon.write_local_settings()
         event.accept()
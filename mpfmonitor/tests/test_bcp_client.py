@@ -0,0 +1,342 @@
+import asyncio
+import queue
+import time
+import unittest
+from collections import deque
+from unittest.mock import MagicMock, patch
+
+from mpfmonitor.core.bcp_client import *
+from mpfmonitor.core.receive_queue import ReceiveQueue
+
+
+class TestableBCPClientNoTimers(BCPClient):
+    def __init__(self, bcp_loop=None, interface='localhost', port=5051):
+        self.mpfmon = MagicMock()
+        self.log = logging.getLogger('BCP Client')
+        self.interface = interface
+        self.port = port
+        self.read_size = 65536
+        self.receive_queue = ReceiveQueue()
+        self.sending_queue = queue.Queue()
+        self.priority_messages = deque()
+        self._flush_scheduled = False
+        self.connected = False
+        self.connection_state = ConnectionState.DISCONNECTED
+        self.transport = None
+        self.done = False
+        self.monitored_categories = set(MONITOR_CATEGORIES)
+        self.reconnect_min_delay = .5
+        self.reconnect_max_delay = 10
+        self.connect_timeout = 5
+        self.failed_attempts = 0
+        self.reconnect_count = 0
+        self.next_attempt = None
+        self._retry_handle = None
+        self.bcp_loop = bcp_loop
+        self.owns_loop = False
+        self.simulate = False
+        self.recorder = None
+        self.simulator_timer = MagicMock()
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(.005)
+    return True
+
+
+def feed(receiver, data):
+    """Write data into a BCPFramer/BCPProtocol the way recv_into would."""
+    messages = []
+    while data:
+        buf = receiver.get_buffer(-1)
+        chunk = data[:len(buf)]
+        buf[:len(chunk)] = chunk
+        data = data[len(chunk):]
+        messages.extend(receiver.buffer_updated(len(chunk)) or [])
+    return messages
+
+
+class TestBCPFramer(unittest.TestCase):
+
+    def test_split_messages(self):
+        framer = BCPFramer(read_size=16)
+        self.assertEqual(feed(framer, b'reset\nhello?version=1.1\n'),
+                         ['reset', 'hello?version=1.1'])
+        self.assertEqual(framer.start, 0)
+        self.assertEqual(framer.end, 0)
+
+    def test_partial_message(self):
+        framer = BCPFramer(read_size=16)
+        self.assertEqual(feed(framer, b'mode_li'), [])
+        self.assertEqual(feed(framer, b'st\n\nres'), ['mode_list'])
+        self.assertEqual(feed(framer, b'et\n'), ['reset'])
+
+    def test_message_larger_than_buffer(self):
+        framer = BCPFramer(read_size=8)
+        message = 'device?json=' + 'x' * 1000
+
+        self.assertEqual(feed(framer, message.encode() + b'\nreset\n'),
+                         [message, 'reset'])
+
+    def test_buffer_is_reused(self):
+        framer = BCPFramer(read_size=8)
+        buffer = framer.buffer
+
+        for _ in range(100):
+            self.assertEqual(feed(framer, b'reset\nres'), ['reset'])
+            self.assertEqual(feed(framer, b'et\n'), ['reset'])
+
+        self.assertIs(framer.buffer, buffer)
+
+
+class TestBCPProtocol(unittest.TestCase):
+
+    def test_process_messages(self):
+        client = MagicMock()
+        protocol = BCPProtocol(client, read_size=4)
+
+        feed(protocol, b'reset\nhello?version=1.1\n')
+
+        messages = [args[0] for args, _ in client.process_received_message.call_args_list]
+        self.assertEqual(messages, ['reset', 'hello?version=1.1'])
+
+        # the receive time is taken once per read
+        received = [args[1] for args, _ in client.process_received_message.call_args_list]
+        self.assertIsInstance(received[0], int)
+
+
+class TestBCPClientConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.bcp_loop = BCPLoop()
+        self.server_received = []
+        self.server_writers = []
+
+        async def handle(reader, writer):
+            self.server_writers.append(writer)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.server_received.append(line.decode().strip())
+
+        async def start_server():
+            return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+        self.server = self.bcp_loop.run_coroutine(start_server()).result(2)
+        port = self.server.sockets[0].getsockname()[1]
+
+        self.client = TestableBCPClientNoTimers(self.bcp_loop, '127.0.0.1', port)
+
+    def tearDown(self):
+        self.bcp_loop.call_soon(self.server.close)
+        self.bcp_loop.stop()
+
+    def test_connect_and_monitor(self):
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: self.client.connected))
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 5))
+        self.assertEqual(self.server_received[0], 'monitor_start?category=devices')
+
+    def test_monitor_subset(self):
+        self.client.monitored_categories = {'events', 'devices'}
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 2))
+        self.assertEqual(self.server_received, ['monitor_start?category=devices',
+                                                'monitor_start?category=events'])
+
+    def test_change_monitored_categories(self):
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 5))
+
+        self.client.set_monitored_categories(['devices', 'modes', 'machine_vars', 'player_vars'])
+
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 6))
+        self.assertEqual(self.server_received[-1], 'monitor_stop?category=events')
+
+        # show the events again
+        self.client.set_monitored_categories(MONITOR_CATEGORIES)
+
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 7))
+        self.assertEqual(self.server_received[-1], 'monitor_start?category=events')
+
+    def test_monitored_categories_while_disconnected(self):
+        self.client.set_monitored_categories(['modes'])
+        self.assertTrue(wait_for(lambda: self.client.monitored_categories == {'modes'}))
+
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 1))
+        self.assertEqual(self.server_received, ['monitor_start?category=modes'])
+
+    def test_receive(self):
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: self.server_writers))
+
+        writer = self.server_writers[0]
+        self.bcp_loop.call_soon(writer.write, b'reset\nmode_list?running_modes=\n')
+
+        self.assertTrue(wait_for(lambda: self.client.receive_queue.qsize() == 2))
+        self.assertEqual(self.client.receive_queue.drain()[0][0], 'reset')
+
+    def test_send(self):
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 5))
+
+        self.client.send('switch', name='s_start', state=-1)
+
+        self.assertTrue(wait_for(lambda: len(self.server_received) == 6))
+        self.assertEqual(self.server_received[-1], 'switch?name=s_start&state=int:-1')
+
+    def test_nodelay(self):
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: self.client.connected))
+
+        sock = self.client.transport.get_extra_info('socket')
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_connect_refused(self):
+        self.client.port = 1
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: self.client.connection_state == ConnectionState.WAITING))
+        self.assertFalse(self.client.connected)
+        self.assertEqual(self.client.failed_attempts, 1)
+        self.assertIsNotNone(self.client.next_attempt)
+
+    def test_backoff_retry(self):
+        self.client.port = 1
+        self.client.reconnect_min_delay = .01
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: self.client.failed_attempts >= 3))
+        self.assertFalse(self.client.connected)
+
+    def test_reconnect_now(self):
+        self.client.reconnect_min_delay = 60
+        real_port = self.client.port
+        self.client.port = 1
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: self.client.connection_state == ConnectionState.WAITING))
+
+        # retry immediately instead of waiting for the backoff
+        self.client.port = real_port
+        self.client.connect_to_mpf()
+
+        self.assertTrue(wait_for(lambda: self.client.connected))
+        self.assertEqual(self.client.failed_attempts, 0)
+
+    def test_disconnect_detected(self):
+        self.client.reconnect_min_delay = 60
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: self.client.connected))
+
+        self.bcp_loop.call_soon(self.server_writers[0].close)
+
+        self.assertTrue(wait_for(lambda: not self.client.connected))
+        self.assertEqual(self.client.connection_state, ConnectionState.WAITING)
+        self.assertEqual(self.client.reconnect_count, 1)
+
+    def test_reconnect_after_disconnect(self):
+        self.client.reconnect_min_delay = .01
+        self.client.connect_to_mpf()
+        self.assertTrue(wait_for(lambda: self.client.connected))
+
+        self.bcp_loop.call_soon(self.server_writers[0].close)
+
+        self.assertTrue(wait_for(lambda: len(self.server_writers) == 2))
+        self.assertTrue(wait_for(lambda: self.client.connected))
+
+
+class TestBCPClientSend(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestableBCPClientNoTimers(bcp_loop=MagicMock())
+        self.client.transport = MagicMock()
+
+    def test_one_write(self):
+        self.client.send('monitor_start', category='devices')
+        self.client.send('monitor_start', category='events')
+        self.client.send_pending()
+
+        self.client.transport.write.assert_called_once_with(
+            b'monitor_start?category=devices\nmonitor_start?category=events\n')
+
+    def test_one_flush_scheduled(self):
+        for _ in range(3):
+            self.client.send('reset_complete')
+
+        self.client.bcp_loop.call_soon.assert_called_once_with(self.client.send_pending)
+
+        self.client.send_pending()
+        self.client.send('reset_complete')
+        self.assertEqual(self.client.bcp_loop.call_soon.call_count, 2)
+
+    def test_switch_first(self):
+        self.client.send('monitor_start', category='devices')
+        self.client.send('switch', name='s_start', state=-1)
+        self.client.send_pending()
+
+        self.client.transport.write.assert_called_once_with(
+            b'switch?name=s_start&state=int:-1\nmonitor_start?category=devices\n')
+
+    def test_queued_while_disconnected(self):
+        self.client.transport = None
+        self.client.send('switch', name='s_start', state=-1)
+        self.client.send_pending()
+
+        self.client.transport = MagicMock()
+        self.client.send_pending()
+        self.client.transport.write.assert_called_once_with(b'switch?name=s_start&state=int:-1\n')
+
+
+class TestBCPClientRecording(unittest.TestCase):
+
+    def test_record_received(self):
+        client = TestableBCPClientNoTimers()
+        client.recorder = MagicMock()
+
+        client.process_received_message('reset', 1234)
+
+        client.recorder.record.assert_called_once_with(1234, 'reset')
+        self.assertEqual(client.receive_queue.drain()[0][0], 'reset')
+
+    def test_no_recording_while_simulating(self):
+        client = TestableBCPClientNoTimers()
+        client.recorder = MagicMock()
+        client.simulate = True
+
+        client.process_received_message('reset')
+
+        client.recorder.record.assert_not_called()
+
+
+class TestBCPClientBackoff(unittest.TestCase):
+
+    @patch('mpfmonitor.core.bcp_client.random.uniform', lambda low, high: high)
+    def test_exponential_delay(self):
+        client = TestableBCPClientNoTimers()
+
+        delays = []
+        for failed_attempts in range(1, 8):
+            client.failed_attempts = failed_attempts
+            delays.append(client.get_reconnect_delay())
+
+        self.assertEqual(delays, [.5, 1, 2, 4, 8, 10, 10])
+
+    @patch('mpfmonitor.core.bcp_client.random.uniform', lambda low, high: low)
+    def test_jitter_keeps_half(self):
+        client = TestableBCPClientNoTimers()
+        client.failed_attempts = 3
+
+        self.assertEqual(client.get_reconnect_delay(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
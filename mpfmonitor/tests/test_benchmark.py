@@ -0,0 +1,37 @@
+import unittest
+from unittest.mock import MagicMock
+
+from mpfmonitor.core.benchmark import *
+from mpfmonitor.core.receive_queue import ReceiveQueue
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_run(self):
+        monitor = MagicMock()
+        monitor.receive_queue = ReceiveQueue(wakeup=MagicMock())
+        process_events = MagicMock()
+
+        results = Benchmark(monitor, ['reset'] * 25, batch_size=10,
+                            process_events=process_events).run()
+
+        self.assertEqual(monitor.bcp.process_received_message.call_count, 25)
+        self.assertEqual(monitor.tick.call_count, 3)
+        self.assertEqual(process_events.call_count, 3)
+        self.assertIsNone(monitor.receive_queue.wakeup)
+
+        self.assertEqual(results['messages'], 25)
+        self.assertEqual(results['ticks'], 3)
+        self.assertGreater(results['messages_per_second'], 0)
+        self.assertIn('p99', results['tick_ms'])
+        self.assertIn("Throughput", format_results(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 import threading
 import sys
 from PyQt6.QtTest import QTest
-from PyQt6 import QtCore, QtGui, QtWidgets
+from PyQt6 import QtCore, QtGui, QtWidgets, QtTest
 from unittest.mock import MagicMock, patch, NonCallableMock
 from mpfmonitor.core.devices import *
 
@@ -19,7 +19,7 @@ class TestableDeviceWindowNoGUI(DeviceWindow):
         self.model = None
 
         self.device_states = dict()
-        self.device_type_widgets = dict()
+        self.device_count = 0
         self._debug_enabled = False
 
 class TestDeviceWindowFunctions(unittest.TestCase):
@@ -29,18 +29,18 @@ class TestDeviceWindowFunctions(unittest.TestCase):
         self.device_window.model = MagicMock()
         self.device_window.filtered_model = MagicMock()
 
-    @patch('mpfmonitor.core.devices.QStandardItemModel', autospec=True)
-    @patch('mpfmonitor.core.devices.QSortFilterProxyModel', autospec=True)
-    def test_attach_model(self, mock_standard_item, mock_proxy_item):
+    @patch('mpfmonitor.core.devices.DeviceTreeModel', autospec=True)
+    @patch('mpfmonitor.core.devices.DeviceFilterProxyModel', autospec=True)
+    def test_attach_model(self, mock_proxy_item, mock_tree_model):
         self.device_window.attach_model()
 
-        self.device_window.model.setHorizontalHeaderLabels.assert_called_once()
-        self.device_window.filtered_model.setSourceModel.assert_called_once()
+        mock_tree_model.assert_called_once_with(self.device_window)
+        self.device_window.filtered_model.setSourceModel.assert_called_once_with(self.device_window.model)
         self.device_window.ui.treeView.setModel.assert_called_once()
+        self.device_window.ui.treeView.setColumnHidden.assert_called_once_with(COLUMN_TIME_ADDED, True)
 
-    @patch('mpfmonitor.core.devices.QStandardItemModel', autospec=True)
     @patch('mpfmonitor.core.devices.DeviceNode', autospec=True)
-    def test_process_device_update(self, node, q_item):
+    def test_process_device_update(self, node):
         self.device_window.log = MagicMock()
         self.device_window.mpfmon = MagicMock()
 
@@ -53,26 +53,33 @@ class TestDeviceWindowFunctions(unittest.TestCase):
 
         self.assertTrue(isinstance(self.device_window.device_states[type], dict))
 
-        self.device_window.model.appendRow.assert_called_once()
+        self.device_window.model.add_device.assert_called_once_with(node())
+        self.device_window.filtered_model.add_device.assert_called_once_with(node())
 
         node().setName.assert_called_once_with(name)
         node().setData.assert_called_with(state)
         node().setType.assert_called_once_with(type)
 
-        # self.device_window.device_type_widgets[type].appendRow.assert_called_once_with(node.get_row())
-
         self.device_window.mpfmon.pf.create_widget_from_config.assert_called_once_with(node(), type, name)
 
         self.device_window.device_states[type][name].setData.assert_called_with(state)
 
+        state = {'state': 1, 'recycle_jitter_count': 0}
+        self.device_window.process_device_update(name, state, ['state', 0, 1], type)
+        node().setData.assert_called_with(state, ['state', 0, 1])
 
     def test_filter_text(self):
-        string_in = "filter_string_test"
-        expected_string_out = "*filter_string_test*"
+        self.device_window.filter_timer = MagicMock()
+
+        self.device_window.filter_text(string="s_")
+        self.device_window.filter_text(string="s_st")
 
-        self.device_window.filter_text(string=string_in)
+        # only applied once typing paused
+        self.assertEqual(self.device_window.filter_timer.start.call_count, 2)
+        self.device_window.filtered_model.set_filter_string.assert_not_called()
 
-        self.device_window.filtered_model.setFilterWildcard.assert_called_once_with(expected_string_out)
+        self.device_window.apply_filter()
+        self.device_window.filtered_model.set_filter_string.assert_called_once_with("s_st")
 
     def test_change_sort_default(self):
         self.device_window.change_sort()
@@ -95,6 +102,412 @@ class TestDeviceWindowFunctions(unittest.TestCase):
         self.device_window.filtered_model.sort.assert_called_once_with(0, Qt.SortOrder.DescendingOrder)
 
 
+class TestLightBrushes(unittest.TestCase):
+
+    def setUp(self):
+        self.brushes = LightBrushes(max_brushes=2)
+
+    def test_correct(self):
+        self.assertEqual(self.brushes.correct([0, 128, 255]), [0, 203, 255])
+        with self.assertLogs('Light Brushes', logging.WARNING):
+            self.assertEqual(self.brushes.correct([-1, 256, 1]), [0, 0, 18])
+
+        self.brushes.configure(gamma=1, constant=1)
+        self.assertEqual(self.brushes.correct([0, 128, 255]), [0, 128, 255])
+
+    def test_brushes_are_cached(self):
+        red = self.brushes.brush([255, 0, 0])
+        self.assertEqual(red.color().getRgb()[:3], (255, 0, 0))
+        self.assertIs(self.brushes.brush([255, 0, 0]), red)
+
+        green = self.brushes.brush([0, 255, 0])
+        # red was used last, so green is dropped first
+        self.assertIs(self.brushes.brush([255, 0, 0]), red)
+        self.brushes.brush([0, 0, 255])
+        self.assertEqual(list(self.brushes.brushes), [(255, 0, 0), (0, 0, 255)])
+        self.assertIsNot(self.brushes.brush([0, 255, 0]), green)
+
+    def test_lights_share_brushes(self):
+        nodes = []
+        for name in ('l_1', 'l_2'):
+            node = DeviceNode()
+            node.setName(name)
+            node.setData({'color': [12, 34, 56]})
+            node.setType('light')
+            nodes.append(node)
+
+        self.assertIs(nodes[0].get_colored_brush(), nodes[1].get_colored_brush())
+
+
+class TestDeviceHistory(unittest.TestCase):
+
+    def setUp(self):
+        # created here, other test modules create it on import
+        self.app = QApplication.instance() or QApplication(sys.argv)
+
+        self.node = DeviceNode()
+        self.node.setName('s_start')
+        self.node.setData({'state': 0, 'recycle_jitter_count': 0})
+        self.node.setType('switch')
+
+    def test_updates_are_recorded(self):
+        self.node.setData({'state': 1, 'recycle_jitter_count': 0}, ['state', 0, 1])
+        self.node.setData({'state': 1, 'recycle_jitter_count': 0})   # unchanged
+        self.node.setData({'state': 0, 'recycle_jitter_count': 1})
+
+        self.assertEqual(self.node.history.last_time(), self.node.history.entries()[-1][0])
+        self.assertEqual(device_field(self.node, 'time'), self.node.history.last_time())
+        self.assertEqual([(changed, value) for _, changed, value in self.node.history.entries()], [
+            (None, (('state', 0), ('recycle_jitter_count', 0))),
+            ('state', 1),
+            (None, (('state', 0), ('recycle_jitter_count', 1)))])
+
+    def test_dialog_shows_newest_first(self):
+        self.node.setData({'state': 1, 'recycle_jitter_count': 0}, ['state', 0, 1])
+
+        dialog = DeviceHistoryDialog(self.node)
+        self.assertEqual(dialog.windowTitle(), 'History of switch s_start')
+        self.assertEqual(dialog.table.rowCount(), 2)
+        self.assertEqual(dialog.table.item(0, 2).text(), 'state: 1')
+        self.assertEqual(dialog.table.item(1, 2).text(), "state: 0, recycle_jitter_count: 0")
+
+        self.node.setData({'state': 0, 'recycle_jitter_count': 0}, ['state', 1, 0])
+        dialog.refresh()
+        self.assertEqual(dialog.table.rowCount(), 3)
+        self.assertEqual(dialog.table.item(0, 2).text(), 'state: 0')
+        dialog.close()
+
+
+class DeviceTreeModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = DeviceTreeModel()
+        self.nodes = dict()
+
+    def add(self, device_type, name, state):
+        node = DeviceNode()
+        node.setName(name)
+        node.setData(state)
+        node.setType(device_type)
+        self.model.add_device(node)
+        self.nodes[name] = node
+        return node
+
+    def device_index(self, device_type, row, column=0):
+        return self.model.index(row, column, self.model.index(self.model.type_rows[device_type], 0))
+
+
+class TestDeviceTreeModel(DeviceTreeModelTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.model_test_failures = []
+        self.previous_handler = QtCore.qInstallMessageHandler(
+            lambda msg_type, context, message: self.model_test_failures.append(message))
+        self.tester = None
+
+    def emit_changes(self):
+        self.model.emit_changes()
+        # Attached after the first rows were inserted, as the tester fetches
+        # the properties of new rows while they are still being inserted.
+        if self.tester is None:
+            self.tester = QtTest.QAbstractItemModelTester(
+                self.model, QtTest.QAbstractItemModelTester.FailureReportingMode.Warning)
+
+    def tearDown(self):
+        QtCore.qInstallMessageHandler(self.previous_handler)
+        self.assertEqual(self.model_test_failures, [])
+
+    def test_devices_are_shown_after_emit_changes(self):
+        self.add('switch', 's_start', {'state': 0, 'recycle_jitter_count': 0})
+        self.add('light', 'l_1', {'color': [0, 0, 0]})
+        self.add('switch', 's_tilt', {'state': 1, 'recycle_jitter_count': 0})
+        self.assertEqual(self.model.rowCount(), 0)
+
+        self.emit_changes()
+
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.model.index(0, 0).data(), 'switch')
+        self.assertEqual(self.model.rowCount(self.model.index(0, 0)), 2)
+
+        device = self.device_index('switch', 1)
+        self.assertEqual(device.data(), 's_tilt')
+        self.assertEqual(device.siblingAtColumn(COLUMN_DATA).data(), '1 {…}')
+        self.assertEqual(device.parent().data(), 'switch')
+        self.assertIs(self.model.node(device), self.nodes['s_tilt'])
+        self.assertTrue(self.model.flags(device) & Qt.ItemFlag.ItemIsDragEnabled)
+
+        self.assertEqual(self.model.rowCount(device), 2)
+        prop = self.model.index(1, COLUMN_DATA, device)
+        self.assertEqual(prop.siblingAtColumn(COLUMN_NAME).data(), 'recycle_jitter_count')
+        self.assertEqual(prop.data(), '0')
+        self.assertEqual(prop.parent(), device)
+        self.assertIsNone(self.model.node(prop))
+
+    def test_number_of_properties_changes(self):
+        node = self.add('ball_device', 'bd_trough', {'balls': 3})
+        self.emit_changes()
+        device = self.device_index('ball_device', 0)
+        self.assertEqual(self.model.rowCount(device), 1)
+
+        node.setData({'balls': 2, 'state': 'idle'})
+        self.assertEqual(self.model.rowCount(device), 2)
+
+        node.setData({'state': 'ejecting'})
+        self.assertEqual(self.model.rowCount(device), 1)
+        self.assertEqual(device.siblingAtColumn(COLUMN_DATA).data(), 'ejecting')
+
+    def test_filter_and_sort(self):
+        for name in ('s_b', 's_a', 'l_c'):
+            self.add('light' if name[0] == 'l' else 'switch', name, {'state': 0, 'color': [0, 0, 0]})
+        self.emit_changes()
+
+        proxy = QSortFilterProxyModel()
+        proxy.setSourceModel(self.model)
+        proxy.setRecursiveFilteringEnabled(True)
+        proxy.sort(COLUMN_NAME, Qt.SortOrder.AscendingOrder)
+        proxy.setFilterWildcard("*s_*")
+
+        self.assertEqual(proxy.rowCount(), 1)
+        switches = proxy.index(0, 0)
+        self.assertEqual(switches.data(), 'switch')
+        self.assertEqual([proxy.index(row, 0, switches).data() for row in range(proxy.rowCount(switches))],
+                         ['s_a', 's_b'])
+
+
+class TestDeviceFilterProxyModel(DeviceTreeModelTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.proxy = DeviceFilterProxyModel()
+        self.proxy.setSourceModel(self.model)
+
+    def add(self, device_type, name, state):
+        node = super().add(device_type, name, state)
+        self.proxy.add_device(node)
+        return node
+
+    def shown(self):
+        shown = dict()
+        for type_row in range(self.proxy.rowCount()):
+            type_index = self.proxy.index(type_row, 0)
+            shown[type_index.data()] = sorted(self.proxy.index(row, 0, type_index).data()
+                                              for row in range(self.proxy.rowCount(type_index)))
+        return shown
+
+    def test_sort_without_reset(self):
+        resets = []
+        self.proxy.modelReset.connect(lambda: resets.append(True))
+        for name in ('s_b', 's_c', 's_a'):
+            self.add('switch', name, {'state': 0})
+        self.model.emit_changes()
+
+        self.assertIsInstance(self.device_index('switch', 0, 2).data(SORT_ROLE), float)
+
+        self.proxy.sort(2, Qt.SortOrder.DescendingOrder)
+        type_index = self.proxy.index(0, 0)
+        self.assertEqual([self.proxy.index(row, 0, type_index).data() for row in range(3)], ['s_a', 's_c', 's_b'])
+
+        # new devices are inserted at their position
+        self.proxy.sort(0, Qt.SortOrder.AscendingOrder)
+        self.add('switch', 's_bb', {'state': 0})
+        self.model.emit_changes()
+        self.assertEqual([self.proxy.index(row, 0, type_index).data() for row in range(4)],
+                         ['s_a', 's_b', 's_bb', 's_c'])
+        self.assertEqual(resets, [])
+
+    def test_filter(self):
+        for name in ('s_start', 's_tilt', 's_trough_1'):
+            self.add('switch', name, {'state': 0})
+        for name in ('l_start', 'l_shoot_again'):
+            self.add('light', name, {'color': [0, 0, 0]})
+        self.model.emit_changes()
+
+        self.proxy.set_filter_string("START")
+        self.assertEqual(self.shown(), {'switch': ['s_start'], 'light': ['l_start']})
+
+        self.proxy.set_filter_string("t")
+        self.assertEqual(self.shown(), {'switch': ['s_start', 's_tilt', 's_trough_1'],
+                                        'light': ['l_shoot_again', 'l_start']})
+
+        self.proxy.set_filter_string("s_t*t")
+        self.assertEqual(self.shown(), {'switch': ['s_tilt']})
+
+        # all devices of a matching type
+        self.proxy.set_filter_string("ligh")
+        self.assertEqual(self.shown(), {'light': ['l_shoot_again', 'l_start']})
+
+        self.proxy.set_filter_string("type:switch name:s_t*")
+        self.assertEqual(self.shown(), {'switch': ['s_tilt', 's_trough_1']})
+
+        self.proxy.set_filter_string("")
+        self.assertEqual(len(self.shown()['switch']), 3)
+
+    def test_devices_added_while_filtering(self):
+        self.add('switch', 's_start', {'state': 0})
+        self.model.emit_changes()
+        self.proxy.set_filter_string("_1")
+        self.assertEqual(self.shown(), {})
+
+        self.add('switch', 's_trough_1', {'state': 0})
+        self.add('switch', 's_trough_2', {'state': 0})
+        self.add('coil', 'c_trough_1', {'enabled': False})
+        self.model.emit_changes()
+        self.proxy.update_filter()
+
+        self.assertEqual(self.shown(), {'switch': ['s_trough_1'], 'coil': ['c_trough_1']})
+
+    def test_state_query(self):
+        for i in range(3):
+            self.add('light', 'l_{}'.format(i), {'color': [0, 0, 0]})
+        self.add('switch', 's_start', {'state': 0})
+        self.model.emit_changes()
+        self.proxy.set_filter_string("type:light color!=[0,0,0]")
+        self.assertEqual(self.shown(), {})
+        self.assertTrue(self.proxy.stateful)
+
+        # devices which changed are filtered again once per tick
+        for name, color in (('l_1', [255, 0, 0]), ('l_2', [0, 0, 255])):
+            self.nodes[name].setData({'color': color}, ['color', [0, 0, 0], color])
+            self.proxy.device_changed(self.nodes[name])
+        self.proxy.update_filter()
+        self.assertEqual(self.shown(), {'light': ['l_1', 'l_2']})
+
+        self.nodes['l_1'].setData({'color': [0, 0, 0]}, ['color', [255, 0, 0], [0, 0, 0]])
+        self.proxy.device_changed(self.nodes['l_1'])
+        self.proxy.update_filter()
+        self.assertEqual(self.shown(), {'light': ['l_2']})
+
+    def test_properties_are_shown_with_their_device(self):
+        self.add('light', 'l_start', {'color': [0, 0, 0], 'brightness': 0})
+        self.model.emit_changes()
+        self.proxy.set_filter_string("start")
+
+        device = self.proxy.index(0, 0, self.proxy.index(0, 0))
+        self.proxy.fetchMore(device)
+        self.assertEqual(self.proxy.rowCount(device), 2)
+
+
+class TestDeviceTreeModelFetching(DeviceTreeModelTestCase):
+    # without the model tester, which fetches everything it can
+
+    def test_changes_are_coalesced(self):
+        for i in range(10):
+            self.add('light', 'l_{}'.format(i), {'color': [0, 0, 0]})
+        self.model.emit_changes()
+
+        changed = []
+        self.model.dataChanged.connect(lambda first, last, roles: changed.append(
+            (first.parent().row(), first.row(), last.row())))
+
+        self.nodes['l_7'].setData({'color': [1, 1, 1]})
+        self.nodes['l_2'].setData({'color': [1, 1, 1]})
+        self.nodes['l_7'].setData({'color': [2, 2, 2]})
+        self.assertEqual(changed, [])
+
+        self.model.emit_changes()
+        self.assertEqual(changed, [(0, 2, 7)])
+        self.assertEqual(self.device_index('light', 7, COLUMN_DATA).data(), '[2, 2, 2]')
+
+        # properties of expanded devices are updated as well
+        changed.clear()
+        self.model.fetchMore(self.device_index('light', 2))
+        self.nodes['l_2'].setData({'color': [3, 3, 3]})
+        self.model.emit_changes()
+        self.assertEqual(changed, [(0, 2, 2), (2, 0, 0)])
+
+    def test_changed_property(self):
+        node = self.add('light', 'l_1', {'color': [0, 0, 0], 'brightness': 0})
+        self.model.emit_changes()
+        callback = MagicMock()
+        node.set_change_callback(callback)
+        self.model.fetchMore(self.device_index('light', 0))
+
+        changed = []
+        self.model.dataChanged.connect(lambda first, last, roles: changed.append(
+            (first.parent().row(), first.row(), last.row())))
+
+        # not the brush and not shown in the device row
+        brush = node.get_colored_brush()
+        node.setData({'color': [0, 0, 0], 'brightness': 5}, ['brightness', 0, 5])
+        self.model.emit_changes()
+        self.assertIs(node.get_colored_brush(), brush)
+        callback.assert_not_called()
+        self.assertEqual(changed, [(0, 1, 1)])
+        self.assertEqual(self.model.index(1, COLUMN_DATA, self.device_index('light', 0)).data(), '5')
+
+        changed.clear()
+        node.setData({'color': [255, 0, 0], 'brightness': 5}, ['color', [0, 0, 0], [255, 0, 0]])
+        self.model.emit_changes()
+        self.assertEqual(node.get_colored_brush().color().red(), 255)
+        callback.assert_called_once_with()
+        self.assertEqual(changed, [(0, 0, 0), (0, 0, 0)])
+
+        # a new property is a full update
+        node.setData({'color': [255, 0, 0], 'brightness': 5, 'fade': 1}, ['fade', None, 1])
+        self.assertEqual(self.model.rowCount(self.device_index('light', 0)), 3)
+
+        # so is a property replaced by another one, which updates the names as well
+        self.model.emit_changes()
+        columns = []
+        self.model.dataChanged.connect(lambda first, last, roles: columns.append((first.column(), last.column())))
+        node.setData({'color': [255, 0, 0], 'brightness': 5, 'fade_ms': 100}, ['fade_ms', None, 100])
+        self.model.emit_changes()
+        self.assertIn((COLUMN_NAME, COLUMN_DATA), columns)
+
+    def test_changes_of_another_state(self):
+        node = self.add('light', 'l_1', {'color': [0, 0, 255], 'brightness': 5})
+        self.model.emit_changes()
+        self.model.fetchMore(self.device_index('light', 0))
+        columns = []
+        self.model.dataChanged.connect(lambda first, last, roles: columns.append((first.column(), last.column())))
+
+        # e.g. after a seek in a replay, the change was made to a state this node never had
+        node.setData({'color': [255, 0, 0], 'brightness': 0}, ['brightness', 9, 0])
+        self.model.emit_changes()
+
+        self.assertEqual(node.get_colored_brush().color().red(), 255)
+        self.assertEqual(node.get_colored_brush().color().blue(), 0)
+        self.assertIn((COLUMN_DATA, COLUMN_DATA), columns)  # the device row
+        self.assertIn((COLUMN_NAME, COLUMN_DATA), columns)  # all properties
+
+    def test_properties_are_fetched_when_expanded(self):
+        node = self.add('light', 'l_1', {'color': [0, 0, 0], 'brightness': 0})
+        self.model.emit_changes()
+        device = self.device_index('light', 0)
+
+        self.assertEqual(self.model.rowCount(device), 0)
+        self.assertTrue(self.model.hasChildren(device))
+        self.assertTrue(self.model.canFetchMore(device))
+        self.assertFalse(self.model.canFetchMore(device.parent()))
+
+        node.setData({'color': [1, 1, 1], 'brightness': 1, 'fade': 0})
+        self.model.emit_changes()
+        self.assertEqual(self.model.rowCount(device), 0)
+
+        self.model.fetchMore(device)
+        self.assertFalse(self.model.canFetchMore(device))
+        self.assertEqual(self.model.rowCount(device), 3)
+        self.assertEqual(self.model.index(2, COLUMN_NAME, device).data(), 'fade')
+
+    def test_collapsing_releases_properties(self):
+        self.add('light', 'l_1', {'color': [0, 0, 0]})
+        self.model.emit_changes()
+
+        window = TestableDeviceWindowNoGUI()
+        window.model = self.model
+        window.filtered_model = QSortFilterProxyModel()
+        window.filtered_model.setSourceModel(self.model)
+        lights = window.filtered_model.index(0, 0)
+        device = window.filtered_model.index(0, 0, lights)
+        window.filtered_model.fetchMore(device)
+        self.assertEqual(window.filtered_model.rowCount(device), 1)
+
+        window.release_properties(device)
+
+        self.assertEqual(window.filtered_model.rowCount(device), 0)
+        self.assertFalse(self.nodes['l_1'].properties_fetched)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -43,11 +43,10 @@ class TestEventWindowFunctions(unittest.TestCase):
 
     def test_filter_text(self):
         string_in = "filter_string_test"
-        expected_string_out = "*filter_string_test*"
 
         self.event_window.filter_text(string=string_in)
 
-        self.event_window.filtered_model.setFilterWildcard.assert_called_once_with(expected_string_out)
+        self.event_window.filtered_model.set_filter_string.assert_called_once_with(string_in)
 
     def test_change_sort_default(self):
         self.event_window.change_sort()
@@ -78,6 +77,7 @@ class TestEvents(unittest.TestCase):
     def setUpClass(self):
         mock_mpfmon = MagicMock()
         mock_mpfmon.local_settings.value.side_effect = [QPoint(500, 200), QSize(300, 600)]
+        mock_mpfmon.window_title.side_effect = lambda title: title
 
         self.eventWindow = EventWindow(mock_mpfmon)
 
@@ -168,6 +168,23 @@ class TestEvents(unittest.TestCase):
         self.eventWindow.ui.filterLineEdit.setText(event_list[2])
         self.assertEqual(self.eventWindow.filtered_model.rowCount(), 2)
 
+    def test_filter_query(self):
+        self.eventWindow.attach_model()
+        self.eventWindow.add_event_to_model("ball_started", None, None, {'ball': 1, 'player': 1}, None)
+        self.eventWindow.add_event_to_model("ball_ending", None, None, {'ball': 1}, None)
+        self.eventWindow.add_event_to_model("ball_started", None, None, {'ball': 2, 'player': 1}, None)
+
+        self.eventWindow.ui.filterLineEdit.setText("event:ball_* ball>=2")
+        self.assertEqual(self.eventWindow.filtered_model.rowCount(), 1)
+
+        self.eventWindow.ui.filterLineEdit.setText("event:ball_started player:1 since:10s")
+        self.assertEqual(self.eventWindow.filtered_model.rowCount(), 2)
+        self.assertTrue(self.eventWindow.filtered_model.refresh_timer.isActive())
+
+        self.eventWindow.ui.filterLineEdit.setText("")
+        self.assertEqual(self.eventWindow.filtered_model.rowCount(), 3)
+        self.assertFalse(self.eventWindow.filtered_model.refresh_timer.isActive())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+import mpf.core.bcp.bcp_socket_client as bcp
+
+from mpfmonitor.core.fake_server import *
+from mpfmonitor.core.synthetic import SyntheticMachine
+
+
+class TestFakeMPFServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # nothing is generated unless a test asks for it
+        self.server = FakeMPFServer(SyntheticMachine(switches=2, lights=2, seed=1), port=0,
+                                    light_rate=0, switch_rate=0, event_rate=0, burst_size=0,
+                                    variable_rate=0, mode_interval=0)
+        await self.server.start()
+        self.reader, self.writer = await asyncio.open_connection('localhost', self.server.port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.server.stop()
+
+    async def send(self, message):
+        self.writer.write((message + "\n").encode())
+        await self.writer.drain()
+
+    async def receive(self, count):
+        messages = []
+        for _ in range(count):
+            line = await asyncio.wait_for(self.reader.readline(), 2)
+            messages.append(bcp.decode_command_string(line.decode().strip()))
+        return messages
+
+    async def test_monitor_start_sends_state(self):
+        await self.send('monitor_start?category=devices')
+        messages = await self.receive(4)
+
+        self.assertEqual([cmd for cmd, _ in messages], ['device'] * 4)
+        self.assertEqual(messages[0][1]['name'], 's_switch_0')
+
+        await self.send('monitor_start?category=modes')
+        (cmd, kwargs), = await self.receive(1)
+        self.assertEqual(cmd, 'mode_list')
+        self.assertEqual(kwargs['running_modes'], [['attract', 10]])
+
+    async def test_switch_round_trip(self):
+        await self.send('monitor_start?category=devices')
+        await self.receive(4)
+
+        await self.send('switch?name=s_switch_1&state=int:-1')
+        (cmd, kwargs), = await self.receive(1)
+
+        self.assertEqual(kwargs['name'], 's_switch_1')
+        self.assertEqual(kwargs['changes'], ['state', 0, 1])
+        self.assertEqual(self.server.received_switches, 1)
+
+    async def test_only_monitored_categories(self):
+        await self.send('monitor_start?category=events')
+        await self.send('monitor_start?category=player_vars')
+        await self.send('monitor_stop?category=player_vars')
+        await asyncio.sleep(.05)
+
+        self.server.broadcast(self.server.machine.light_show_step('blink'))
+        self.server.broadcast(self.server.machine.variable_messages())
+        self.server.broadcast(self.server.machine.event_messages(3))
+
+        messages = await self.receive(3)
+        self.assertEqual([cmd for cmd, _ in messages], ['monitored_event'] * 3)
+
+    async def test_event_bursts(self):
+        self.server.burst_size = 50
+        self.server.burst_interval = .01
+        await self.server.stop()
+        await self.server.start()
+        reader, writer = await asyncio.open_connection('localhost', self.server.port)
+        writer.write(b'monitor_start?category=events\n')
+
+        for _ in range(100):
+            line = await asyncio.wait_for(reader.readline(), 2)
+            self.assertTrue(line.startswith(b'monitored_event'))
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mpfmonitor.core.headless import *
+
+
+class TestableHeadlessMonitorNoBCP(HeadlessMonitor):
+    def __init__(self, categories=HEADLESS_CATEGORIES, rate_limits=None, name=None):
+        self.log = logging.getLogger('Headless')
+        self.output = io.StringIO()
+        self.name = name
+        self.categories = set(categories)
+        self.rate_limiters = {category: RateLimiter(rate)
+                              for category, rate in (rate_limits or dict()).items()}
+        self.pending = {category: dict() for category in self.rate_limiters}
+        self.dropped = {category: 0 for category in self.rate_limiters}
+        self.devices = dict()
+        self.running_modes = []
+        self.variables = dict()
+        self.tick_stats = (0, 0.0, 0.0)
+        self.receive_queue = ReceiveQueue()
+        self.flush_timer = MagicMock()
+        self.flush_timer.isActive.return_value = False
+        self.bcp = MagicMock()
+
+    def lines(self):
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+
+
+def device(name, state):
+    return 'device', {'type': 'light', 'name': name, 'changes': False, 'state': {'color': state}}
+
+
+def event(name):
+    return 'monitored_event', {'event_name': name, 'event_type': None, 'event_callback': None,
+                               'event_kwargs': {}, 'registered_handlers': []}
+
+
+class TestHeadlessMonitor(unittest.TestCase):
+
+    def test_json_lines(self):
+        monitor = TestableHeadlessMonitorNoBCP(name='bench')
+        monitor.receive_queue.put(device('l_1', [1, 2, 3]))
+        monitor.receive_queue.put(event('ball_started'))
+        monitor.receive_queue.put(('mode_list', {'running_modes': [['base', 100]]}))
+        monitor.receive_queue.put(('player_variable', {'name': 'score', 'value': 10, 'player_num': 1,
+                                                       'prev_value': 0, 'change': 10}))
+        monitor.tick()
+
+        lines = monitor.lines()
+        self.assertEqual([line['type'] for line in lines],
+                         ['device', 'event', 'modes', 'player_variable'])
+        self.assertEqual(lines[0]['state'], {'color': [1, 2, 3]})
+        self.assertEqual(lines[1]['name'], 'ball_started')
+        self.assertEqual(lines[3]['player_num'], 1)
+        self.assertEqual(lines[0]['machine'], 'bench')
+        self.assertIn('time', lines[0])
+
+        snapshot = monitor.snapshot()
+        self.assertEqual(snapshot['devices'], [{'device_type': 'light', 'name': 'l_1',
+                                                'state': {'color': [1, 2, 3]}}])
+        self.assertEqual(snapshot['running_modes'], [['base', 100]])
+
+    def test_category_filter(self):
+        monitor = TestableHeadlessMonitorNoBCP(categories=['events'])
+        monitor.receive_queue.put(device('l_1', [1, 2, 3]))
+        monitor.receive_queue.put(event('ball_started'))
+        monitor.tick()
+
+        self.assertEqual([line['type'] for line in monitor.lines()], ['event'])
+        # the state is still tracked
+        self.assertIn(('light', 'l_1'), monitor.devices)
+
+    def test_reset(self):
+        monitor = TestableHeadlessMonitorNoBCP()
+        monitor.receive_queue.put(device('l_1', [1, 2, 3]))
+        monitor.receive_queue.put(('reset', {}))
+        monitor.tick()
+
+        self.assertEqual(monitor.devices, {})
+        monitor.bcp.send.assert_called_once_with("reset_complete")
+
+    @patch('mpfmonitor.core.headless.time.monotonic')
+    def test_rate_limit_keeps_latest_state(self, monotonic):
+        monotonic.return_value = 100
+        monitor = TestableHeadlessMonitorNoBCP(rate_limits={'devices': 2})
+
+        for i in range(5):
+            monitor.receive_queue.put(device('l_1', [i, 0, 0]))
+            monitor.receive_queue.put(device('l_2', [i, 0, 0]))
+            monitor.tick()
+
+        self.assertEqual(len(monitor.lines()), 2)
+        self.assertEqual(len(monitor.pending['devices']), 2)
+        monitor.flush_timer.start.assert_called()
+
+        monotonic.return_value = 101
+        monitor.flush()
+
+        lines = monitor.lines()[2:]
+        self.assertEqual([(line['name'], line['state']['color'][0]) for line in lines],
+                         [('l_1', 4), ('l_2', 4)])
+
+    @patch('mpfmonitor.core.headless.time.monotonic')
+    def test_rate_limit_drops_events(self, monotonic):
+        monotonic.return_value = 100
+        monitor = TestableHeadlessMonitorNoBCP(rate_limits={'events': 3})
+
+        for i in range(10):
+            monitor.receive_queue.put(event('event_{}'.format(i)))
+        monitor.tick()
+        self.assertEqual(len(monitor.lines()), 3)
+
+        monotonic.return_value = 101
+        monitor.receive_queue.put(event('event_10'))
+        monitor.tick()
+
+        lines = monitor.lines()[3:]
+        self.assertEqual(lines[0], dict(lines[0], type='dropped', category='events', count=7))
+        self.assertEqual(lines[1]['name'], 'event_10')
+
+
+if __name__ == '__main__':
+    unittest.main()
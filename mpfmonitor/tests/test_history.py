@@ -0,0 +1,51 @@
+import unittest
+
+from mpfmonitor.core.history import *
+
+
+class TestDeviceHistory(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        history = DeviceHistory(3)
+        self.assertEqual(history.entries(), [])
+
+        history.record({'state': 0, 'recycle_jitter_count': 0}, now=1)
+        history.record({'state': 1, 'recycle_jitter_count': 0}, 'state', now=2)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.entries(), [(1, None, (('state', 0), ('recycle_jitter_count', 0))),
+                                             (2, 'state', 1)])
+
+        for i in range(3, 6):
+            history.record({'state': i % 2, 'recycle_jitter_count': 0}, 'state', now=i)
+
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.recorded, 5)
+        self.assertEqual(history.entries(), [(3, 'state', 1), (4, 'state', 0), (5, 'state', 1)])
+
+    def test_lists_are_kept_as_tuples(self):
+        history = DeviceHistory(2)
+        history.record({'color': [255, 0, 0]}, 'color', now=1)
+        self.assertEqual(history.entries(), [(1, 'color', (255, 0, 0))])
+
+
+class TestHistoryBuffers(unittest.TestCase):
+
+    def test_memory_cap(self):
+        buffers = HistoryBuffers(length=10, max_entries=25)
+
+        self.assertIsNotNone(buffers.allocate())
+        self.assertIsNotNone(buffers.allocate())
+        self.assertIsNone(buffers.allocate())
+        self.assertEqual(buffers.allocated, 20)
+        self.assertEqual(buffers.devices_without_history, 1)
+
+        buffers.configure(length=5, max_entries=25)
+        self.assertEqual(len(buffers.allocate().keys), 5)
+
+    def test_disabled(self):
+        buffers = HistoryBuffers(length=0)
+        self.assertIsNone(buffers.allocate())
+
+
+if __name__ == '__main__':
+    unittest.main()
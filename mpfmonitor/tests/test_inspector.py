@@ -102,6 +102,15 @@ class InspectorDeviceManipulation(unittest.TestCase):
         inspector.last_pf_widget.destroy.assert_called_once()
         inspector.clear_last_selected_device.assert_called_once()
 
+    def test_show_last_device_history(self):
+        inspector = TestableInspectorNoGUI(mpfmon_mock=MagicMock())
+
+        inspector.last_pf_widget = MagicMock()
+        inspector.show_last_device_history()
+
+        inspector.mpfmon.device_window.show_history.assert_called_once_with(
+            inspector.last_pf_widget.widget)
+
 
 class InspectorDeviceResizing(unittest.TestCase):
 
@@ -211,5 +220,84 @@ class InspectorDeviceShape(unittest.TestCase):
         inspector.last_pf_widget.update_pos.assert_called_once_with(save=True)
 
 
+class InspectorStatistics(unittest.TestCase):
+
+    def test_receive_queue_stats(self):
+        from mpfmonitor.core.receive_queue import ReceiveQueue
+
+        mock_mpfmon = MagicMock()
+        mock_mpfmon.receive_queue = ReceiveQueue(max_size=100)
+        mock_mpfmon.receive_queue.put(('device', {'type': 'light', 'name': 'l_1'}))
+        mock_mpfmon.receive_queue.put(('device', {'type': 'light', 'name': 'l_1'}))
+
+        inspector = TestableInspectorNoGUI(mpfmon_mock=mock_mpfmon)
+        inspector.ui = MagicMock()
+
+        inspector.update_receive_queue_stats()
+
+        inspector.ui.receive_queue_stats_label.setText.assert_called_once_with(
+            "Receive queue: 1 queued, peak 1 (max 100, except events, modes)\n"
+            "devices: 2 received, 1 collapsed, 0 dropped")
+
+    def test_latency_stats(self):
+        from mpfmonitor.core.latency import LatencyTracker
+
+        mock_mpfmon = MagicMock()
+        mock_mpfmon.latency = LatencyTracker()
+        now = time.monotonic_ns()
+        mock_mpfmon.latency.record('devices', 'queue', now - 2000000, now)
+
+        inspector = TestableInspectorNoGUI(mpfmon_mock=mock_mpfmon)
+        inspector.ui = MagicMock()
+
+        inspector.update_latency_stats()
+
+        inspector.ui.latency_stats_label.setText.assert_called_once_with(
+            "Latency since read:\n"
+            "devices queue: p50 2.0 p95 2.0 p99 2.0 ms (1)")
+
+    def test_profiler_state(self):
+        mock_mpfmon = MagicMock()
+        mock_mpfmon.profiler.running = False
+        mock_mpfmon.profiler.last_file = "logs/2024-01-01-12-00-00-monitor-profile.prof"
+
+        inspector = TestableInspectorNoGUI(mpfmon_mock=mock_mpfmon)
+        inspector.ui = MagicMock()
+
+        inspector.toggle_profiling()
+
+        mock_mpfmon.profiler.toggle.assert_called_once_with()
+        inspector.ui.profile_button.setText.assert_called_once_with("Start profiling")
+        inspector.ui.profile_label.setText.assert_called_once_with(
+            "Written to logs/2024-01-01-12-00-00-monitor-profile.prof")
+
+    def test_connection_state_waiting(self):
+        from mpfmonitor.core.bcp_client import ConnectionState
+
+        mock_mpfmon = MagicMock()
+        mock_mpfmon.bcp.interface = 'localhost'
+        mock_mpfmon.bcp.port = 5051
+        mock_mpfmon.bcp.connection_state = ConnectionState.WAITING
+        mock_mpfmon.bcp.next_attempt = time.monotonic() + 3.2
+
+        inspector = TestableInspectorNoGUI(mpfmon_mock=mock_mpfmon)
+        inspector.ui = MagicMock()
+
+        inspector.update_connection_state()
+
+        inspector.ui.connection_state_label.setText.assert_called_once_with(
+            "Not connected to localhost:5051. Retrying in 3s")
+        inspector.ui.reconnect_button.setEnabled.assert_called_once_with(True)
+
+    def test_reconnect_button(self):
+        mock_mpfmon = MagicMock()
+        inspector = TestableInspectorNoGUI(mpfmon_mock=mock_mpfmon, logger=True)
+        inspector.ui = MagicMock()
+
+        inspector.reconnect()
+
+        mock_mpfmon.bcp.connect_to_mpf.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mpfmonitor.core.latency import *
+
+
+class TestBuckets(unittest.TestCase):
+
+    def test_bucket_contains_value(self):
+        for value in (0, 1, 3, 4, 7, 8, 9, 1000, 123456, 10 ** 9, 2 ** 63 - 1):
+            low, high = bucket_range(bucket_index(value))
+            self.assertLessEqual(low, value)
+            self.assertLess(value, high)
+
+    def test_buckets_are_ordered(self):
+        ranges = [bucket_range(index) for index in range(bucket_index(10 ** 12) + 1)]
+        for (_, high), (low, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(high, low)
+
+    def test_resolution(self):
+        low, high = bucket_range(bucket_index(5000000))
+        self.assertLess((high - low) / low, .26)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram(window=60)
+        for i in range(1, 101):
+            histogram.record(i * 1000000, 0)
+
+        count, (p50, p95, p99) = histogram.percentiles()
+
+        self.assertEqual(count, 100)
+        self.assertAlmostEqual(p50 / 1e6, 50, delta=5)
+        self.assertAlmostEqual(p95 / 1e6, 95, delta=10)
+        self.assertAlmostEqual(p99 / 1e6, 99, delta=10)
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().percentiles(), (0, [None, None, None]))
+
+    def test_rolling_window(self):
+        histogram = LatencyHistogram(window=2)
+        histogram.record(1000, 0)
+        # second generation, the first one is still counted
+        histogram.record(1000, 1000000000)
+        self.assertEqual(histogram.percentiles(now=1000000000)[0], 2)
+
+        # the first generation expired
+        self.assertEqual(histogram.percentiles(now=2000000000)[0], 1)
+        # nothing recorded for a whole window
+        self.assertEqual(histogram.percentiles(now=5000000000)[0], 0)
+
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_stats(self):
+        tracker = LatencyTracker()
+        tracker.record('devices', 'queue', 0, 1000000)
+        tracker.record('devices', 'paint', 0, 16000000)
+        tracker.record('events', 'model', None, 1000000)
+
+        stats = tracker.stats(now=16000000)
+
+        self.assertEqual(list(stats), ['devices'])
+        self.assertEqual(stats['devices']['queue']['count'], 1)
+        self.assertAlmostEqual(stats['devices']['paint']['p99'], 16, delta=2)
+        self.assertEqual(tracker.format_stats(now=16000000).splitlines()[0],
+                         "devices queue: p50 1.0 p95 1.0 p99 1.0 ms (1)")
+
+    def test_dump(self):
+        tracker = LatencyTracker()
+        tracker.record('devices', 'model', 0, 3000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "latency.json")
+            tracker.dump(filename, now=3000)
+            with open(filename, encoding="utf-8") as f:
+                dump = json.load(f)
+
+        self.assertEqual(dump['stats_ms']['devices']['model']['count'], 1)
+        self.assertEqual(dump['histograms_ns']['devices']['model'],
+                         [list(bucket_range(bucket_index(3000))) + [1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock
+
+from mpfmonitor.core.bcp_client import ConnectionState
+from mpfmonitor.core.metrics import *
+from mpfmonitor.core.receive_queue import ReceiveQueue
+
+
+class TestFormatMetrics(unittest.TestCase):
+
+    def test_format(self):
+        text = format_metrics([
+            ('mpf_monitor_receive_queue_depth', {}, 3),
+            ('mpf_monitor_model_rows', {'machine': 'a "b"', 'window': 'devices'}, 10),
+            ('mpf_monitor_model_rows', {'machine': 'a "b"', 'window': 'events'}, 0),
+        ])
+
+        self.assertEqual(text.splitlines(), [
+            "# HELP mpf_monitor_receive_queue_depth Messages waiting for the next tick",
+            "# TYPE mpf_monitor_receive_queue_depth gauge",
+            "mpf_monitor_receive_queue_depth 3",
+            "# HELP mpf_monitor_model_rows Rows in the models of the monitor windows",
+            "# TYPE mpf_monitor_model_rows gauge",
+            'mpf_monitor_model_rows{machine="a \\"b\\"",window="devices"} 10',
+            'mpf_monitor_model_rows{machine="a \\"b\\"",window="events"} 0',
+        ])
+
+
+class TestClientMetrics(unittest.TestCase):
+
+    def test_client_metrics(self):
+        receive_queue = ReceiveQueue()
+        receive_queue.put(('device', {'type': 'light', 'name': 'l_1'}))
+        receive_queue.put(('device', {'type': 'light', 'name': 'l_1'}))
+        receive_queue.put(('reset', {}))
+
+        bcp = MagicMock()
+        bcp.connection_state = ConnectionState.CONNECTED
+        bcp.reconnect_count = 1
+        bcp.recorder.written_messages = 100
+        bcp.recorder.write_lag_ns = 2000000
+
+        samples = {(name, tuple(labels.items())): value
+                   for name, labels, value in client_metrics(bcp, receive_queue, {})}
+
+        self.assertEqual(samples['mpf_monitor_messages_received_total', (('command', 'device'),)], 2)
+        self.assertEqual(samples['mpf_monitor_messages_received_total', (('command', 'reset'),)], 1)
+        self.assertEqual(samples['mpf_monitor_messages_collapsed_total', (('category', 'devices'),)], 1)
+        self.assertEqual(samples['mpf_monitor_receive_queue_depth', ()], 2)
+        self.assertEqual(samples['mpf_monitor_connected', ()], 1)
+        self.assertEqual(samples['mpf_monitor_reconnects_total', ()], 1)
+        self.assertEqual(samples['mpf_monitor_recorder_write_lag_seconds', ()], .002)
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MetricsServer(port=0)
+        self.server.add_collector(lambda: [('mpf_monitor_ticks_total', {}, 5)])
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_scrape(self):
+        with urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(self.server.port)) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith("text/plain"))
+            self.assertIn("mpf_monitor_ticks_total 5\n", response.read().decode("utf-8"))
+
+    def test_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen("http://127.0.0.1:{}/".format(self.server.port))
+        self.assertEqual(context.exception.code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
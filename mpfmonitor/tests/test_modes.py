@@ -48,11 +48,10 @@ class TestModeWindowFunctions(unittest.TestCase):
 
     def test_filter_text(self):
         string_in = "filter_string_test"
-        expected_string_out = "*filter_string_test*"
 
         self.mode_window.filter_text(string=string_in)
 
-        self.mode_window.filtered_model.setFilterWildcard.assert_called_once_with(expected_string_out)
+        self.mode_window.filtered_model.set_filter_string.assert_called_once_with(string_in)
 
     def test_change_sort_default(self):
         self.mode_window.change_sort()
@@ -83,6 +82,7 @@ class TestModeWindowGUI(unittest.TestCase):
     def setUpClass(self):
         mock_mpfmon = MagicMock()
         mock_mpfmon.local_settings.value.side_effect = [QPoint(1100, 200), QSize(300, 250)]
+        mock_mpfmon.window_title.side_effect = lambda title: title
 
         self.mode_window = ModeWindow(mock_mpfmon)
 
@@ -155,6 +155,15 @@ class TestModeWindowGUI(unittest.TestCase):
         top_row_text = self.mode_window.filtered_model.index(0, 0).data()
         self.assertEqual(top_row_text, modes_in[-1][0])
 
+    def test_sort_by_priority_value(self):
+        self.mode_window.attach_model()
+        self.mode_window.process_mode_update(running_modes=[["attract", -10], ["base", 9], ["game", 10]])
+
+        # Priority ▴
+        self.mode_window.ui.sortComboBox.setCurrentIndex(1)
+        names = [self.mode_window.filtered_model.index(row, 0).data() for row in range(3)]
+        self.assertEqual(names, ["game", "base", "attract"])
+
     def test_filter(self):
         # Reset table model
         self.mode_window.attach_model()
@@ -6,6 +6,118 @@ from PyQt6.QtTest import QTest
 from mpfmonitor.core.mpfmon import *
 
 
+from unittest.mock import MagicMock
+
+
+class TestableMPFMonitorNoGUI(MPFMonitor):
+    def __init__(self):
+        self.name = None
+        self.bcp = MagicMock()
+        self.device_window = MagicMock()
+        self.view = MagicMock()
+        self.event_window = MagicMock()
+        self.mode_window = MagicMock()
+        self.variables_window = MagicMock()
+        self.receive_queue = ReceiveQueue()
+        self.latency = LatencyTracker()
+        self.tick_stats = (0, 0.0, 0.0)
+        self.model_rows = dict()
+
+        for window in (self.device_window, self.view, self.event_window,
+                       self.mode_window, self.variables_window):
+            window.isVisible.return_value = False
+
+
+class TestMultipleMachines(unittest.TestCase):
+
+    def test_window_title(self):
+        mpfmon = TestableMPFMonitorNoGUI()
+        self.assertEqual(mpfmon.window_title("Devices"), "Devices")
+
+        mpfmon.name = "bench_1"
+        self.assertEqual(mpfmon.window_title("Devices"), "bench_1 - Devices")
+
+    def test_ui_form_is_compiled_once(self):
+        from mpfmonitor.core.ui_loader import get_form_class
+        self.assertIs(get_form_class("searchable_tree.ui"), get_form_class("searchable_tree.ui"))
+
+
+class TestLatency(unittest.TestCase):
+
+    def test_tick_records_latency(self):
+        mpfmon = TestableMPFMonitorNoGUI()
+        received = time.monotonic_ns()
+        mpfmon.receive_queue.put(('device', {'type': 'light', 'name': 'l_1', 'changes': False,
+                                             'state': {}}), received)
+        mpfmon.receive_queue.put(('monitored_event', {'event_name': 'ball_started'}), received)
+
+        seen = []
+        mpfmon.device_window.process_device_update.side_effect = \
+            lambda **kwargs: seen.append(mpfmon.latency.current_received)
+        mpfmon.tick()
+
+        self.assertEqual(seen, [received])
+        self.assertIsNone(mpfmon.latency.current_received)
+        stats = mpfmon.latency.stats()
+        self.assertEqual(set(stats), {'devices', 'events'})
+        self.assertEqual(set(stats['devices']), {'queue', 'model'})
+        self.assertEqual(stats['devices']['model']['count'], 1)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_collect_metrics(self):
+        mpfmon = TestableMPFMonitorNoGUI()
+        mpfmon.name = "bench_1"
+        mpfmon.bcp.recorder = None
+        mpfmon.bcp.reconnect_count = 2
+        mpfmon.device_window.device_count = 3
+        mpfmon.event_window.model.rowCount.return_value = 7
+        mpfmon.receive_queue.put(('monitored_event', {'event_name': 'ball_started'}))
+
+        mpfmon.tick()
+        samples = {(name, tuple(sorted(labels.items()))): value
+                   for name, labels, value in mpfmon.collect_metrics()}
+
+        machine = ('machine', 'bench_1')
+        self.assertEqual(samples['mpf_monitor_messages_received_total',
+                                 (('command', 'monitored_event'), machine)], 1)
+        self.assertEqual(samples['mpf_monitor_model_rows', (machine, ('window', 'devices'))], 3)
+        self.assertEqual(samples['mpf_monitor_model_rows', (machine, ('window', 'events'))], 7)
+        self.assertEqual(samples['mpf_monitor_ticks_total', (machine,)], 1)
+        self.assertEqual(samples['mpf_monitor_reconnects_total', (machine,)], 2)
+
+
+class TestMonitoredCategories(unittest.TestCase):
+
+    def setUp(self):
+        self.mpfmon = TestableMPFMonitorNoGUI()
+
+    def test_player_vars_are_always_monitored(self):
+        # MPF does not send them again when the variables window is shown again
+        self.mpfmon.variables_window.isVisible.return_value = True
+        self.mpfmon.update_monitored_categories()
+        self.mpfmon.variables_window.isVisible.return_value = False
+        self.mpfmon.update_monitored_categories()
+        self.mpfmon.bcp.set_monitored_categories.assert_called_with({'player_vars'})
+
+    def test_nothing_visible(self):
+        self.mpfmon.update_monitored_categories()
+        self.mpfmon.bcp.set_monitored_categories.assert_called_once_with({'player_vars'})
+
+    def test_playfield_needs_devices(self):
+        self.mpfmon.view.isVisible.return_value = True
+        self.mpfmon.update_monitored_categories()
+        self.mpfmon.bcp.set_monitored_categories.assert_called_once_with({'devices', 'player_vars'})
+
+    def test_windows(self):
+        self.mpfmon.event_window.isVisible.return_value = True
+        self.mpfmon.variables_window.isVisible.return_value = True
+        self.mpfmon.update_monitored_categories()
+        self.mpfmon.bcp.set_monitored_categories.assert_called_once_with(
+            {'events', 'machine_vars', 'player_vars'})
+
+
 """class InitMPFMon(unittest.TestCase):
     @classmethod
     def setUpClass(self):
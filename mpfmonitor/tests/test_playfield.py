@@ -206,6 +206,39 @@ class TestPfWidgetColorFuncs(unittest.TestCase):
         self.assertEqual(q_brush_out, expected_q_brush_out, 'Brush is not returning correct value')
 
 
+class TestPfWidgetPaintLatency(unittest.TestCase):
+
+    def setUp(self):
+        self.widget = TestablePfWidgetNonDrawn(mpfmon_mock=MagicMock())
+        self.widget.update = MagicMock()
+        self.widget.unpainted_received = None
+
+    def test_oldest_unpainted_change(self):
+        self.widget.mpfmon.latency.current_received = 100
+        self.widget.notify()
+        self.widget.mpfmon.latency.current_received = 200
+        self.widget.notify()
+
+        self.assertEqual(self.widget.unpainted_received, 100)
+        self.assertEqual(self.widget.update.call_count, 2)
+
+    def test_paint_records_latency(self):
+        self.widget.widget = MagicMock()
+        self.widget.widget.get_colored_brush.return_value = QBrush()
+        self.widget.pen = QPen()
+        self.widget.angle = 0
+        self.widget.shape = Shape.DEFAULT
+        self.widget.device_type = 'light'
+        self.widget.device_size = 10
+        self.widget.unpainted_received = 100
+
+        self.widget.paint(MagicMock(), None)
+        self.widget.paint(MagicMock(), None)
+
+        self.widget.mpfmon.latency.record.assert_called_once_with('devices', 'paint', 100)
+        self.assertIsNone(self.widget.unpainted_received)
+
+
 class TestPfWidgetGetAndDestroy(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,54 @@
+import os
+import pstats
+import tempfile
+import unittest
+
+from mpfmonitor.core.profiler import SessionProfiler
+
+
+def busy():
+    return sum(i * i for i in range(10000))
+
+
+class TestSessionProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.directory.name, "logs")
+        self.profiler = SessionProfiler(self.log_path)
+
+    def tearDown(self):
+        self.profiler.stop()
+        self.directory.cleanup()
+
+    def test_profile_is_written(self):
+        self.profiler.start()
+        self.assertTrue(self.profiler.running)
+        busy()
+        filename = self.profiler.stop()
+
+        self.assertFalse(self.profiler.running)
+        self.assertEqual(os.path.dirname(filename), self.log_path)
+        self.assertTrue(filename.endswith("-monitor-profile.prof"))
+        self.assertEqual(self.profiler.last_file, filename)
+
+        functions = [function for _, _, function in pstats.Stats(filename).stats]
+        self.assertIn("busy", functions)
+
+        with open(filename[:-len(".prof")] + ".txt", encoding="utf-8") as f:
+            self.assertIn("busy", f.read())
+
+    def test_toggle(self):
+        self.profiler.toggle()
+        self.assertTrue(self.profiler.running)
+        self.profiler.toggle()
+        self.assertFalse(self.profiler.running)
+        self.assertIsNotNone(self.profiler.last_file)
+
+    def test_stop_when_not_running(self):
+        self.assertIsNone(self.profiler.stop())
+        self.assertFalse(os.path.exists(self.log_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from mpfmonitor.core.query import *
+
+
+def get_field(item, field):
+    return item.get(field, MISSING)
+
+
+LIGHT_ON = {'name': 'l_start', 'type': 'light', 'color': [255, 0, 0], 'time': 100}
+LIGHT_OFF = {'name': 'l_tilt', 'type': 'light', 'color': (0, 0, 0), 'time': 50}
+SWITCH = {'name': 's_start', 'type': 'switch', 'state': 1, 'recycle_jitter_count': 0}
+BALL_DEVICE = {'name': 'bd_trough', 'type': 'ball_device', 'balls': 3, 'state': 'idle'}
+ITEMS = [LIGHT_ON, LIGHT_OFF, SWITCH, BALL_DEVICE]
+
+
+class TestQuery(unittest.TestCase):
+
+    def find(self, text, now=None):
+        query = Query(text, get_field, ('name', 'type'))
+        return [item['name'] for item in ITEMS if query.matches(item, now)]
+
+    def test_words(self):
+        self.assertEqual(self.find("start"), ['l_start', 's_start'])
+        self.assertEqual(self.find("LIGHT"), ['l_start', 'l_tilt'])
+        self.assertEqual(self.find("l_* start"), ['l_start'])
+        self.assertEqual(self.find(""), ['l_start', 'l_tilt', 's_start', 'bd_trough'])
+
+    def test_equality(self):
+        self.assertEqual(self.find("type:light color!=[0,0,0]"), ['l_start'])
+        self.assertEqual(self.find("color:[0, 0, 0]"), ['l_tilt'])
+        self.assertEqual(self.find("type:switch state:1"), ['s_start'])
+        self.assertEqual(self.find("state:true"), ['s_start'])
+        self.assertEqual(self.find("state=IDLE"), ['bd_trough'])
+        self.assertEqual(self.find("name:?_start"), ['l_start', 's_start'])
+        self.assertEqual(self.find("state!=idle"), ['s_start'])
+
+    def test_comparison(self):
+        self.assertEqual(self.find("balls>2"), ['bd_trough'])
+        self.assertEqual(self.find("balls<=2"), [])
+        # strings do not compare with numbers
+        self.assertEqual(self.find("state>0"), ['s_start'])
+
+    def test_since(self):
+        self.assertEqual(self.find("since:10s", now=105), ['l_start'])
+        self.assertEqual(self.find("since:1m", now=105), ['l_start', 'l_tilt'])
+        self.assertEqual(self.find("since:500ms", now=105), [])
+        self.assertTrue(Query("since:1h", get_field).time_dependent)
+        self.assertFalse(Query("since", get_field).time_dependent)
+
+    def test_terms(self):
+        self.assertEqual(split_terms('type:light  color!=[0, 0, 0] name:"a b"'),
+                         ['type:light', 'color!=[0, 0, 0]', 'name:"a b"'])
+        self.assertEqual(Query('state:1 start', get_field).fields(), {'state', None})
+
+    def test_values(self):
+        self.assertEqual(parse_value("[0,0,0]"), [0, 0, 0])
+        self.assertEqual(parse_value("1.5"), 1.5)
+        self.assertEqual(parse_value("False"), False)
+        self.assertEqual(parse_value("'a b'"), "a b")
+        self.assertEqual(parse_value("idle"), "idle")
+        self.assertEqual(parse_duration("2m"), 120)
+        self.assertIsNone(parse_duration("soon"))
+
+
+if __name__ == '__main__':
+    unittest.main()
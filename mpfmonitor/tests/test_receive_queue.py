@@ -0,0 +1,190 @@
+import unittest
+
+from mpfmonitor.core.receive_queue import *
+
+
+def device(name, color, type='light'):
+    return 'device', {'type': type, 'name': name, 'changes': False,
+                      'state': {'color': color}}
+
+
+class TestReceiveQueueCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = ReceiveQueue()
+
+    def test_last_write_wins(self):
+        self.queue.put(device('l_1', [0, 0, 0]))
+        self.queue.put(device('l_1', [255, 0, 0]))
+        self.queue.put(device('l_1', [0, 255, 0]))
+
+        items = list(self.queue.drain())
+
+        self.assertEqual(len(items), 1)
+        cmd, kwargs, _ = items[0]
+        self.assertEqual(cmd, 'device')
+        self.assertEqual(kwargs['state'], {'color': [0, 255, 0]})
+        self.assertEqual(self.queue.stats()['categories']['devices'],
+                         {'received': 3, 'collapsed': 2, 'dropped': 0})
+
+    def test_received_time_of_newest_state(self):
+        self.queue.put(device('l_1', [0, 0, 0]), 100)
+        self.queue.put(('monitored_event', {'event_name': 'a'}), 150)
+        self.queue.put(device('l_1', [1, 1, 1]), 200)
+
+        self.assertEqual([received for _, _, received in self.queue.drain()], [200, 150])
+
+    def test_changes_of_coalesced_updates(self):
+        def change(key, old, new):
+            return 'device', {'type': 'light', 'name': 'l_1', 'changes': [key, old, new],
+                              'state': {'color': new, 'brightness': 0}}
+
+        self.queue.put(change('color', [0, 0, 0], [1, 1, 1]))
+        self.queue.put(change('color', [1, 1, 1], [2, 2, 2]))
+        self.assertEqual(self.queue.drain()[0][1]['changes'], ['color', [0, 0, 0], [2, 2, 2]])
+
+        # different properties changed, the state has to be compared
+        self.queue.put(change('brightness', 0, 1))
+        self.queue.put(change('color', [1, 1, 1], [2, 2, 2]))
+        self.assertIs(self.queue.drain()[0][1]['changes'], False)
+
+        # a full state stays a full state
+        self.queue.put(device('l_1', [0, 0, 0]))
+        self.queue.put(change('color', [0, 0, 0], [2, 2, 2]))
+        self.assertIs(self.queue.drain()[0][1]['changes'], False)
+
+    def test_devices_are_keyed_by_type_and_name(self):
+        self.queue.put(device('same_name', [0, 0, 0]))
+        self.queue.put(device('same_name', 1, type='switch'))
+        self.queue.put(device('l_2', [0, 0, 0]))
+
+        self.assertEqual(self.queue.qsize(), 3)
+        self.assertEqual(self.queue.stats()['categories']['devices']['collapsed'], 0)
+
+    def test_other_messages_keep_order(self):
+        self.queue.put(('monitored_event', {'event_name': 'a'}))
+        self.queue.put(device('l_1', [0, 0, 0]))
+        self.queue.put(('monitored_event', {'event_name': 'a'}))
+        self.queue.put(('player_variable', {'name': 'score', 'value': 1}))
+        self.queue.put(device('l_1', [1, 1, 1]))
+        self.queue.put(('player_variable', {'name': 'score', 'value': 2}))
+
+        items = [(cmd, kwargs) for cmd, kwargs, _ in self.queue.drain()]
+
+        # the variable is coalesced like the device
+        self.assertEqual([cmd for cmd, _ in items],
+                         ['monitored_event', 'device', 'monitored_event', 'player_variable'])
+        self.assertEqual(items[1][1]['state'], {'color': [1, 1, 1]})
+        self.assertEqual(items[3][1]['value'], 2)
+
+    def test_drain_starts_new_batch(self):
+        self.queue.put(device('l_1', [0, 0, 0]))
+        self.assertEqual(len(self.queue.drain()), 1)
+        self.assertTrue(self.queue.empty())
+
+        # an update after the tick must be queued again, not folded
+        self.queue.put(device('l_1', [1, 1, 1]))
+        items = self.queue.drain()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.queue.stats()['categories']['devices']['collapsed'], 0)
+
+    def test_clear(self):
+        self.queue.put(device('l_1', [0, 0, 0]))
+        self.queue.clear()
+        self.assertTrue(self.queue.empty())
+
+        self.queue.put(device('l_1', [1, 1, 1]))
+        self.assertEqual(self.queue.qsize(), 1)
+
+
+class TestReceiveQueueBounds(unittest.TestCase):
+
+    def test_keep_is_never_dropped(self):
+        receive_queue = ReceiveQueue(max_size=2)
+
+        for i in range(5):
+            receive_queue.put(('monitored_event', {'event_name': str(i)}))
+
+        self.assertEqual(receive_queue.qsize(), 5)
+        self.assertEqual(receive_queue.stats()['categories']['events']['dropped'], 0)
+
+    def test_coalesced_devices_ignore_bound(self):
+        receive_queue = ReceiveQueue(max_size=1)
+
+        receive_queue.put(device('l_1', [0, 0, 0]))
+        receive_queue.put(device('l_2', [0, 0, 0]))
+        receive_queue.put(device('l_2', [1, 1, 1]))
+
+        self.assertEqual(receive_queue.qsize(), 2)
+        self.assertEqual(receive_queue.stats()['categories']['devices'],
+                         {'received': 3, 'collapsed': 1, 'dropped': 0})
+
+    def test_default_policies_are_bounded(self):
+        receive_queue = ReceiveQueue(max_size=100)
+
+        for i in range(1000):
+            receive_queue.put(('player_variable', {'name': 'score', 'value': i, 'player_num': 1}))
+            receive_queue.put(('machine_variable', {'name': 'credits', 'value': i}))
+            receive_queue.put(('switch', {'name': 's_{}'.format(i)}))
+        receive_queue.put(('reset', {}))
+
+        self.assertEqual(receive_queue.qsize(), 100)
+        categories = receive_queue.stats()['categories']
+        self.assertEqual(categories['variables']['collapsed'], 1998)
+        self.assertEqual(categories['other']['dropped'], 903)
+
+        items = receive_queue.drain()
+        self.assertEqual([kwargs['value'] for cmd, kwargs, _ in items if cmd == 'player_variable'], [999])
+        # MPF waits for reset_complete
+        self.assertEqual(items[-1][0], 'reset')
+
+    def test_drop_oldest(self):
+        receive_queue = ReceiveQueue(max_size=3, policies={'events': 'drop_oldest'})
+
+        receive_queue.put(('reset', {}))
+        for i in range(5):
+            receive_queue.put(('monitored_event', {'event_name': str(i)}))
+
+        items = receive_queue.drain()
+
+        self.assertEqual([cmd for cmd, _, _ in items],
+                         ['reset', 'monitored_event', 'monitored_event'])
+        self.assertEqual([kwargs['event_name'] for _, kwargs, _ in items[1:]], ['3', '4'])
+        stats = receive_queue.stats()
+        self.assertEqual(stats['categories']['events']['dropped'], 3)
+        self.assertEqual(stats['peak'], 3)
+        self.assertEqual(stats['queued'], 0)
+
+    def test_drop_newest(self):
+        receive_queue = ReceiveQueue(max_size=2, policies={'variables': 'drop_newest'})
+
+        for i in range(4):
+            receive_queue.put(('player_variable', {'name': 'score', 'value': i, 'player_num': 1}))
+
+        items = receive_queue.drain()
+
+        self.assertEqual([kwargs['value'] for _, kwargs, _ in items], [0, 1])
+        self.assertEqual(receive_queue.stats()['categories']['variables']['dropped'], 2)
+
+    def test_coalesce_variables(self):
+        receive_queue = ReceiveQueue(policies={'variables': 'coalesce'})
+
+        receive_queue.put(('player_variable', {'name': 'score', 'value': 1, 'player_num': 1}))
+        receive_queue.put(('player_variable', {'name': 'score', 'value': 1, 'player_num': 2}))
+        receive_queue.put(('player_variable', {'name': 'score', 'value': 5, 'player_num': 1}))
+
+        items = receive_queue.drain()
+
+        self.assertEqual([(kwargs['player_num'], kwargs['value']) for _, kwargs, _ in items],
+                         [(1, 5), (2, 1)])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            ReceiveQueue(policies={'events': 'sometimes'})
+
+        with self.assertRaises(ValueError):
+            ReceiveQueue(policies={'lights': 'keep'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import glob
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mpfmonitor.core.recorder import *
+
+
+class TestSessionRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_all(self):
+        messages = []
+        for filename in sorted(glob.glob(os.path.join(self.directory, "*" + RECORDING_EXTENSION))):
+            with open(filename) as f:
+                messages.extend(read_recording(f))
+        return messages
+
+    def test_record_offsets(self):
+        recorder = SessionRecorder(self.directory)
+        start = recorder.start_ns
+
+        recorder.record(start + 1500, 'reset')
+        # gaps longer than one second must survive
+        recorder.record(start + 2500000000, 'mode_list?running_modes=')
+        recorder.close()
+
+        self.assertEqual(self.read_all(), [(1, 'reset'), (2500000, 'mode_list?running_modes=')])
+        self.assertEqual(recorder.written_messages, 2)
+
+    def test_header(self):
+        recorder = SessionRecorder(self.directory)
+        recorder.close()
+
+        with open(recorder.filename) as f:
+            self.assertTrue(f.readline().startswith(RECORDING_HEADER))
+
+    def test_messages_with_commas(self):
+        recorder = SessionRecorder(self.directory)
+        message = 'device?json={"type": "light", "state": {"color": [1, 2, 3]}}'
+        recorder.record(recorder.start_ns, message)
+        recorder.close()
+
+        self.assertEqual(self.read_all(), [(0, message)])
+
+    def test_rotation(self):
+        recorder = SessionRecorder(self.directory, max_bytes=200)
+
+        for i in range(50):
+            recorder.record(recorder.start_ns + i * 1000, 'monitored_event?event_name=e{}'.format(i))
+            if i % 10 == 9:
+                # wait for the batch to be written
+                wait_until = time.monotonic() + 2
+                while recorder.written_messages <= i and time.monotonic() < wait_until:
+                    time.sleep(.001)
+        recorder.close()
+
+        self.assertGreater(recorder.part, 1)
+        messages = self.read_all()
+        self.assertEqual([offset for offset, _ in messages], list(range(50)))
+
+    def test_close_twice(self):
+        recorder = SessionRecorder(self.directory)
+        recorder.close()
+        recorder.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
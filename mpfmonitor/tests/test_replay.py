@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mpfmonitor.core.recorder import RECORDING_HEADER
+from mpfmonitor.core.replay import *
+
+
+def device(name, state):
+    return 'device?json={{"type": "switch", "name": "{}", "changes": false, ' \
+           '"state": {{"state": {}}}}}'.format(name, state)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "session-001.bcprec")
+        self.dispatched = []
+
+        # one message every second for 20 seconds, alternating switch states
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write("{} start=2024-01-01T00:00:00\n".format(RECORDING_HEADER))
+            for second in range(20):
+                f.write("{},{}\n".format(second * 1000000, device("s_{}".format(second % 3), second)))
+                f.write("{},monitored_event?event_name=tick_{}\n".format(second * 1000000 + 1, second))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_engine(self, **kwargs):
+        return ReplayEngine(self.filename, self.dispatched.append, keyframe_interval=5, **kwargs)
+
+    def test_index(self):
+        engine = self.create_engine()
+
+        self.assertEqual(engine.start, 0)
+        self.assertEqual(engine.end, 19000001)
+        self.assertEqual(list(engine.index.offsets), [0, 5000000, 10000000, 15000000])
+        # the latest state of each of the three switches
+        self.assertEqual(len(engine.index.snapshots[1]), 3)
+        self.assertTrue(os.path.exists(self.filename + INDEX_EXTENSION))
+
+    def test_index_is_reused(self):
+        index = self.create_engine().index
+        with open(self.filename + INDEX_EXTENSION, "r", encoding="utf-8") as f:
+            saved = f.read()
+
+        engine = self.create_engine()
+
+        self.assertEqual(list(engine.index.positions), list(index.positions))
+        with open(self.filename + INDEX_EXTENSION, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), saved)
+
+    def test_stale_index_is_rebuilt(self):
+        self.create_engine()
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write("25000000,{}\n".format(device("s_0", 99)))
+
+        self.assertEqual(self.create_engine().end, 25000000)
+
+    def test_play_at_speed(self):
+        engine = self.create_engine()
+        engine.play(now=100)
+
+        self.assertEqual(engine.advance(now=100), 1)
+        self.assertEqual(engine.advance(now=101.5), 3)
+        self.assertEqual(self.dispatched[-1], "monitored_event?event_name=tick_1")
+
+        engine.set_speed(10, now=101.5)
+        engine.advance(now=102)
+        self.assertEqual(self.dispatched[-1], "monitored_event?event_name=tick_6")
+
+    def test_pause(self):
+        engine = self.create_engine()
+        engine.play(now=100)
+        engine.advance(now=102)
+        engine.pause(now=102)
+
+        self.assertEqual(engine.advance(now=200), 0)
+
+        engine.play(now=300)
+        self.assertEqual(engine.current_position(now=301), 3000000)
+
+    def test_max_speed(self):
+        engine = self.create_engine(batch_size=15)
+        engine.set_speed(MAX_SPEED)
+        engine.play(now=100)
+
+        self.assertEqual(engine.advance(now=100), 15)
+        self.assertEqual(engine.advance(now=100), 15)
+        self.assertEqual(engine.advance(now=100), 10)
+        self.assertFalse(engine.playing)
+        self.assertTrue(engine.finished)
+        self.assertEqual(len(self.dispatched), 40)
+
+    def test_seek(self):
+        engine = self.create_engine()
+        engine.seek(12500000, now=100)
+
+        # state of all three switches from the keyframe at 10s, then 10s-12.5s
+        self.assertEqual(self.dispatched[:3], [device("s_1", 7), device("s_2", 8), device("s_0", 9)])
+        self.assertEqual(self.dispatched[3:], [
+            device("s_1", 10), "monitored_event?event_name=tick_10",
+            device("s_2", 11), "monitored_event?event_name=tick_11",
+            device("s_0", 12), "monitored_event?event_name=tick_12"])
+
+        self.dispatched.clear()
+        engine.play(now=100)
+        engine.advance(now=101)
+        self.assertEqual(self.dispatched, [device("s_1", 13), "monitored_event?event_name=tick_13"])
+
+    def test_seek_backwards(self):
+        engine = self.create_engine()
+        engine.set_speed(MAX_SPEED)
+        engine.play()
+        engine.advance()
+        self.dispatched.clear()
+
+        engine.seek(0)
+        self.assertEqual(self.dispatched, [device("s_0", 0)])
+
+    def test_empty_recording(self):
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write("{} start=2024-01-01T00:00:00\n".format(RECORDING_HEADER))
+        engine = self.create_engine()
+
+        engine.seek(1000000)
+        engine.play(now=100)
+        self.assertEqual(engine.advance(now=101), 0)
+        self.assertTrue(engine.finished)
+
+        # play again after the end
+        engine.play(now=102)
+        self.assertEqual(engine.advance(now=103), 0)
+        self.assertEqual(self.dispatched, [])
+
+    def test_invalid_speed(self):
+        engine = self.create_engine()
+        with self.assertRaises(ValueError):
+            engine.set_speed(100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from PyQt6.QtCore import QCoreApplication
+from PyQt6.QtWidgets import QApplication
+
+from mpfmonitor.core.receive_queue import ReceiveQueue
+from mpfmonitor.core.scheduler import *
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+
+def process_events(duration=.1):
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        QCoreApplication.processEvents()
+        time.sleep(.001)
+
+
+class TestTickScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = MagicMock()
+        self.scheduler = TickScheduler(self.callback, min_interval=1, max_interval=20)
+
+    def test_no_tick_without_wake(self):
+        process_events()
+        self.callback.assert_not_called()
+
+    def test_wakes_are_batched(self):
+        for _ in range(10):
+            self.scheduler.wake()
+
+        process_events()
+        self.callback.assert_called_once()
+
+    def test_wake_from_other_thread(self):
+        thread = threading.Thread(target=self.scheduler.wake)
+        thread.start()
+        thread.join()
+
+        process_events()
+        self.callback.assert_called_once()
+
+    def test_interval_adapts_to_tick_duration(self):
+        self.callback.side_effect = lambda: time.sleep(.005)
+        self.scheduler.wake()
+        process_events()
+
+        self.assertGreaterEqual(self.scheduler.interval, 10)
+        self.assertLessEqual(self.scheduler.interval, 20)
+
+    def test_receive_queue_wakeup(self):
+        receive_queue = ReceiveQueue(wakeup=self.scheduler.wake)
+        self.callback.side_effect = receive_queue.drain
+
+        receive_queue.put(('reset', {}))
+        receive_queue.put(('reset', {}))
+        process_events()
+        self.callback.assert_called_once()
+
+        # the queue was drained, so the next message needs a new tick
+        receive_queue.put(('reset', {}))
+        process_events()
+        self.assertEqual(self.callback.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from mpfmonitor.core.search import *
+
+
+class TestTrigramIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TrigramIndex()
+        for name in ('s_start', 's_tilt', 's_trough_1', 'l_start', 'l_shoot_again'):
+            self.index.add(name, name)
+
+    def test_search(self):
+        self.assertEqual(self.index.search("start"), {'s_start', 'l_start'})
+        self.assertEqual(self.index.search("Trough"), {'s_trough_1'})
+        self.assertEqual(self.index.search("tart_"), set())
+        self.assertEqual(self.index.search("unknown"), set())
+
+    def test_short_text(self):
+        self.assertEqual(self.index.search("l_"), {'l_start', 'l_shoot_again'})
+        self.assertEqual(len(self.index.search("")), 5)
+
+    def test_wildcards(self):
+        self.assertEqual(self.index.search("s_*t"), {'s_start', 's_tilt', 's_trough_1'})
+        self.assertEqual(self.index.search("?_start"), {'s_start', 'l_start'})
+        self.assertEqual(self.index.search("[l]_s"), {'l_start', 'l_shoot_again'})
+
+    def test_matches(self):
+        for text in ("start", "l_", "s_*t", "[ls]_start", "_tr", "zzz"):
+            self.assertEqual({name for name in self.index.names if TrigramIndex.matches(text, name)},
+                             self.index.search(text), text)
+
+    def test_added_later(self):
+        self.index.add('s_start_2', 'S_Start_2')
+        self.assertEqual(self.index.search("start_"), {'s_start_2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import mpf.core.bcp.bcp_socket_client as bcp
+
+from mpfmonitor.core.synthetic import *
+
+
+class TestSyntheticMachine(unittest.TestCase):
+
+    def test_device_messages(self):
+        machine = SyntheticMachine(switches=2, lights=3, seed=1)
+
+        messages = [bcp.decode_command_string(m) for m in machine.device_messages()]
+
+        self.assertEqual(len(messages), 5)
+        cmd, kwargs = messages[0]
+        self.assertEqual(cmd, 'device')
+        self.assertEqual(kwargs['type'], 'switch')
+        self.assertFalse(kwargs['changes'])
+        self.assertEqual(messages[-1][1]['state'], {'color': [0, 0, 0]})
+
+    def test_set_switch(self):
+        machine = SyntheticMachine(switches=2, lights=0, seed=1)
+
+        cmd, kwargs = bcp.decode_command_string(machine.set_switch('s_switch_1', 1))
+
+        self.assertEqual(kwargs['changes'], ['state', 0, 1])
+        self.assertEqual(kwargs['state']['state'], 1)
+        self.assertEqual(machine.switches['s_switch_1'], 1)
+
+    def test_light_patterns(self):
+        for pattern in LIGHT_PATTERNS:
+            machine = SyntheticMachine(switches=0, lights=16, seed=1)
+            for _ in range(3):
+                for message in machine.light_show_step(pattern):
+                    cmd, kwargs = bcp.decode_command_string(message)
+                    self.assertEqual(kwargs['type'], 'light')
+                    self.assertEqual(kwargs['changes'][2], kwargs['state']['color'])
+
+        with self.assertRaises(ValueError):
+            machine.light_show_step('sparkle')
+
+    def test_stream(self):
+        machine = SyntheticMachine(seed=1)
+        commands = {bcp.decode_command_string(m)[0] for m in machine.stream(5000)}
+
+        self.assertEqual(len(list(SyntheticMachine(seed=1).stream(5000))), 5000)
+        self.assertTrue({'device', 'monitored_event', 'player_variable'} <= commands)
+
+
+if __name__ == '__main__':
+    unittest.main()
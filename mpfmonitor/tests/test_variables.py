@@ -0,0 +1,52 @@
+import unittest
+import sys
+
+from mpfmonitor.core.variables import *
+from unittest.mock import MagicMock
+
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+
+class TestVariableWindowGUI(unittest.TestCase):
+
+    def setUp(self):
+        mock_mpfmon = MagicMock()
+        mock_mpfmon.local_settings.value.side_effect = [QPoint(1100, 200), QSize(300, 250)]
+        mock_mpfmon.window_title.side_effect = lambda title: title
+
+        self.variable_window = VariableWindow(mock_mpfmon)
+
+    def values(self):
+        model = self.variable_window.filtered_model
+        return [model.index(row, 2).data() for row in range(model.rowCount())]
+
+    def test_sort_by_value(self):
+        for name, value in (('score', 10), ('ball', 9), ('ratio', 2.5), ('name', 'Bob'), ('enabled', True)):
+            self.variable_window.update_variable('player', name, value)
+
+        # Value ▴, numbers before strings
+        self.variable_window.ui.sortComboBox.setCurrentIndex(3)
+        self.assertEqual(self.values(), ['True', '2.5', '9', '10', 'Bob'])
+
+        # changed values move to their position
+        self.variable_window.update_variable('player', 'ball', 100)
+        self.assertEqual(self.values(), ['True', '2.5', '10', '100', 'Bob'])
+
+        # Value ▾
+        self.variable_window.ui.sortComboBox.setCurrentIndex(4)
+        self.assertEqual(self.values(), ['Bob', '100', '10', '2.5', 'True'])
+
+    def test_filter_after_update(self):
+        self.variable_window.update_variable('player', 'score', 10)
+        self.variable_window.update_variable('machine', 'credits', 0)
+
+        self.variable_window.filter_text("value>5")
+        self.assertEqual(self.values(), ['10'])
+
+        self.variable_window.update_variable('machine', 'credits', 6)
+        self.assertEqual(sorted(self.values()), ['10', '6'])
+
+
+if __name__ == '__main__':
+    unittest.main()